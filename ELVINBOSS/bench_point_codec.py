@@ -0,0 +1,79 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# throughput of point_codec.py against the one message at a time code it replaces
+# usage: python bench_point_codec.py [messages]
+
+import sys
+import time
+
+import numpy as np
+
+import point_codec
+from generate_data_points import generate_data
+
+
+def parse_line(line: str) -> list[tuple]:
+    # what parsing looks like without the codec: split, strip, convert, one value at a time
+    points = []
+    for point in line.split("|"):
+        values = [value.strip().strip("[]") for value in point.split(",")]
+        points.append((int(values[0]), int(values[1]), int(values[2]), float(values[3]), float(values[4]), float(values[5])))
+    return points
+
+def format_per_point(rows: list[tuple]) -> list[str]:
+    # and encoding without it: an f-string per point, joined per message
+    messages = {}
+    for message, point_id, int_val1, int_val2, float_val1, float_val2, float_val3 in rows:
+        messages.setdefault(message, []).append(f"{point_id}, {int_val1}, {int_val2}, {float_val1:.1f}, {float_val2:.1f}, {float_val3:.1f}")
+    return [" | ".join(points) for points in messages.values()]
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+def report(name: str, messages: int, seconds: float, baseline: float | None = None):
+    speedup = f"{baseline / seconds:8.1f}x" if baseline else ""
+    print(f"{name:<34} {seconds * 1e3:9.1f} ms {messages / seconds / 1e6:8.2f} M msg/s {speedup}")
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    print(f"{message_count} messages of 1 or 2 points\n")
+
+    # generating
+    lines, baseline = timed(lambda: [generate_data(int(count)) for count in rng.integers(1, 3, message_count)])
+    report("generate_data per message", message_count, baseline)
+    points, seconds = timed(point_codec.generate_points, message_count, (1, 2), rng)
+    report("generate_points", message_count, seconds, baseline)
+    _, seconds = timed(point_codec.generate_messages, message_count, (1, 2), rng)
+    report("generate_messages", message_count, seconds, baseline)
+
+    # encoding
+    print()
+    _, baseline = timed(format_per_point, points.tolist())
+    report("f-string per point", message_count, baseline)
+    _, seconds = timed(point_codec.encode_messages, points)
+    report("encode_messages", message_count, seconds, baseline)
+    stream, seconds = timed(point_codec.encode_stream, points)
+    report("encode_stream", message_count, seconds, baseline)
+    _, seconds = timed(point_codec.encode_messages, points, 1, True)
+    report("encode_messages brackets", message_count, seconds, baseline)
+
+    # parsing
+    print()
+    _, baseline = timed(lambda: [parse_line(line) for line in lines])
+    report("split/strip per line", message_count, baseline)
+    decoded, seconds = timed(point_codec.decode_messages, lines)
+    report("decode_messages (list of lines)", message_count, seconds, baseline)
+    decoded, seconds = timed(point_codec.decode_messages, stream)
+    report("decode_messages (bytes)", message_count, seconds, baseline)
+    assert np.array_equal(decoded, points), "round trip mismatch"
+
+    echoes = b"".join(b"Server received: " + line + b"\n" for line in stream.split(b"\n")[:-1])
+    _, seconds = timed(point_codec.decode_messages, echoes, b"Server received:")
+    report("decode_messages (echo log)", message_count, seconds, baseline)
+
+if __name__ == "__main__":
+    main()
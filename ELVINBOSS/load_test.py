@@ -0,0 +1,153 @@
+# Artificial Intelligence was used in this file to : debug errors, research asyncio
+
+# load generator for the vision-to-unity link: N concurrent clients each send generate_data() style lines at a
+# target rate and time the "Server received:" echo of every line (TCP keeps the order, so echoes are
+# matched first in first out). the lines are made up front with point_codec.py so building them doesnt eat into the rate
+# usage: python load_test.py [--host 127.0.0.1] [--port 55000] [--clients 4] [--rate 120] [--duration 10]
+#        python load_test.py --local [--delay 0.001] [--read-rate 5000] ...   also starts unity_server.py in process
+
+import argparse
+import asyncio
+import socket
+import time
+from collections import deque
+
+from point_codec import generate_stream
+from unity_server import add_server_arguments, server_from_args
+
+ECHO_PREFIX = b"Server received:"
+DRAIN_TIMEOUT = 5.0 # seconds to wait for outstanding echoes after sending stopped
+
+
+class LoadStats:
+    def __init__(self):
+        self.sent = 0
+        self.echoed = 0
+        self.round_trips = [] # seconds
+        self.disconnects = 0
+        self.errors = 0
+        self.first_echo = None
+        self.last_echo = None
+
+    def echo(self, round_trip: float):
+        now = time.perf_counter()
+        if self.first_echo is None:
+            self.first_echo = now
+        self.last_echo = now
+        self.echoed += 1
+        self.round_trips.append(round_trip)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+async def run_client(client_idx: int, client_count: int, host: str, port: int, rate: float, duration: float, stats: LoadStats):
+    messages = generate_stream(int(rate * duration) + 1).splitlines(keepends=True)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        print(f"Client {client_idx}: connection error: {e}")
+        stats.errors += 1
+        return
+    writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    loop = asyncio.get_running_loop()
+    pending = deque() # send times of lines not echoed yet
+    sending_done = asyncio.Event()
+    disconnected = asyncio.Event()
+
+    async def send_loop():
+        interval = 1 / rate
+        # spread the clients out over one interval so they dont all fire at once
+        next_send = loop.time() + interval * client_idx / client_count
+        deadline = loop.time() + duration
+        message_idx = 0
+        try:
+            while loop.time() < deadline:
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                pending.append(time.perf_counter())
+                writer.write(messages[message_idx % len(messages)])
+                message_idx += 1
+                stats.sent += 1
+                await writer.drain() # blocks while the server isnt reading, that shows up as latency
+                next_send += interval
+        except ConnectionError:
+            disconnected.set()
+        finally:
+            sending_done.set()
+
+    async def receive_loop():
+        try:
+            while not (sending_done.is_set() and not pending):
+                line = await reader.readline()
+                if not line:
+                    disconnected.set()
+                    break
+                if line.startswith(ECHO_PREFIX) and pending:
+                    stats.echo(time.perf_counter() - pending.popleft())
+        except ConnectionError:
+            disconnected.set()
+
+    receiver = asyncio.create_task(receive_loop())
+    await send_loop()
+    try:
+        await asyncio.wait_for(receiver, DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass # whatever is still pending counts as unanswered
+    if disconnected.is_set():
+        stats.disconnects += 1
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+async def run_load(args) -> LoadStats:
+    server = None
+    host, port = args.host, args.port
+    if args.local:
+        server = server_from_args(args, '127.0.0.1', 0)
+        await server.start()
+        host, port = '127.0.0.1', server.port
+
+    stats = LoadStats()
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(client_idx, args.clients, host, port, args.rate, args.duration, stats) for client_idx in range(args.clients)))
+    elapsed = time.perf_counter() - start_time
+
+    if server is not None:
+        await server.stop()
+    report(args, stats, elapsed)
+    return stats
+
+def report(args, stats: LoadStats, elapsed: float):
+    round_trips_ms = sorted(value * 1e3 for value in stats.round_trips)
+    echo_window = (stats.last_echo - stats.first_echo) if stats.echoed > 1 else 0
+    print(f"clients: {args.clients}  target: {args.rate * args.clients:.0f} msg/s ({args.rate:g} per client)  duration: {elapsed:.1f} s")
+    print(f"sent: {stats.sent} ({stats.sent / args.duration:.0f} msg/s)  echoed: {stats.echoed}  unanswered: {stats.sent - stats.echoed}"
+          f"  disconnects: {stats.disconnects}  connect errors: {stats.errors}")
+    if echo_window > 0:
+        print(f"sustained throughput: {(stats.echoed - 1) / echo_window:.0f} msg/s")
+    print(f"round trip ms: p50 {percentile(round_trips_ms, 50):.2f}  p95 {percentile(round_trips_ms, 95):.2f}"
+          f"  p99 {percentile(round_trips_ms, 99):.2f}  max {round_trips_ms[-1] if round_trips_ms else float('nan'):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the unity line protocol with concurrent clients and measure echo latency")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=55000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=120, help="messages per second per client")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of sending")
+    parser.add_argument("--local", action="store_true", help="start unity_server.py in this process (the server options below apply)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(run_load(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# Artificial Intelligence was used in this file to : debug errors, research numpy string parsing
+
+# batch codec for the point messages ServerInfoParse.cs reads:
+#   "id, int, int, float, float, float | id, int, int, float, float, float"
+# any value may also be bracketed like "[1], 1020, 569, [20.3], [102.1], [151.1]" (see TCP_Client)
+# points live in one structured array (POINT_DTYPE), "message" is the line they came from / go to,
+# so encoding, parsing and generating a million messages is a handful of numpy calls instead of a python loop per value
+# tests/test_point_codec.py has the round trip checks, bench_point_codec.py measures throughput
+
+import math
+
+import numpy as np
+
+POINT_DTYPE = np.dtype([
+    ("message", np.int64),
+    ("point_id", np.int32),
+    ("int_val1", np.int32),
+    ("int_val2", np.int32),
+    ("float_val1", np.float64),
+    ("float_val2", np.float64),
+    ("float_val3", np.float64),
+])
+VALUE_FIELDS = POINT_DTYPE.names[1:] # in wire order
+INT_FIELDS = 3 # the first three values are written as integers
+POINT_SEPARATOR = " | "
+DECIMALS = 1 # generate_data_point rounds to one decimal
+
+# same ranges as generate_data_point
+ID_RANGE = (0, 1)
+INT_RANGE = (100, 2000)
+FLOAT_RANGE = (10.0, 200.0)
+
+IGNORED_BYTES = b"[] \t\r"
+COMMA, BAR, NEWLINE, SPACE = ord(","), ord("|"), ord("\n"), ord(" ")
+DOT, MINUS, ZERO = ord("."), ord("-"), ord("0")
+
+# numbers are written and parsed as integer mantissas, exact in a float64 up to 15 digits
+MAX_DIGITS = 15
+POWERS_OF_TEN = 10 ** np.arange(MAX_DIGITS + 1, dtype=np.int64)
+
+# work is done in blocks so the temporary per byte / per value arrays stay small
+ENCODE_BLOCK_POINTS = 1 << 13
+DECODE_BLOCK_LINES = 1 << 13
+
+
+def empty_points(count: int) -> np.ndarray:
+    return np.zeros(count, dtype=POINT_DTYPE)
+
+def points_to_values(points: np.ndarray) -> np.ndarray:
+    # (n, 6) float64 in wire order
+    values = np.empty((len(points), len(VALUE_FIELDS)), dtype=np.float64)
+    for column, field in enumerate(VALUE_FIELDS):
+        values[:, column] = points[field]
+    return values
+
+
+def encode_stream(points: np.ndarray, decimals: int = DECIMALS, brackets: bool = False) -> bytes:
+    # newline terminated lines, ready for a socket or a file. points have to be sorted by message,
+    # consecutive points with the same message number share a line
+    # digits are the same as %d / %.{decimals}f would write
+    if len(points) == 0:
+        return b""
+    messages = points["message"]
+    if np.any(messages[1:] < messages[:-1]):
+        raise ValueError("points have to be sorted by message")
+    ends_message = np.append(messages[1:] != messages[:-1], True)
+    blocks = []
+    for start in range(0, len(points), ENCODE_BLOCK_POINTS):
+        end = start + ENCODE_BLOCK_POINTS
+        blocks.append(_encode_block(points_to_values(points[start:end]), ends_message[start:end], decimals, brackets))
+    return b"".join(blocks)
+
+def encode_messages(points: np.ndarray, decimals: int = DECIMALS, brackets: bool = False) -> list[str]:
+    # one string per message, without the newline
+    return encode_stream(points, decimals, brackets).decode('ascii').split("\n")[:-1]
+
+def _encode_block(values: np.ndarray, ends_message: np.ndarray, decimals: int, brackets: bool) -> bytes:
+    # text is built as one uint8 column per character position, every value right aligned in a slot as wide as the
+    # longest value of its column. padding is marked invalid and dropped in one go at the end,
+    # so all the digit, sign, dot and separator work is on whole columns
+    is_int = np.arange(values.shape[1]) < INT_FIELDS
+    fractions = np.where(is_int, 0, decimals)
+    values = np.where(is_int, np.trunc(values), values) # %d truncates
+    scaled = values * 10.0 ** fractions
+    rounded = np.round(scaled)
+    if not np.all(np.abs(rounded) < POWERS_OF_TEN[MAX_DIGITS]): # also false for nan
+        raise ValueError(f"values have to be finite and have at most {MAX_DIGITS} digits")
+    # close to half way the scaling can round the other way than % does on the exact binary value,
+    # those few (only values with more decimals than written) are rounded by % itself
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6 + np.abs(scaled) * 4e-16
+    for row, column in zip(*np.nonzero(near_tie)):
+        text = "%.*f" % (decimals, values[row, column])
+        rounded[row, column] = math.copysign(int(text.replace("-", "").replace(".", "")), -1.0 if text.startswith("-") else 1.0)
+    negative = np.signbit(rounded)
+    magnitude = np.abs(rounded).astype(np.int64)
+    # at least one digit before the dot, "0.5" not ".5"
+    digit_count = np.maximum(1 + sum(magnitude >= power for power in POWERS_OF_TEN[1:int(np.log10(max(magnitude.max(), 1))) + 2]), fractions + 1)
+
+    # slot per value: [ sign digits . digits ], then ", " or at the end of the point "\n" / " | "
+    slot_widths = digit_count.max(axis=0) + (fractions > 0) + 1 + 2 * brackets
+    line_width = int(slot_widths.sum()) + 2 * (values.shape[1] - 1) + len(POINT_SEPARATOR)
+    rows = len(values)
+    chars = np.empty((rows, line_width), dtype=np.uint8)
+    valid = np.ones((rows, line_width), dtype=bool)
+
+    slot_start = 0
+    for column in range(values.shape[1]):
+        count, is_negative, fraction = digit_count[:, column], negative[:, column], int(fractions[column])
+        remaining = magnitude[:, column]
+        if count.max() < 10:
+            remaining = remaining.astype(np.int32) # int32 division is a good bit faster
+        shortest = int(count.min())
+        slot_end = slot_start + int(slot_widths[column])
+        position = slot_end - 1
+        if brackets:
+            chars[:, position] = ord("]")
+            position -= 1
+        # right to left: the digits with the dot after `fraction` of them, then the sign, then "["
+        for digit in range(int(count.max()) + 1 + brackets):
+            if fraction and digit == fraction:
+                chars[:, position] = DOT
+                position -= 1
+            remaining, digits = np.divmod(remaining, 10)
+            chars[:, position] = digits
+            chars[:, position] += ZERO
+            if digit >= shortest: # not every row has a digit here
+                in_number = digit < count
+                at_sign = is_negative & (digit == count)
+                at_bracket = brackets & (digit == count + is_negative)
+                chars[at_sign, position] = MINUS
+                chars[at_bracket, position] = ord("[")
+                valid[:, position] = in_number | at_sign | at_bracket
+            position -= 1
+        valid[:, slot_start:position + 1] = False
+        slot_start = slot_end
+        if column < values.shape[1] - 1:
+            chars[:, slot_start:slot_start + 2] = np.frombuffer(b", ", dtype=np.uint8)
+            slot_start += 2
+
+    # "\n" ends the message, " | " leads to the next point of the same message
+    chars[:, slot_start] = np.where(ends_message, NEWLINE, SPACE)
+    chars[:, slot_start + 1:] = np.frombuffer(b"| ", dtype=np.uint8)
+    valid[:, slot_start + 1:] = ~ends_message[:, None]
+    return chars[valid].tobytes()
+
+
+def decode_messages(data, prefix: bytes | None = None, errors: str = "raise") -> np.ndarray:
+    # data: str, bytes or a list of lines. empty lines are skipped and dont get a message number
+    # prefix: stripped from the start of lines that have it, e.g. b"Server received:" for the unity echoes
+    # errors: "raise" -> ValueError on a malformed line, "skip" -> malformed lines are left out (their message number stays unused)
+    if isinstance(data, (list, tuple)):
+        data = "\n".join(data) if data and isinstance(data[0], str) else b"\n".join(data)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return _decode_clean(_clean(data, prefix), errors)
+
+def _clean(data: bytes, prefix: bytes | None) -> bytes:
+    # prefixes, brackets, whitespace and empty lines removed
+    if prefix:
+        data = (b"\n" + data).replace(b"\n" + prefix, b"\n")
+    data = data.translate(None, IGNORED_BYTES)
+    while b"\n\n" in data:
+        data = data.replace(b"\n\n", b"\n")
+    return data.strip(b"\n")
+
+def _decode_clean(data: bytes, errors: str) -> np.ndarray:
+    decoded = [empty_points(0)]
+    # blocks of DECODE_BLOCK_LINES lines, cut at every so many newlines
+    block_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == NEWLINE)[DECODE_BLOCK_LINES - 1::DECODE_BLOCK_LINES].tolist()
+    for block_idx, (start, end) in enumerate(zip([0] + [end + 1 for end in block_ends], block_ends + [len(data)])):
+        if start >= end:
+            continue
+        block = data[start:end]
+        try:
+            points = _decode_lines(block)
+        except ValueError:
+            if errors != "skip":
+                raise
+            points = _decode_lines_skipping(block)
+        points["message"] += block_idx * DECODE_BLOCK_LINES
+        decoded.append(points)
+    return np.concatenate(decoded)
+
+def _decode_lines_skipping(data: bytes) -> np.ndarray:
+    # slow path, only when something is malformed: one line at a time to find the bad ones
+    decoded = [empty_points(0)]
+    for message, line in enumerate(data.split(b"\n")):
+        try:
+            points = _decode_lines(line)
+        except ValueError:
+            continue
+        points["message"] = message
+        decoded.append(points)
+    return np.concatenate(decoded)
+
+def _decode_lines(data: bytes) -> np.ndarray:
+    # newline separated, non empty lines with brackets and whitespace removed already
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    separator_positions = np.flatnonzero((buffer == COMMA) | (buffer == BAR) | (buffer == NEWLINE))
+    separators = buffer[separator_positions]
+    point_ends = np.flatnonzero(separators != COMMA) # separator index of every "|" and newline
+    values_per_point = len(VALUE_FIELDS)
+    point_count = len(point_ends) + 1
+    # every point has exactly 5 commas: the gaps between point ends and the total have to match
+    if len(separators) + 1 != point_count * values_per_point or np.any(np.diff(point_ends, prepend=-1) != values_per_point):
+        raise ValueError(f"expected {values_per_point} values per point")
+    # point i+1 belongs to the message after as many newlines as there are among the first i+1 point ends
+    point_messages = np.concatenate(([0], np.cumsum(separators[point_ends] == NEWLINE)))
+
+    values = _parse_decimals(buffer, separator_positions)
+    if values is None: # exponents, nan, very long numbers: let numpy parse the text
+        tokens = data.replace(b"|", b",").replace(b"\n", b",").split(b",")
+        values = np.array(tokens).astype(np.float64) # b"" or b"abc" raise ValueError here
+    values = values.reshape(-1, values_per_point)
+    integers = values[:, :INT_FIELDS]
+    if np.any(integers != np.round(integers)):
+        raise ValueError("point id and the first two values have to be integers")
+
+    points = empty_points(len(values))
+    points["message"] = point_messages
+    for column, field in enumerate(VALUE_FIELDS):
+        points[field] = values[:, column]
+    return points
+
+def _parse_decimals(buffer: np.ndarray, separator_positions: np.ndarray) -> np.ndarray | None:
+    # every token between separators as "-123.45" without python objects: the tokens are gathered right aligned into a
+    # (tokens, width) matrix, then walking its columns from the right sums the digits into an integer mantissa and counts
+    # the digits after the dot. mantissa / 10 ** fraction digits is exact, so the result is the same float as float(token)
+    # None if something other than digits, one dot and a leading minus shows up
+    token_starts = np.concatenate(([0], separator_positions + 1))
+    token_ends = np.concatenate((separator_positions, [len(buffer)]))
+    width = int((token_ends - token_starts).max())
+    if width > MAX_DIGITS + 2: # sign and dot
+        return None
+    indices = token_ends + np.arange(-width, 0)[:, None] # (width, tokens), one row per character column
+    in_token = indices >= token_starts
+    chars = np.where(in_token, buffer[np.maximum(indices, 0)], ZERO) # padding reads like a leading zero
+    is_digit = (chars - ZERO) < 10 # uint8 wraps around for bytes below "0"
+    is_dot = chars == DOT
+    is_minus = chars == MINUS
+    if not np.all(is_digit | is_dot | is_minus):
+        return None
+    if np.any(is_minus[1:] & in_token[:-1]):
+        raise ValueError("minus sign inside a value")
+    if np.any(is_dot.sum(axis=0) > 1):
+        raise ValueError("more than one decimal point in a value")
+    digit_count = (is_digit & in_token).sum(axis=0)
+    if np.any(digit_count == 0):
+        raise ValueError("empty value")
+    if np.any(digit_count > MAX_DIGITS):
+        return None
+
+    token_count = len(token_starts)
+    mantissa = np.zeros(token_count, dtype=np.int64)
+    place_value = np.ones(token_count, dtype=np.int64)
+    fraction_digits = np.zeros(token_count, dtype=np.int64)
+    dot_seen = np.zeros(token_count, dtype=bool)
+    for column in range(width - 1, -1, -1):
+        digit = is_digit[column]
+        mantissa += (chars[column] - ZERO) * place_value * digit
+        place_value[digit] *= 10
+        fraction_digits += digit & ~dot_seen
+        dot_seen |= is_dot[column]
+    fraction_digits[~dot_seen] = 0
+    values = mantissa / POWERS_OF_TEN[fraction_digits]
+    values[is_minus.any(axis=0)] *= -1
+    return values
+
+
+def iter_decode(stream, chunk_size: int = 1 << 20, prefix: bytes | None = None, errors: str = "raise"):
+    # decodes a binary file or anything with read() chunk by chunk, message numbers continue across chunks
+    # a line split between two chunks is kept back until the rest has arrived
+    remainder = b""
+    next_message = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = remainder + chunk
+        end = data.rfind(b"\n")
+        if end < 0:
+            remainder = data
+            continue
+        remainder = data[end + 1:]
+        points, message_count = _decode_chunk(data[:end], prefix, errors)
+        points["message"] += next_message
+        next_message += message_count
+        yield points
+    if remainder.strip():
+        points, _ = _decode_chunk(remainder, prefix, errors)
+        points["message"] += next_message
+        yield points
+
+def _decode_chunk(data: bytes, prefix: bytes | None, errors: str) -> tuple[np.ndarray, int]:
+    # message count of the chunk counts malformed lines too, so numbers match decode_messages on the whole stream
+    data = _clean(data, prefix)
+    return _decode_clean(data, errors), data.count(b"\n") + 1 if data else 0
+
+
+def generate_points(message_count: int, points_per_message=(1, 2), rng: np.random.Generator | None = None) -> np.ndarray:
+    # random points like generate_data_point, points_per_message is a count or an inclusive (min, max) range
+    rng = rng if rng is not None else np.random.default_rng()
+    if isinstance(points_per_message, int):
+        counts = np.full(message_count, points_per_message, dtype=np.int64)
+    else:
+        counts = rng.integers(points_per_message[0], points_per_message[1] + 1, message_count)
+    points = empty_points(int(counts.sum()))
+    points["message"] = np.repeat(np.arange(message_count), counts)
+    points["point_id"] = rng.integers(ID_RANGE[0], ID_RANGE[1] + 1, len(points))
+    points["int_val1"] = rng.integers(INT_RANGE[0], INT_RANGE[1] + 1, len(points))
+    points["int_val2"] = rng.integers(INT_RANGE[0], INT_RANGE[1] + 1, len(points))
+    for field in VALUE_FIELDS[INT_FIELDS:]:
+        points[field] = np.round(rng.uniform(FLOAT_RANGE[0], FLOAT_RANGE[1], len(points)), DECIMALS)
+    return points
+
+def generate_messages(message_count: int, points_per_message=(1, 2), rng: np.random.Generator | None = None, brackets: bool = False) -> list[str]:
+    return encode_messages(generate_points(message_count, points_per_message, rng), brackets=brackets)
+
+def generate_stream(message_count: int, points_per_message=(1, 2), rng: np.random.Generator | None = None, brackets: bool = False) -> bytes:
+    return encode_stream(generate_points(message_count, points_per_message, rng), brackets=brackets)
+
@@ -0,0 +1,5 @@
+# the ELVINBOSS scripts import each other by plain name (from point_codec import ...), so the tests need ELVINBOSS/ on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
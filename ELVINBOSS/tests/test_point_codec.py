@@ -0,0 +1,149 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# the round trip and error path checks for point_codec.py, run with: python -m pytest ELVINBOSS/tests
+
+import io
+
+import numpy as np
+import pytest
+
+from generate_data_points import generate_data
+from point_codec import (INT_FIELDS, MAX_DIGITS, POINT_DTYPE, VALUE_FIELDS, decode_messages, empty_points, encode_messages,
+                         encode_stream, generate_points, iter_decode)
+
+GOOD_LINE = "1, 2, 3, 4.0, 5.0, 6.0"
+MALFORMED_LINES = [
+    "1, 2, 3, 4.0, 5.0", # a value short
+    "1, 2, 3, 4.0, 5.0, 6.0, 7.0", # a value too many
+    "1, 2, x, 4.0, 5.0, 6.0",
+    "1, 2.5, 3, 4, 5, 6", # float where an int goes
+    "1, 2, 3, 4, 5 | 6, 1, 2, 3, 4, 5, 6", # second point too long, first too short
+    "1, 2, 3, 4..0, 5.0, 6.0",
+    "1, 2, 3, 4-0, 5.0, 6.0",
+    "1, 2, 3, , 5.0, 6.0",
+    "1, 2, 3, 4.0, 5.0, 6.0 |",
+]
+
+
+def assert_same(expected, decoded):
+    assert len(decoded) == len(expected)
+    for field in POINT_DTYPE.names:
+        np.testing.assert_array_equal(decoded[field], expected[field], err_msg=field)
+
+
+@pytest.fixture
+def points():
+    return generate_points(10000, rng=np.random.default_rng(0))
+
+
+@pytest.mark.parametrize("brackets", [False, True])
+def test_round_trip(points, brackets):
+    messages = encode_messages(points, brackets=brackets)
+    assert len(messages) == 10000
+    assert_same(points, decode_messages(messages))
+    assert_same(points, decode_messages(encode_stream(points, brackets=brackets)))
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096, 1 << 20])
+def test_chunked_round_trip(points, chunk_size):
+    # lines split between chunks come out the same as decoding the whole stream
+    points = points[:2000]
+    stream = io.BytesIO(encode_stream(points))
+    assert_same(points, np.concatenate(list(iter_decode(stream, chunk_size=chunk_size))))
+
+def test_repo_formats():
+    # generate_data output, TCP_Client's mixed brackets and the unity echoes
+    lines = [generate_data(2) for _ in range(100)]
+    decoded = decode_messages(lines)
+    assert decoded["message"].tolist() == np.repeat(np.arange(100), 2).tolist()
+    assert encode_messages(decoded) == lines
+
+    mixed = decode_messages("[1], 1020, 569, [20.3], [102.1], [151.1]\n\n0, 1, 2, 3.5, 4.5, 5.5 | [1], 7, 8, 9, 10, 11\n")
+    assert mixed["message"].tolist() == [0, 1, 1]
+    assert mixed["int_val1"].tolist() == [1020, 1, 7]
+    assert mixed["float_val3"].tolist() == [151.1, 5.5, 11.0]
+    assert encode_messages(mixed[:1], brackets=True) == ["[1], [1020], [569], [20.3], [102.1], [151.1]"]
+
+    echoes = "".join(f"Server received: {line}\n" for line in lines)
+    assert_same(decoded, decode_messages(echoes, prefix=b"Server received:"))
+
+@pytest.mark.parametrize("decimals", [0, 1, 2])
+def test_same_digits_as_percent_formatting(decimals):
+    rng = np.random.default_rng(1)
+    odd = empty_points(5000)
+    odd["message"] = np.arange(5000)
+    odd["int_val1"] = rng.integers(-100000, 100000, 5000)
+    for field in VALUE_FIELDS[INT_FIELDS:]:
+        odd[field] = np.round(rng.normal(0, 1000, 5000), 3)
+    # negatives, ties and more decimals than written
+    odd["float_val1"][:8] = [0.05, -0.05, 0.15, -0.25, 2.5, -2.5, -0.04, 0.001]
+    point_format = ", ".join(["%d"] * INT_FIELDS + [f"%.{decimals}f"] * (len(VALUE_FIELDS) - INT_FIELDS))
+    assert encode_messages(odd, decimals) == [point_format % point[1:] for point in odd.tolist()]
+    assert_same(odd, decode_messages(encode_messages(odd, 3)))
+
+
+def test_truncated_line_raises():
+    # cut anywhere before the last value has started, the line is missing values
+    last_value = GOOD_LINE.rindex(",")
+    for end in range(1, last_value + 1):
+        with pytest.raises(ValueError):
+            decode_messages(GOOD_LINE[:end])
+
+def test_truncated_stream():
+    # a stream that stops in the middle of its last line: that line is an error, or left out with errors="skip"
+    data = (GOOD_LINE + "\n") * 3 + GOOD_LINE[:10]
+    with pytest.raises(ValueError):
+        list(iter_decode(io.BytesIO(data.encode()), chunk_size=8))
+    skipped = np.concatenate(list(iter_decode(io.BytesIO(data.encode()), chunk_size=8, errors="skip")))
+    assert skipped["message"].tolist() == [0, 1, 2]
+
+@pytest.mark.parametrize("line", MALFORMED_LINES)
+def test_malformed_line_raises(line):
+    with pytest.raises(ValueError):
+        decode_messages(line)
+
+def test_malformed_lines_skipped():
+    # skipped lines keep their message number, so the good ones still line up with the input
+    data = "\n".join([GOOD_LINE] + MALFORMED_LINES + ["0, 0, 0, 0, 0, 0"]) + "\n"
+    good_message = len(MALFORMED_LINES) + 1
+    assert decode_messages(data, errors="skip")["message"].tolist() == [0, good_message]
+    streamed = np.concatenate(list(iter_decode(io.BytesIO(data.encode()), chunk_size=7, errors="skip")))
+    assert streamed["message"].tolist() == [0, good_message]
+
+
+def test_many_points_per_message():
+    points = generate_points(200, points_per_message=50, rng=np.random.default_rng(2))
+    messages = encode_messages(points)
+    assert len(messages) == 200
+    assert all(message.count(" | ") == 49 for message in messages)
+    assert_same(points, decode_messages(messages))
+
+def test_largest_values():
+    # MAX_DIGITS digits still round trip exactly, one more cant be written
+    points = empty_points(2)
+    points["message"] = [0, 1]
+    points["int_val1"] = [2 ** 31 - 1, -2 ** 31]
+    points["float_val1"] = [(10 ** MAX_DIGITS - 1) / 10, -(10 ** MAX_DIGITS - 1) / 10]
+    assert_same(points, decode_messages(encode_messages(points)))
+
+    points["float_val1"][0] = 10 ** MAX_DIGITS / 10
+    with pytest.raises(ValueError):
+        encode_messages(points)
+    points["float_val1"][0] = np.nan
+    with pytest.raises(ValueError):
+        encode_messages(points)
+
+def test_long_and_exponent_values_fall_back_to_numpy():
+    decoded = decode_messages("1, 2, 3, 1e3, 12345678901234567890.5, -0.000000000000000001")
+    assert decoded["float_val1"].tolist() == [1000.0]
+    assert decoded["float_val2"].tolist() == [12345678901234567890.5]
+    assert decoded["float_val3"].tolist() == [-1e-18]
+
+def test_empty():
+    assert encode_messages(empty_points(0)) == []
+    assert len(decode_messages("")) == 0
+    assert len(decode_messages("\n\n")) == 0
+
+def test_unsorted_points_raise():
+    points = generate_points(3, points_per_message=1, rng=np.random.default_rng(3))[::-1]
+    with pytest.raises(ValueError):
+        encode_stream(points)
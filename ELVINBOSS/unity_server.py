@@ -0,0 +1,138 @@
+# Artificial Intelligence was used in this file to : debug errors, research asyncio
+
+# stand-in for TCPServerUnity.cs when unity isnt available: same line protocol, every non empty line is
+# answered with "Server received: <line>\n", plus knobs to make it a bad consumer on purpose
+#   --delay       seconds of fake processing per line (like a slow Update())
+#   --read-rate   bytes per second read from each client, the rest waits in the socket so the TCP window closes
+#   --rcvbuf      receive buffer size in bytes, small values make the window close sooner
+#   --drop-after  close each connection after this many lines, to test reconnects
+# usage: python unity_server.py [--port 55000] [--delay 0.01] [--read-rate 2000] [--verbose]
+
+import argparse
+import asyncio
+import socket
+import time
+
+
+class UnityLineServer:
+    def __init__(self, host='0.0.0.0', port=55000, delay=0.0, read_rate=None, rcvbuf=None, drop_after=None, verbose=False):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.read_rate = read_rate # bytes per second per client, None = as fast as possible
+        self.rcvbuf = rcvbuf
+        self.drop_after = drop_after
+        self.verbose = verbose
+        self.server = None
+        self.client_tasks = set()
+
+        self.clients = 0
+        self.lines = 0
+        self.bytes_received = 0
+
+    async def start(self):
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.rcvbuf:
+            # has to be set before listen() so accepted sockets advertise the small window from the start
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        listen_socket.bind((self.host, self.port))
+        self.server = await asyncio.start_server(self._handle_client, sock=listen_socket)
+        self.port = listen_socket.getsockname()[1]
+        print(f"[UnityLineServer] Listening on port {self.port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for task in list(self.client_tasks):
+                task.cancel()
+            await asyncio.gather(*self.client_tasks, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client_identifier = writer.get_extra_info('peername')
+        print(f"[UnityLineServer] Client connected: {client_identifier}")
+        task = asyncio.current_task()
+        self.client_tasks.add(task)
+        self.clients += 1
+        client_lines = 0
+        read_start = time.monotonic()
+        client_bytes = 0
+        try:
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+                client_bytes += len(data)
+                self.bytes_received += len(data)
+
+                if self.read_rate:
+                    # token bucket: dont read ahead of read_rate, the kernel buffer fills up behind us
+                    wait = client_bytes / self.read_rate - (time.monotonic() - read_start)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+
+                line = data.decode('utf-8', errors='replace').strip()
+                if not line:
+                    continue
+                if self.verbose:
+                    print(f"[UnityLineServer] Received from {client_identifier}: '{line}'")
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+                writer.write(f"Server received: {line}\n".encode('utf-8'))
+                await writer.drain()
+                self.lines += 1
+                client_lines += 1
+                if self.drop_after and client_lines >= self.drop_after:
+                    print(f"[UnityLineServer] Dropping {client_identifier} after {client_lines} lines")
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            print(f"[UnityLineServer] IO Error with client {client_identifier}: {e}")
+        except asyncio.CancelledError:
+            pass # server shutting down
+        finally:
+            self.client_tasks.discard(task)
+            self.clients -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            print(f"[UnityLineServer] Client {client_identifier} disconnected after {client_lines} lines")
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds of artificial processing per line")
+    parser.add_argument("--read-rate", type=float, default=None, help="bytes per second read from each client")
+    parser.add_argument("--rcvbuf", type=int, default=None, help="socket receive buffer size in bytes")
+    parser.add_argument("--drop-after", type=int, default=None, help="close each connection after this many lines")
+
+def server_from_args(args, host='0.0.0.0', port=55000, verbose=False) -> UnityLineServer:
+    return UnityLineServer(host, port, args.delay, args.read_rate, args.rcvbuf, args.drop_after, verbose)
+
+
+async def serve(server: UnityLineServer):
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"[UnityLineServer] {server.clients} client(s), {server.lines} lines echoed, {server.bytes_received} bytes received")
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Python stand-in for TCPServerUnity.cs")
+    parser.add_argument("--host", default='0.0.0.0')
+    parser.add_argument("--port", type=int, default=55000)
+    parser.add_argument("--verbose", action="store_true", help="log every line like the unity server does")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(server_from_args(args, args.host, args.port, args.verbose)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
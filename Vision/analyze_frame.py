@@ -4,6 +4,11 @@
 import cv2
 import numpy as np
 import json
+import math
+import threading
+
+from color_lut import get_classifier
+from instrumentation import metrics
 
 CONFIG_FILE_PATH = "hsv_config.json"
 
@@ -19,17 +24,32 @@ def load_hsv_configs(filepath):
     return low_left, upper_left, low_right, upper_right
 
 
+def load_blob_backends(filepath) -> list[str]:
+    # "blob_backend" per camera, cameras without one use BLOB_BACKEND. a name that isnt in BLOB_BACKENDS is an error,
+    # a typo would otherwise quietly run the contour backend
+    with open(filepath, 'r') as f:
+        configs = json.load(f)
+    blob_backends = [configs.get(f"camera_{camera_idx}", {}).get("blob_backend", BLOB_BACKEND) for camera_idx in range(2)]
+    for camera_idx, backend in enumerate(blob_backends):
+        if backend not in BLOB_BACKENDS:
+            raise ValueError(f"{filepath}: camera_{camera_idx} blob_backend has to be one of {BLOB_BACKENDS}, not {backend!r}")
+    return blob_backends
+
+
+def _read_configs(filepath) -> dict:
+    # whatever is saved already, so saving one setting keeps the others
+    try:
+        with open(filepath, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 def save_hsv_configs(filepath, low_hsv_configs_list, upper_hsv_configs_list):
-    configs_to_save = {
-        "camera_0": {
-            "low_hsv": low_hsv_configs_list[0].tolist(),
-            "upper_hsv": upper_hsv_configs_list[0].tolist()
-        },
-        "camera_1": {
-            "low_hsv": low_hsv_configs_list[1].tolist(),
-            "upper_hsv": upper_hsv_configs_list[1].tolist()
-        }
-    }
+    configs_to_save = _read_configs(filepath)
+    for camera_idx in range(2):
+        camera_config = configs_to_save.setdefault(f"camera_{camera_idx}", {})
+        camera_config["low_hsv"] = low_hsv_configs_list[camera_idx].tolist()
+        camera_config["upper_hsv"] = upper_hsv_configs_list[camera_idx].tolist()
     try:
         with open(filepath, 'w') as f:
             json.dump(configs_to_save, f, indent=4)
@@ -37,50 +57,75 @@ def save_hsv_configs(filepath, low_hsv_configs_list, upper_hsv_configs_list):
     except Exception as e:
         print(f"Error saving HSV configurations to {filepath}: {e}")
 
-LOW_TARGET_HSV_LEFT, UPPER_TARGET_HSV_LEFT, LOW_TARGET_HSV_RIGHT, UPPER_TARGET_HSV_RIGHT = load_hsv_configs(CONFIG_FILE_PATH)
+def save_blob_backends(filepath, blob_backends):
+    for backend in blob_backends:
+        if backend not in BLOB_BACKENDS:
+            raise ValueError(f"blob backend has to be one of {BLOB_BACKENDS}, not {backend!r}")
+    configs_to_save = _read_configs(filepath)
+    for camera_idx, backend in enumerate(blob_backends):
+        configs_to_save.setdefault(f"camera_{camera_idx}", {})["blob_backend"] = backend
+    try:
+        with open(filepath, 'w') as f:
+            json.dump(configs_to_save, f, indent=4)
+        print(f"Blob backends saved to {filepath}")
+        reload_configs()
+    except Exception as e:
+        print(f"Error saving blob backends to {filepath}: {e}")
+
+# read on first use instead of at import and kept after that: filepath -> ([low left, low right], [upper left, upper right], blob backends)
+# the arrays are shared, the tuner (hsv_tuner.py) changes them in place
+_config_cache = {}
+_config_lock = threading.Lock()
 
-# Camera 0 (Left)
-# LOW_TARGET_HSV_LEFT = np.array([98, 195, 59], dtype=np.uint8) # Replaced by loading
-# UPPER_TARGET_HSV_LEFT = np.array([114, 255, 113], dtype=np.uint8) # Replaced by loading
+def detector_configs(filepath=CONFIG_FILE_PATH):
+    with _config_lock:
+        if filepath not in _config_cache:
+            low_left, upper_left, low_right, upper_right = load_hsv_configs(filepath)
+            _config_cache[filepath] = ([low_left, low_right], [upper_left, upper_right], load_blob_backends(filepath))
+        return _config_cache[filepath]
 
-# Camera 1 (Right)
-# LOW_TARGET_HSV_RIGHT = np.array([107, 185, 62], dtype=np.uint8) # Replaced by loading
-# UPPER_TARGET_HSV_RIGHT = np.array([111, 255, 126], dtype=np.uint8) # Replaced by loading
+def hsv_configs(filepath=CONFIG_FILE_PATH) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    # (low thresholds per camera, upper thresholds per camera)
+    low_configs, upper_configs, _ = detector_configs(filepath)
+    return low_configs, upper_configs
 
-LOW_TARGET_HSV_CONFIGS = [LOW_TARGET_HSV_LEFT, LOW_TARGET_HSV_RIGHT]
-UPPER_TARGET_HSV_CONFIGS = [UPPER_TARGET_HSV_LEFT, UPPER_TARGET_HSV_RIGHT]
+def blob_backend_configs(filepath=CONFIG_FILE_PATH) -> list[str]:
+    return detector_configs(filepath)[2]
+
+def reload_configs():
+    # the next call reads hsv_config.json again
+    with _config_lock:
+        _config_cache.clear()
 
 MIN_CONTOUR_AREA = 80
 MIN_RADIUS = 3
-
-def on_trackbar_change(val):
-    pass
-
-def create_hsv_trackbars(initial_low_hsv, initial_upper_hsv):
-    cv2.namedWindow("HSV Thresholds")
-    cv2.createTrackbar("Low H", "HSV Thresholds", initial_low_hsv[0], 179, on_trackbar_change)
-    cv2.createTrackbar("High H", "HSV Thresholds", initial_upper_hsv[0], 179, on_trackbar_change)
-    cv2.createTrackbar("Low S", "HSV Thresholds", initial_low_hsv[1], 255, on_trackbar_change)
-    cv2.createTrackbar("High S", "HSV Thresholds", initial_upper_hsv[1], 255, on_trackbar_change)
-    cv2.createTrackbar("Low V", "HSV Thresholds", initial_low_hsv[2], 255, on_trackbar_change)
-    cv2.createTrackbar("High V", "HSV Thresholds", initial_upper_hsv[2], 255, on_trackbar_change)
-
-def set_trackbar_positions(low_hsv, high_hsv):
-    cv2.setTrackbarPos("Low H", "HSV Thresholds", low_hsv[0])
-    cv2.setTrackbarPos("High H", "HSV Thresholds", high_hsv[0])
-    cv2.setTrackbarPos("Low S", "HSV Thresholds", low_hsv[1])
-    cv2.setTrackbarPos("High S", "HSV Thresholds", high_hsv[1])
-    cv2.setTrackbarPos("Low V", "HSV Thresholds", low_hsv[2])
-    cv2.setTrackbarPos("High V", "HSV Thresholds", high_hsv[2])
-
-def update_hsv_configs_from_trackbars(camera_idx_to_update):
-    global LOW_TARGET_HSV_CONFIGS, UPPER_TARGET_HSV_CONFIGS
-    LOW_TARGET_HSV_CONFIGS[camera_idx_to_update][0] = cv2.getTrackbarPos("Low H", "HSV Thresholds")
-    UPPER_TARGET_HSV_CONFIGS[camera_idx_to_update][0] = cv2.getTrackbarPos("High H", "HSV Thresholds")
-    LOW_TARGET_HSV_CONFIGS[camera_idx_to_update][1] = cv2.getTrackbarPos("Low S", "HSV Thresholds")
-    UPPER_TARGET_HSV_CONFIGS[camera_idx_to_update][1] = cv2.getTrackbarPos("High S", "HSV Thresholds")
-    LOW_TARGET_HSV_CONFIGS[camera_idx_to_update][2] = cv2.getTrackbarPos("Low V", "HSV Thresholds")
-    UPPER_TARGET_HSV_CONFIGS[camera_idx_to_update][2] = cv2.getTrackbarPos("High V", "HSV Thresholds")
+BLOB_LIMITS_WIDTH = 640 # capture width the two limits above were tuned at
+
+# how find_targets places a target:
+#   "circle"  - center and radius of the enclosing circle cut down to whole pixels, like it always did
+#   "moments" - sub-pixel center from the moments of the target mask over the blob, the mask values are the weights
+#   "ellipse" - sub-pixel center of an ellipse fitted to the blob outline, the radius is half the long axis,
+#               so a partly covered ball keeps its center and size better than with the other two
+# the sub-pixel modes keep angles precise enough to capture at a lower resolution, see bench_centroid.py
+CENTROID_MODES = ("circle", "moments", "ellipse")
+CENTROID_MODE = "circle"
+
+# how find_targets gets the blobs out of the mask:
+#   "contours"   - findContours and a python loop over every outline, the way it always worked
+#   "components" - connectedComponentsWithStats, area and size are filtered in numpy so noise specks never reach
+#                  python, only the blobs that pass get a per blob step
+#   "hough"      - HoughCircles on the mask, only round blobs, no area check
+# every camera can have its own one in hsv_config.json ("blob_backend"), bench_blob_backends.py picks the fastest
+BLOB_BACKENDS = ("contours", "components", "hough")
+BLOB_BACKEND = "contours"
+
+HOUGH_VOTES = 12 # accumulator threshold, lower finds smaller and less round blobs
+
+PYRAMID_REFINE_MARGIN = 4 # full resolution pixels searched around a coarse candidate, times the scale
+
+# classify pixels with the precomputed tables in color_lut instead of split/inRange/and/or
+# same mask bit for bit, run color_lut.py on the pi to see which one is faster there
+USE_COLOR_LUT = False
 
 def get_target_masks(frame_hsv: np.ndarray, low_hsv_for_mask: np.ndarray, upper_hsv_for_mask: np.ndarray):
     h_channel, s_channel, v_channel = cv2.split(frame_hsv)
@@ -109,7 +154,10 @@ def get_target_masks(frame_hsv: np.ndarray, low_hsv_for_mask: np.ndarray, upper_
 
     return mask_h, mask_s, mask_v
 
-def get_targets(frame_hsv: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray) -> list[tuple[tuple[int, int], int]]:
+def get_target_mask(frame_hsv: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray) -> np.ndarray:
+    if USE_COLOR_LUT:
+        return get_classifier(low_hsv, upper_hsv).classify_hsv(frame_hsv)
+
     mask_h, mask_s, mask_v = get_target_masks(frame_hsv, low_hsv, upper_hsv)
     # target_mask = cv2.bitwise_and(mask_h, cv2.bitwise_and(mask_s, mask_v))
     # combine masks: a pixel is included if it's in at least two of the H, S, V masks
@@ -118,190 +166,164 @@ def get_targets(frame_hsv: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarra
     s_and_v = cv2.bitwise_and(mask_s, mask_v)
     
     target_mask = cv2.bitwise_or(h_and_s, cv2.bitwise_or(h_and_v, s_and_v))
+    return target_mask
+
+def blob_limits(width: int) -> tuple[float, float]:
+    # (min area, min radius) for another capture width, the ball covers the same share of the frame at any size
+    scale = width / BLOB_LIMITS_WIDTH
+    return MIN_CONTOUR_AREA * scale ** 2, MIN_RADIUS * scale
+
+def find_targets(target_mask: np.ndarray, min_area: float = MIN_CONTOUR_AREA, min_radius: float = MIN_RADIUS, centroid_mode: str | None = None,
+                 backend: str | None = None) -> list[tuple[tuple[float, float], float]]:
+    centroid_mode = centroid_mode or CENTROID_MODE
+    backend = backend or BLOB_BACKEND
+    with metrics.stage("contours"):
+        kernel = np.ones((3,3),np.uint8)
+        opened_mask = cv2.morphologyEx(target_mask, cv2.MORPH_OPEN, kernel)
+        if backend == "components":
+            return find_component_targets(target_mask, opened_mask, min_area, min_radius, centroid_mode)
+        if backend == "hough":
+            return find_hough_targets(opened_mask, min_radius, centroid_mode)
+        if backend != "contours":
+            raise ValueError(f"blob backend has to be one of {BLOB_BACKENDS}, not {backend!r}")
+
+        # the ellipse fit wants every outline pixel, not just the corners
+        approximation = cv2.CHAIN_APPROX_NONE if centroid_mode == "ellipse" else cv2.CHAIN_APPROX_SIMPLE
+        contours, _ = cv2.findContours(opened_mask, cv2.RETR_EXTERNAL, approximation)
+        
+        found_targets = []
+        
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area > min_area:
+                (x, y), radius = cv2.minEnclosingCircle(contour)
+                if centroid_mode == "circle":
+                    center = (int(x), int(y))
+                    radius = int(radius)
+                elif centroid_mode == "ellipse" and len(contour) >= 5:
+                    # the outline runs through the centers of the edge pixels, half a pixel inside the real edge
+                    (x, y), axes, _ = cv2.fitEllipse(contour)
+                    center = (x, y)
+                    radius = max(axes) / 2 + 0.5
+                else:
+                    center = blob_centroid(target_mask, cv2.boundingRect(contour), (x, y))
+                if radius > min_radius:
+                    found_targets.append((center, radius))
+    return found_targets
 
-    kernel = np.ones((3,3),np.uint8)
-    opened_mask = cv2.morphologyEx(target_mask, cv2.MORPH_OPEN, kernel)
+def find_component_targets(target_mask: np.ndarray, opened_mask: np.ndarray, min_area: float, min_radius: float, centroid_mode: str) -> list[tuple[tuple[float, float], float]]:
+    # grana (block based) labelling, with stats it is several times faster than the default on 8 connectivity
+    _, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(opened_mask, 8, cv2.CV_32S, cv2.CCL_GRANA)
+    x, y, width, height, area = stats[1:].T # label 0 is the background
+    # what minEnclosingCircle gives for a round blob, the outline runs through the centers of the edge pixels
+    radius = (np.maximum(width, height) - 1) / 2
+    if centroid_mode == "circle":
+        radius = np.floor(radius)
+    # contourArea measures inside the outline through the edge pixel centers, half a pixel in all round.
+    # for a disc of n pixels that is (sqrt(n) - sqrt(pi) / 2)^2, so the same min_area keeps the same blobs
+    outline_area = (np.sqrt(area) - math.sqrt(math.pi) / 2) ** 2
+    keep = np.flatnonzero((outline_area > min_area) & (radius > min_radius))
 
-    contours, _ = cv2.findContours(opened_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
     found_targets = []
-    
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > MIN_CONTOUR_AREA:
-            (x, y), radius = cv2.minEnclosingCircle(contour)
-            center = (int(x), int(y))
-            radius = int(radius)
-            if radius > MIN_RADIUS:
+    for index in keep:
+        box = (int(x[index]), int(y[index]), int(width[index]), int(height[index]))
+        box_center = (box[0] + (box[2] - 1) / 2, box[1] + (box[3] - 1) / 2)
+        blob_radius = float(radius[index])
+        if centroid_mode == "circle":
+            found_targets.append(((int(box_center[0]), int(box_center[1])), int(blob_radius)))
+            continue
+        if centroid_mode == "ellipse":
+            blob = (labels[box[1]:box[1] + box[3], box[0]:box[0] + box[2]] == index + 1).astype(np.uint8)
+            contours, _ = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+            contour = max(contours, key=len)
+            if len(contour) >= 5:
+                (ellipse_x, ellipse_y), axes, _ = cv2.fitEllipse(contour)
+                found_targets.append(((box[0] + ellipse_x, box[1] + ellipse_y), max(axes) / 2 + 0.5))
+                continue
+        found_targets.append((blob_centroid(target_mask, box, box_center), blob_radius))
+    return found_targets
+
+def find_hough_targets(opened_mask: np.ndarray, min_radius: float, centroid_mode: str) -> list[tuple[tuple[float, float], float]]:
+    # a hard edged mask only has gradients in a few directions, blurring it gives the circle votes something to agree on
+    blurred_mask = cv2.GaussianBlur(opened_mask, (5, 5), 1.5)
+    circles = cv2.HoughCircles(blurred_mask, cv2.HOUGH_GRADIENT, dp=1, minDist=max(2 * min_radius, 8), param1=100, param2=HOUGH_VOTES,
+                               minRadius=max(1, int(min_radius)), maxRadius=0)
+    if circles is None:
+        return []
+    found_targets = []
+    for x, y, radius in circles[0]:
+        if centroid_mode == "circle":
+            found_targets.append(((int(x), int(y)), int(radius)))
+        else:
+            found_targets.append(((float(x), float(y)), float(radius)))
+    return found_targets
+
+def blob_centroid(target_mask: np.ndarray, box: tuple[int, int, int, int], fallback: tuple[float, float]) -> tuple[float, float]:
+    # moments of the unopened mask over the blob's box (x, y, width, height) plus one pixel, the opening shaves off
+    # edge pixels that belong to the ball and they are what moves the centroid by fractions of a pixel
+    x, y, width, height = box
+    x0, y0 = max(0, x - 1), max(0, y - 1)
+    x1, y1 = min(target_mask.shape[1], x + width + 1), min(target_mask.shape[0], y + height + 1)
+    moments = cv2.moments(target_mask[y0:y1, x0:x1])
+    if moments["m00"] == 0:
+        return fallback
+    return x0 + moments["m10"] / moments["m00"], y0 + moments["m01"] / moments["m00"]
+
+def get_targets(frame_hsv: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray) -> list[tuple[tuple[float, float], float]]:
+    return find_targets(get_target_mask(frame_hsv, low_hsv, upper_hsv))
+
+def get_raw_target_mask(camera, frame_raw: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray, window: tuple[int, int, int, int] | None = None) -> np.ndarray:
+    # mask straight from a raw capture, skips the HSV conversion when the lookup table is enabled
+    # window = (x0, y0, x1, y1) only masks that part of the frame
+    if window is not None:
+        frame_raw = camera.crop_raw(frame_raw, window)
+    if USE_COLOR_LUT and not camera.zero_copy: # zero copy captures are HSV already
+        with metrics.stage("masking"):
+            return camera.orient(get_classifier(low_hsv, upper_hsv).classify_rgb(frame_raw))
+    if camera.zero_copy:
+        frame_hsv = frame_raw # converted (and timed) in the capture thread
+    else:
+        with metrics.stage("conversion"):
+            frame_hsv = camera.convert_frame(frame_raw)
+    with metrics.stage("masking"):
+        return get_target_mask(frame_hsv, low_hsv, upper_hsv)
+
+def get_coarse_target_mask(camera, frame_raw: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray, scale: int) -> np.ndarray:
+    # mask of the frame shrunk by scale, nearest neighbour so no colors get blended together
+    height, width = frame_raw.shape[:2]
+    frame_small = cv2.resize(frame_raw, (width // scale, height // scale), interpolation=cv2.INTER_NEAREST)
+    return get_raw_target_mask(camera, frame_small, low_hsv, upper_hsv)
+
+def refine_targets(camera, frame_raw: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray, coarse_mask: np.ndarray, scale: int,
+                   min_area: float = MIN_CONTOUR_AREA, min_radius: float = MIN_RADIUS, centroid_mode: str | None = None,
+                   backend: str | None = None) -> list[tuple[tuple[float, float], float]]:
+    # finds candidates on the coarse mask, then redoes each one at full resolution on a small crop around it
+    coarse_targets = find_targets(coarse_mask, min_area / scale ** 2, min_radius / scale, "circle", backend)
+    height, width = frame_raw.shape[:2]
+
+    found_targets = []
+    for (coarse_x, coarse_y), coarse_radius in coarse_targets:
+        center_x = coarse_x * scale + (scale - 1) / 2
+        center_y = coarse_y * scale + (scale - 1) / 2
+        half_size = (coarse_radius + 1) * scale + PYRAMID_REFINE_MARGIN * scale
+        x0, y0 = max(0, int(center_x - half_size)), max(0, int(center_y - half_size))
+        x1, y1 = min(width, int(center_x + half_size) + 1), min(height, int(center_y + half_size) + 1)
+
+        crop_mask = get_raw_target_mask(camera, frame_raw, low_hsv, upper_hsv, (x0, y0, x1, y1))
+        for (x, y), radius in find_targets(crop_mask, min_area, min_radius, centroid_mode, backend):
+            center = (x + x0, y + y0)
+            # two coarse blobs can refine to the same ball
+            if not any(abs(center[0] - other[0]) <= radius and abs(center[1] - other[1]) <= radius for other, _ in found_targets):
                 found_targets.append((center, radius))
     return found_targets
 
-if __name__ == "__main__":
-    from camera import Camera
+def get_targets_pyramid(camera, frame_raw: np.ndarray, low_hsv: np.ndarray, upper_hsv: np.ndarray, scale: int = 2,
+                        min_area: float = MIN_CONTOUR_AREA, min_radius: float = MIN_RADIUS, centroid_mode: str | None = None,
+                        backend: str | None = None) -> list[tuple[tuple[float, float], float]]:
+    coarse_mask = get_coarse_target_mask(camera, frame_raw, low_hsv, upper_hsv, scale)
+    return refine_targets(camera, frame_raw, low_hsv, upper_hsv, coarse_mask, scale, min_area, min_radius, centroid_mode, backend)
 
-    camera_left = Camera(0)
-    camera_right = Camera(1)
-    
-    cameras = [camera_left, camera_right]
-    current_camera_idx = 0
-    active_camera_names = ["Left", "Right"]
-
-    show_masks = True
-    all_masks_width = 1920
-    all_masks_height = 1080
-    first_run_masks = True
-    all_masks_display = None
-    first_run_hsv_trackbars = True
-
-    print("Starting frame analysis loop...")
-
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 0.5
-    font_color = (0, 255, 0) 
-    line_type = 1
-    text_offset_x = 5 
-    text_offset_y = 15
-
-    while True:
-        active_camera = cameras[current_camera_idx]
-        active_camera_name_str = active_camera_names[current_camera_idx]
-        live_feed_window_name = f"Live Feed {active_camera_name_str}"
-
-        active_low_hsv = LOW_TARGET_HSV_CONFIGS[current_camera_idx]
-        active_upper_hsv = UPPER_TARGET_HSV_CONFIGS[current_camera_idx]
-
-        frame_hsv = active_camera.get_frame()
-
-        if frame_hsv is None:
-            print(f"Error: Failed to get frame from {active_camera_name_str} camera.")
-        else:
-            if show_masks:
-                if first_run_hsv_trackbars:
-                    create_hsv_trackbars(active_low_hsv, active_upper_hsv)
-                    first_run_hsv_trackbars = False
-                
-                update_hsv_configs_from_trackbars(current_camera_idx)
-                # refresh active_low_hsv and active_upper_hsv after potential update from trackbars
-                active_low_hsv = LOW_TARGET_HSV_CONFIGS[current_camera_idx]
-                active_upper_hsv = UPPER_TARGET_HSV_CONFIGS[current_camera_idx]
-
-            targets = get_targets(frame_hsv, active_low_hsv, active_upper_hsv)
-            frame_display_bgr = cv2.cvtColor(frame_hsv, cv2.COLOR_HSV2BGR)
-            if targets:
-                for center, radius in targets:
-                    cv2.circle(frame_display_bgr, center, radius, (0, 255, 0), 2)
-                    cv2.circle(frame_display_bgr, center, 2, (0, 0, 255), 3)
-            cv2.imshow(live_feed_window_name, frame_display_bgr)
-
-            if show_masks:
-                if first_run_masks:
-                    cv2.namedWindow("All Masks", cv2.WINDOW_NORMAL)
-                    cv2.setWindowProperty("All Masks", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-                    all_masks_display = np.zeros((all_masks_height, all_masks_width, 3), dtype=np.uint8)
-                    first_run_masks = False
-                
-                if all_masks_display is not None:
-                    mask_h_display, mask_s_display, mask_v_display = get_target_masks(frame_hsv, active_low_hsv, active_upper_hsv)
-                    
-                    h_and_s_display = cv2.bitwise_and(mask_h_display, mask_s_display)
-                    h_and_v_display = cv2.bitwise_and(mask_h_display, mask_v_display)
-                    s_and_v_display = cv2.bitwise_and(mask_s_display, mask_v_display)
-                    final_mask_display = cv2.bitwise_or(h_and_s_display, cv2.bitwise_or(h_and_v_display, s_and_v_display))
-
-                    quad_width = all_masks_width // 2
-                    quad_height = all_masks_height // 2
-
-                    mask_h_bgr = cv2.cvtColor(mask_h_display, cv2.COLOR_GRAY2BGR)
-                    mask_s_bgr = cv2.cvtColor(mask_s_display, cv2.COLOR_GRAY2BGR)
-                    mask_v_bgr = cv2.cvtColor(mask_v_display, cv2.COLOR_GRAY2BGR)
-                    final_mask_bgr = cv2.cvtColor(final_mask_display, cv2.COLOR_GRAY2BGR)
-                    
-                    if quad_width > 0 and quad_height > 0:
-                        resized_h = cv2.resize(mask_h_bgr, (quad_width, quad_height))
-                        resized_s = cv2.resize(mask_s_bgr, (quad_width, quad_height))
-                        resized_v = cv2.resize(mask_v_bgr, (quad_width, quad_height))
-                        resized_final = cv2.resize(final_mask_bgr, (quad_width, quad_height))
-                        
-                        all_masks_display[0:quad_height, 0:quad_width] = resized_h
-                        all_masks_display[0:quad_height, quad_width:all_masks_width] = resized_s
-                        all_masks_display[quad_height:all_masks_height, 0:quad_width] = resized_v
-                        all_masks_display[quad_height:all_masks_height, quad_width:all_masks_width] = resized_final
-
-                        cv2.putText(all_masks_display, "Hue Mask", (text_offset_x, text_offset_y), font, font_scale, font_color, line_type)
-                        cv2.putText(all_masks_display, "Saturation Mask", (quad_width + text_offset_x, text_offset_y), font, font_scale, font_color, line_type)
-                        cv2.putText(all_masks_display, "Value Mask", (text_offset_x, quad_height + text_offset_y), font, font_scale, font_color, line_type)
-                        cv2.putText(all_masks_display, f"Combined Mask ({active_camera_name_str})", (quad_width + text_offset_x, quad_height + text_offset_y), font, font_scale, font_color, line_type)
-                    
-                    cv2.imshow("All Masks", all_masks_display)
-            else:
-                if not first_run_masks:
-                    try:
-                        cv2.destroyWindow("All Masks")
-                    except:
-                        pass
-                    first_run_masks = True
-                    all_masks_display = None
-                
-                if not first_run_hsv_trackbars: 
-                    try:
-                        cv2.destroyWindow("HSV Thresholds")
-                    except:
-                        pass
-                    first_run_hsv_trackbars = True
-
-        key = cv2.waitKey(1) & 0xFF
-        if key != 255 and key != -1 : # 255 or -1 often mean no key pressed btw
-            print(f"Key pressed: {key}")
-
-        if key == ord('q'):
-            break
-        elif key == 13:
-            print(f"showing masks: {show_masks}")
-            if show_masks:
-                print("calling save_hsv_configs...")
-                save_hsv_configs(CONFIG_FILE_PATH, LOW_TARGET_HSV_CONFIGS, UPPER_TARGET_HSV_CONFIGS)
-        elif key == ord('m'):
-            show_masks = not show_masks
-            if not show_masks: 
-                if not first_run_masks:
-                    try:
-                        cv2.destroyWindow("All Masks")
-                    except:
-                        pass
-                    first_run_masks = True 
-                    all_masks_display = None
-                if not first_run_hsv_trackbars:
-                    try:
-                        cv2.destroyWindow("HSV Thresholds")
-                    except:
-                        pass
-                    first_run_hsv_trackbars = True
-            else:
-                if first_run_hsv_trackbars:
-                    pass
-                    
-        elif key == ord('1'):
-            if current_camera_idx != 0:
-                print("Switching to Left Camera")
-                try: 
-                    cv2.destroyWindow(f"Live Feed {active_camera_names[1]}")
-                except:
-                    pass 
-                current_camera_idx = 0
-                if show_masks and not first_run_hsv_trackbars:
-                    set_trackbar_positions(LOW_TARGET_HSV_CONFIGS[current_camera_idx], UPPER_TARGET_HSV_CONFIGS[current_camera_idx])
-        elif key == ord('2'):
-            if current_camera_idx != 1:
-                print("Switching to Right Camera")
-                try: 
-                    cv2.destroyWindow(f"Live Feed {active_camera_names[0]}")
-                except:
-                    pass
-                current_camera_idx = 1
-                if show_masks and not first_run_hsv_trackbars:
-                    set_trackbar_positions(LOW_TARGET_HSV_CONFIGS[current_camera_idx], UPPER_TARGET_HSV_CONFIGS[current_camera_idx])
-    
-    print("Exiting...")
-    camera_left.stop()
-    camera_right.stop()
-    cv2.destroyAllWindows()
\ No newline at end of file
+
+if __name__ == "__main__":
+    from hsv_tuner import main # the tuning gui lives there now
+    main()
@@ -0,0 +1,237 @@
+# Artificial Intelligence was used in this file to : debug errors, research asyncio
+
+# full duplex client core: reading and writing run as separate tasks on one connection, no lock between them
+#   - frames are read from a buffer, so several messages in one recv or one message over several recvs come out right
+#     "line": newline terminated (the unity protocol), "length": 4 byte big endian length prefix
+#   - everything queued while the previous write was in flight goes out in one write (one send syscall)
+#   - data messages can be latest-value-wins like outbox.ConflatingOutbox, control messages keep their order
+# AsyncClientCore is used from asyncio code, ThreadedClientCore runs one on a background thread for threaded code
+# ELVINBOSS/ has the same file for TCP_Client, the two are deployed separately. change both, ELVINBOSS/tests checks they match
+
+import asyncio
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+FRAMING_LINE = "line"
+FRAMING_LENGTH = "length"
+LENGTH_PREFIX = struct.Struct(">I")
+
+MAX_LINE_LENGTH = 1 << 16
+# control messages are never conflated, so a stalled server could make them pile up. they are rare (handshake,
+# QUIT, typed messages), past this many unsent ones the oldest are dropped and counted instead of growing forever
+MAX_CONTROL_MESSAGES = 1024
+
+
+async def read_frame(reader: asyncio.StreamReader, framing: str = FRAMING_LINE) -> bytes | None:
+    # next complete message without its framing, None once the connection is closed
+    try:
+        if framing == FRAMING_LENGTH:
+            (length,) = LENGTH_PREFIX.unpack(await reader.readexactly(LENGTH_PREFIX.size))
+            return await reader.readexactly(length)
+        line = await reader.readuntil(b"\n")
+        return line[:-1].rstrip(b"\r")
+    except asyncio.IncompleteReadError:
+        return None # closed, possibly in the middle of a message
+
+def encode_frame(message, framing: str = FRAMING_LINE) -> bytes:
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    if framing == FRAMING_LENGTH:
+        return LENGTH_PREFIX.pack(len(message)) + message
+    return message + b"\n"
+
+
+class AsyncClientCore:
+    def __init__(self, host: str, port: int, framing: str = FRAMING_LINE, on_message=None, on_write=None):
+        self.host = host
+        self.port = port
+        self.framing = framing
+        self.on_message = on_message # called with the bytes of every received message
+        self.on_write = on_write # called with the ns every batch spent in write + drain, i.e. the real socket write
+        self.reader = None
+        self.writer = None
+        self.closing = False
+
+        self.control_messages = deque(maxlen=MAX_CONTROL_MESSAGES) # encoded frames
+        self.latest_data = None
+        self.wakeup = asyncio.Event()
+
+        self.messages_queued = 0
+        self.conflated = 0 # data messages replaced by a newer one before they were written
+        self.control_dropped = 0 # control messages pushed out by MAX_CONTROL_MESSAGES newer ones
+        self.write_time_ns = 0
+        self.messages_sent = 0
+        self.write_calls = 0
+        self.bytes_sent = 0
+        self.messages_received = 0
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE_LENGTH)
+        self.writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, message, conflate: bool = False, framed: bool = True):
+        # queue a message, has to be called from the event loop thread
+        # conflate: data sample, only the newest unsent one is kept. framed=False sends the bytes as they are
+        frame = encode_frame(message, self.framing) if framed else message
+        self.messages_queued += 1
+        if conflate:
+            if self.latest_data is not None:
+                self.conflated += 1
+            self.latest_data = frame
+        else:
+            if len(self.control_messages) == self.control_messages.maxlen:
+                self.control_dropped += 1
+            self.control_messages.append(frame)
+        self.wakeup.set()
+
+    async def run(self):
+        # until the server closes the connection or close() was called and the queue is flushed
+        read_task = asyncio.create_task(self._read_loop())
+        write_task = asyncio.create_task(self._write_loop())
+        done, pending = await asyncio.wait({read_task, write_task}, return_when=asyncio.FIRST_COMPLETED)
+        if write_task in pending: # the server went away, nothing left to write to
+            write_task.cancel()
+        if read_task in pending: # done writing, dont wait for more replies
+            read_task.cancel()
+        await asyncio.gather(read_task, write_task, return_exceptions=True)
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    def close(self):
+        # stops after whatever is queued has been written
+        self.closing = True
+        self.wakeup.set()
+
+    async def _read_loop(self):
+        while True:
+            message = await read_frame(self.reader, self.framing)
+            if message is None:
+                return
+            self.messages_received += 1
+            if self.on_message is not None:
+                self.on_message(message)
+
+    async def _write_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            frames = list(self.control_messages)
+            self.control_messages.clear()
+            if self.latest_data is not None:
+                frames.append(self.latest_data)
+                self.latest_data = None
+
+            if frames:
+                data = b"".join(frames)
+                start_ns = time.perf_counter_ns()
+                self.writer.write(data)
+                self.write_calls += 1
+                self.messages_sent += len(frames)
+                self.bytes_sent += len(data)
+                # anything sent while this drains lands in the next batch
+                await self.writer.drain()
+                duration_ns = time.perf_counter_ns() - start_ns
+                self.write_time_ns += duration_ns
+                if self.on_write is not None:
+                    self.on_write(duration_ns)
+            if self.closing and not self.control_messages and self.latest_data is None:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.messages_queued,
+            "conflated": self.conflated,
+            "control_dropped": self.control_dropped,
+            "sent": self.messages_sent,
+            "write_blocked_s": round(self.write_time_ns / 1e9, 3),
+            "write_calls": self.write_calls,
+            "bytes_sent": self.bytes_sent,
+            "received": self.messages_received,
+        }
+
+
+class ThreadedClientCore:
+    # AsyncClientCore on its own event loop thread, every method is safe to call from any thread
+    def __init__(self, host: str, port: int, framing: str = FRAMING_LINE, on_message=None, on_write=None):
+        self.host = host
+        self.port = port
+        self.framing = framing
+        self.on_message = on_message
+        self.on_write = on_write # runs on the event loop thread
+        self.loop = None
+        self.core = None
+        self.thread = None
+        self.connected = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self._reply_waiters = deque()
+
+    def start(self, timeout: float = 5.0) -> bool:
+        # True once connected, False (with self.error set) if the connection failed
+        self.thread = threading.Thread(target=self._run_loop, name="ClientCoreThread")
+        self.thread.daemon = True
+        self.thread.start()
+        self.connected.wait(timeout)
+        return self.connected.is_set() and self.error is None
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.loop.close()
+            self.connected.set() # dont leave start() waiting when connecting failed
+            self.finished.set()
+
+    async def _main(self):
+        self.core = AsyncClientCore(self.host, self.port, self.framing, self._deliver, self.on_write)
+        await self.core.connect()
+        self.connected.set()
+        await self.core.run()
+
+    def _deliver(self, message: bytes):
+        if self._reply_waiters:
+            waiter = self._reply_waiters.popleft()
+            waiter["reply"] = message
+            waiter["event"].set()
+        if self.on_message is not None:
+            self.on_message(message)
+
+    def send(self, message, conflate: bool = False, framed: bool = True):
+        if self.finished.is_set():
+            raise ConnectionError("connection is closed")
+        self.loop.call_soon_threadsafe(self.core.send, message, conflate, framed)
+
+    def request(self, message, timeout: float = 1.0) -> bytes | None:
+        # sends message and waits for the next message from the server, None on timeout
+        waiter = {"event": threading.Event(), "reply": None}
+        self.loop.call_soon_threadsafe(self._reply_waiters.append, waiter)
+        self.send(message)
+        waiter["event"].wait(timeout)
+        return waiter["reply"]
+
+    def stop(self, timeout: float = 2.0):
+        # flushes what is queued, then closes the connection
+        try:
+            if self.loop is not None and not self.finished.is_set():
+                self.loop.call_soon_threadsafe(self.core.close)
+            self.finished.wait(timeout)
+            if not self.finished.is_set(): # server not reading, give up on the rest
+                self.loop.call_soon_threadsafe(self.core.writer.transport.abort)
+                self.finished.wait(timeout)
+        except RuntimeError:
+            pass # loop already closed
+
+    def stats(self) -> dict:
+        return self.core.stats() if self.core is not None else {}
@@ -0,0 +1,129 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# picks the find_targets backend per camera: times every backend in analyze_frame.BLOB_BACKENDS on the same masks
+# and takes the fastest one that still finds the ball often enough without seeing balls that arent there
+#   on a recording (--replay) there is no ground truth, the contour backend is the reference the others have to match
+#   without one, frames are rendered with the ball at known spots (--distractors/--noise make the lighting worse)
+# usage: python bench_blob_backends.py [--replay FILE] [--frames N] [--recall 0.98] [--max-false 0.1] [--centroid-mode moments] [--save]
+# --save writes the choice into hsv_config.json ("blob_backend" per camera), BallDetector picks it up from there
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from analyze_frame import (BLOB_BACKENDS, CENTROID_MODES, CONFIG_FILE_PATH, blob_limits,
+                           find_targets, get_raw_target_mask, hsv_configs, save_blob_backends)
+from recording import StereoRecording
+from synthetic import SyntheticCamera, hsv_to_rgb, render_ball_frame, target_hsv
+
+REFERENCE_BACKEND = "contours"
+BALL_RADIUS_640 = (6, 20) # rendered ball radius range in pixels at 640 wide, 6 is about the smallest MIN_CONTOUR_AREA lets through
+
+
+def recorded_masks(recording: StereoRecording, camera_idx: int, frames: int) -> list[np.ndarray]:
+    camera = SyntheticCamera(recording.width, recording.height)
+    step = max(1, len(recording) // frames)
+    low_hsv_configs, upper_hsv_configs = hsv_configs()
+    return [get_raw_target_mask(camera, recording.frame(idx, camera_idx)[0], low_hsv_configs[camera_idx], upper_hsv_configs[camera_idx])
+            for idx in range(0, len(recording), step)][:frames]
+
+def rendered_masks(camera_idx: int, frames: int, width: int, height: int, args, rng) -> tuple[list[np.ndarray], list]:
+    # (masks, [(x, y, radius)] per frame) with the ball in this camera's target color
+    low_hsv_configs, upper_hsv_configs = hsv_configs()
+    low_hsv, upper_hsv = low_hsv_configs[camera_idx], upper_hsv_configs[camera_idx]
+    ball_rgb = hsv_to_rgb(target_hsv(low_hsv, upper_hsv))
+    camera = SyntheticCamera(width, height)
+    masks, truths = [], []
+    for _ in range(frames):
+        radius = rng.uniform(*BALL_RADIUS_640) * width / 640
+        center = (rng.uniform(radius, width - radius), rng.uniform(radius, height - radius))
+        frame = render_ball_frame(width, height, center, radius, ball_rgb, rng, args.brightness, args.noise, args.distractors)
+        masks.append(get_raw_target_mask(camera, frame, low_hsv, upper_hsv))
+        truths.append([(center[0], center[1], radius)])
+    return masks, truths
+
+def match(detections, expected) -> tuple[int, int]:
+    # (expected targets found, detections that match nothing), a detection counts if its center is inside the expected ball
+    found = 0
+    unmatched = list(detections)
+    for x, y, radius in expected:
+        distances = [math.dist(center, (x, y)) for center, _ in unmatched]
+        if distances and min(distances) <= max(radius, 2.0):
+            unmatched.pop(int(np.argmin(distances)))
+            found += 1
+    return found, len(unmatched)
+
+def bench_backend(backend: str, masks, expected, min_area: float, min_radius: float, centroid_mode: str) -> dict:
+    durations = []
+    found = expected_count = false_positives = 0
+    for mask, expected_targets in zip(masks, expected):
+        start_ns = time.perf_counter_ns()
+        detections = find_targets(mask, min_area, min_radius, centroid_mode, backend)
+        durations.append(time.perf_counter_ns() - start_ns)
+        frame_found, frame_false = match(detections, expected_targets)
+        found += frame_found
+        expected_count += len(expected_targets)
+        false_positives += frame_false
+    durations_ms = np.array(durations) / 1e6
+    return {
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p95_ms": float(np.percentile(durations_ms, 95)),
+        "recall": found / expected_count if expected_count else 1.0,
+        "false_positives_per_frame": false_positives / len(masks),
+    }
+
+def pick_backend(results: dict, recall_target: float, max_false: float) -> str:
+    # fastest (median) of the backends that reach the recall target, the reference one if none does
+    qualifying = [backend for backend, result in results.items()
+                  if result["recall"] >= recall_target and result["false_positives_per_frame"] <= max_false]
+    if not qualifying:
+        return REFERENCE_BACKEND
+    return min(qualifying, key=lambda backend: results[backend]["p50_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the fastest blob backend per camera that meets a recall target")
+    parser.add_argument("--replay", metavar="FILE", help="recording made with recording.py, the contour backend is the reference")
+    parser.add_argument("--frames", type=int, default=200, help="frames per camera")
+    parser.add_argument("--recall", type=float, default=0.98, help="recall a backend needs to be picked")
+    parser.add_argument("--max-false", type=float, default=0.1, help="false detections per frame a backend may have to be picked")
+    parser.add_argument("--centroid-mode", choices=CENTROID_MODES, default=None)
+    parser.add_argument("--width", type=int, default=640, help="rendered frame width, without --replay")
+    parser.add_argument("--height", type=int, default=480, help="rendered frame height, without --replay")
+    parser.add_argument("--noise", type=float, default=4.0, help="sensor noise standard deviation, without --replay")
+    parser.add_argument("--brightness", type=float, default=1.0, help="lighting, scales the background, without --replay")
+    parser.add_argument("--distractors", type=int, default=300, help="ball colored specks per frame, without --replay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", action="store_true", help=f"write the picks to {CONFIG_FILE_PATH}")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    recording = StereoRecording(args.replay) if args.replay else None
+    width = recording.width if recording else args.width
+    min_area, min_radius = blob_limits(width)
+
+    picks = []
+    for camera_idx in range(2):
+        if recording is not None:
+            masks = recorded_masks(recording, camera_idx, args.frames)
+            expected = [[(x, y, radius) for (x, y), radius in find_targets(mask, min_area, min_radius, args.centroid_mode, REFERENCE_BACKEND)] for mask in masks]
+        else:
+            masks, expected = rendered_masks(camera_idx, args.frames, args.width, args.height, args, rng)
+
+        print(f"camera {camera_idx}: {len(masks)} frames, {np.mean([np.count_nonzero(mask) for mask in masks]):.0f} mask pixels per frame")
+        print(f"  {'backend':<11} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7} {'false/frame':>11}")
+        results = {}
+        for backend in BLOB_BACKENDS:
+            results[backend] = result = bench_backend(backend, masks, expected, min_area, min_radius, args.centroid_mode)
+            print(f"  {backend:<11} {result['p50_ms']:>7.3f} {result['p95_ms']:>7.3f} {result['recall']:>7.1%} {result['false_positives_per_frame']:>11.2f}")
+        picks.append(pick_backend(results, args.recall, args.max_false))
+        print(f"  -> {picks[-1]}")
+
+    if args.save:
+        save_blob_backends(CONFIG_FILE_PATH, picks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# how low can the capture resolution go with a sub-pixel centroid: renders the same throws as bench_detector.py at
+# several resolutions and runs the detector once per centroid mode, then reports fps and 3D error per mode
+# usage: python bench_centroid.py [--frames N] [--noise X] [--brightness X] [--distractors N]
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from analyze_frame import CENTROID_MODES, hsv_configs
+from bench_detector import bench_detector, generate_positions, render_scene
+from recording import StereoRecording
+from synthetic import hsv_to_rgb, target_hsv
+
+RESOLUTIONS = [(320, 180), (480, 270), (640, 360), (960, 540), (1280, 720)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare centroid modes for 3D accuracy and speed across capture resolutions")
+    parser.add_argument("--frames", type=int, default=120, help="stereo pairs per resolution")
+    parser.add_argument("--noise", type=float, default=4.0, help="sensor noise standard deviation")
+    parser.add_argument("--brightness", type=float, default=1.0, help="lighting, scales the background")
+    parser.add_argument("--distractors", type=int, default=3, help="ball colored specks per frame")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    low_hsv, upper_hsv = (configs[0] for configs in hsv_configs())
+    ball_rgb = hsv_to_rgb(target_hsv(low_hsv, upper_hsv))
+
+    results = {} # (width, height) -> mode -> bench_detector result
+    print(f"{'resolution':>10} {'mode':>8} {'fps':>8} {'recall':>7} {'mean cm':>8} {'p95 cm':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in RESOLUTIONS:
+            rng = np.random.default_rng(args.seed)
+            positions = generate_positions(args.frames, width, height, rng)
+            filepath = os.path.join(directory, f"scene_{width}x{height}.rec")
+            render_scene(filepath, width, height, positions, ball_rgb, rng, args)
+            recording = StereoRecording(filepath)
+
+            results[(width, height)] = {}
+            for mode in CENTROID_MODES:
+                result = bench_detector(recording, positions, {"centroid_mode": mode}, False)
+                results[(width, height)][mode] = result
+                accuracy = result["accuracy"]
+                print(f"{f'{width}x{height}':>10} {mode:>8} {result['throughput_hz']:>8.1f} {accuracy['recall']:>7.1%} "
+                      f"{accuracy['mean_cm'] if accuracy['mean_cm'] is not None else float('nan'):>8.3f} "
+                      f"{accuracy['p95_cm'] if accuracy['p95_cm'] is not None else float('nan'):>7.3f}")
+
+    # the question this is for: lowest resolution where a sub-pixel mode is as accurate as whole pixel circles at full size
+    full_resolution = RESOLUTIONS[-1]
+    reference = results[full_resolution]["circle"]["accuracy"]["mean_cm"]
+    print(f"\ncircle at {full_resolution[0]}x{full_resolution[1]}: {reference} cm mean error, "
+          f"{results[full_resolution]['circle']['throughput_hz']} fps")
+    for mode in CENTROID_MODES[1:]:
+        for width, height in RESOLUTIONS:
+            result = results[(width, height)][mode]
+            mean_cm = result["accuracy"]["mean_cm"]
+            if mean_cm is not None and reference is not None and mean_cm <= reference and result["accuracy"]["recall"] >= 0.95:
+                print(f"{mode}: {width}x{height} matches it ({mean_cm} cm) at {result['throughput_hz']} fps")
+                break
+        else:
+            print(f"{mode}: no lower resolution matches it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# benchmark suite with ground truth: renders stereo pairs of a ball at known 3D positions using the rig
+# geometry from BallDetector, then times each stage on its own and the whole detector (through a replay
+# recording, so the capture and pairing code runs too) and measures the 3D error
+# usage: python bench_detector.py [--frames N] [--noise X] [--brightness X] [--distractors N] [--output bench_report.json]
+# the JSON report is meant to be diffed between commits
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from analyze_frame import find_targets, get_target_mask, get_targets, hsv_configs
+from hello import BallDetector
+from instrumentation import metrics
+from recording import ReplayCamera, StereoRecorder, StereoRecording
+from synthetic import SyntheticCamera, hsv_to_rgb, project_point, render_stereo_pair, target_hsv
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+FRAME_INTERVAL_NS = 16_666_667 # 60 fps
+
+BALL_RADIUS_CM = 3.0
+THROW_FRAMES = 30 # frames per simulated throw
+THROW_START_Z = 100 # cm
+THROW_END_Z = 265 # cm, the screen
+EDGE_MARGIN = 0.05 # keep the ball this fraction of the frame away from the edges
+MATCH_DISTANCE_CM = 10 # detections further than this from the truth count as false positives
+
+# (name, BallDetector keyword arguments, use the pipeline)
+DETECTOR_MODES = [
+    ("serial", {}, False),
+    ("tracked", {"track_targets": True}, False),
+    ("pyramid", {"detection_scale": 2}, False),
+    ("pipeline", {"track_targets": True}, True),
+]
+
+
+def latency_stats(durations_ns: list[int]) -> dict:
+    durations_ms = np.array(durations_ns, dtype=np.float64) / 1e6
+    if len(durations_ms) == 0:
+        return {"calls": 0}
+    return {
+        "calls": len(durations_ms),
+        "throughput_hz": round(len(durations_ms) / (durations_ms.sum() / 1e3), 1) if durations_ms.sum() > 0 else None,
+        "p50_ms": round(float(np.percentile(durations_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(durations_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(durations_ms, 99)), 4),
+        "max_ms": round(float(durations_ms.max()), 4),
+    }
+
+def time_calls(function, inputs) -> dict:
+    durations = []
+    for arguments in inputs:
+        start_ns = time.perf_counter_ns()
+        function(*arguments)
+        durations.append(time.perf_counter_ns() - start_ns)
+    return latency_stats(durations)
+
+def error_stats(errors_cm: list[float], frames: int, false_positives: int) -> dict:
+    errors = np.array(errors_cm, dtype=np.float64)
+    return {
+        "recall": round(len(errors) / frames, 4) if frames else 0.0,
+        "false_positives": false_positives,
+        "mean_cm": round(float(errors.mean()), 3) if len(errors) else None,
+        "p95_cm": round(float(np.percentile(errors, 95)), 3) if len(errors) else None,
+        "max_cm": round(float(errors.max()), 3) if len(errors) else None,
+    }
+
+
+def generate_positions(frames: int, width: int, height: int, rng: np.random.Generator) -> list[tuple[float, float, float]]:
+    # straight throws towards the screen, each one starts and ends somewhere both cameras can see
+    def visible(point):
+        for camera_idx in range(2):
+            pixel_x, pixel_y = project_point(point, camera_idx, width, height, BallDetector.HORIZONTAL_FOV, BallDetector.VERTICAL_FOV, BallDetector.SEPERATION_DISTANCE)
+            if not (EDGE_MARGIN * width < pixel_x < (1 - EDGE_MARGIN) * width and EDGE_MARGIN * height < pixel_y < (1 - EDGE_MARGIN) * height):
+                return False
+        return True
+
+    def random_visible(z):
+        while True:
+            # half of the field of view at that distance, a bit less so the rejection loop stays short
+            half_width = z * math.tan(math.radians(BallDetector.HORIZONTAL_FOV / 2)) * 0.8
+            half_height = z * math.tan(math.radians(BallDetector.VERTICAL_FOV / 2)) * 0.8
+            point = (rng.uniform(-half_width, half_width), rng.uniform(-half_height, half_height), z)
+            if visible(point):
+                return np.array(point)
+
+    positions = []
+    while len(positions) < frames:
+        start, end = random_visible(THROW_START_Z), random_visible(THROW_END_Z)
+        for t in np.linspace(0, 1, THROW_FRAMES):
+            positions.append(tuple(float(value) for value in start + (end - start) * t))
+    return positions[:frames]
+
+def render_scene(filepath: str, width: int, height: int, positions, ball_rgb, rng, args):
+    # writes the stereo pairs to a recording, returns the upright pixel centers per camera
+    recorder = StereoRecorder(filepath, width, height, 4, capacity=len(positions)) # RGBX like the pi captures, so conversion times match
+    centers = []
+    for frame_idx, point in enumerate(positions):
+        left, right, left_center, right_center = render_stereo_pair(
+            width, height, point, BALL_RADIUS_CM, ball_rgb, rng,
+            BallDetector.HORIZONTAL_FOV, BallDetector.VERTICAL_FOV, BallDetector.SEPERATION_DISTANCE,
+            args.brightness, args.noise, args.distractors)
+        timestamp = (frame_idx + 1) * FRAME_INTERVAL_NS
+        recorder.write(left, timestamp, right, timestamp)
+        centers.append((left_center, right_center))
+    recorder.close()
+    return centers
+
+
+def bench_stages(recording: StereoRecording, positions, centers, low_hsv, upper_hsv) -> dict:
+    # each stage on its own, inputs prepared up front so only the stage itself is timed
+    camera = SyntheticCamera(recording.width, recording.height)
+    raw_frames = [cv2.flip(recording.frame(idx, 0)[0], -1) for idx in range(len(recording))] # upright, like zero copy skips the flip
+    hsv_frames = [camera.convert_frame(frame) for frame in raw_frames]
+    masks = [get_target_mask(frame, low_hsv, upper_hsv) for frame in hsv_frames]
+
+    # only the geometry is used here, the replay cameras are stopped right away
+    detector = BallDetector(ReplayCamera(recording, 0, realtime=False), ReplayCamera(recording, 1, realtime=False))
+    detector.left_camera.stop()
+    detector.right_camera.stop()
+    detector.use_calibration = False # ground truth uses the linear FOV model
+    angles = [detector.getAngle(*left) + detector.getAngle(*right) for left, right in centers]
+    center_arrays = [(np.array([left]), np.array([right])) for left, right in centers]
+
+    # exact centers through the scalar and vectorized triangulation, checks the rendering geometry
+    geometry_errors = [math.dist(detector.findPosition(*angle), truth) for angle, truth in zip(angles, positions)]
+
+    detector.executor.shutdown()
+    return {
+        "conversion": time_calls(camera.convert_frame, [(frame,) for frame in raw_frames]),
+        "masking": time_calls(get_target_mask, [(frame, low_hsv, upper_hsv) for frame in hsv_frames]),
+        "contours": time_calls(find_targets, [(mask,) for mask in masks]),
+        "get_targets": time_calls(get_targets, [(frame, low_hsv, upper_hsv) for frame in hsv_frames]),
+        "findPosition": time_calls(detector.findPosition, angles),
+        "findPositions": time_calls(detector.findPositions, center_arrays),
+        "geometry_max_error_cm": round(max(geometry_errors), 6),
+    }
+
+def bench_detector(recording: StereoRecording, positions, detector_kwargs: dict, use_pipeline: bool) -> dict:
+    # the full getTargets path on replayed frames, as fast as it goes
+    left_camera = ReplayCamera(recording, 0, realtime=False, zero_copy=True)
+    right_camera = ReplayCamera(recording, 1, realtime=False, zero_copy=True)
+    detector = BallDetector(left_camera, right_camera, **detector_kwargs)
+    detector.use_calibration = False # ground truth uses the linear FOV model
+    truth_by_timestamp = {(idx + 1) * FRAME_INTERVAL_NS: truth for idx, truth in enumerate(positions)}
+
+    metrics.summary(reset=True)
+    if use_pipeline:
+        detector.start_pipeline()
+
+    durations, errors = [], []
+    false_positives = 0
+    start_time = end_time = time.perf_counter()
+    while True:
+        last_timestamp = detector.last_capture_timestamp_ns
+        start_ns = time.perf_counter_ns()
+        points = detector.getTargets()
+        duration_ns = time.perf_counter_ns() - start_ns
+        timestamp = detector.last_capture_timestamp_ns
+        if timestamp is None or timestamp == last_timestamp:
+            if detector.finished:
+                break
+            continue
+        durations.append(duration_ns)
+        end_time = time.perf_counter() # the wait for frames after the end of the recording doesnt count
+
+        truth = truth_by_timestamp[timestamp]
+        distances = sorted(math.dist(point, truth) for point in points)
+        if distances and distances[0] <= MATCH_DISTANCE_CM:
+            errors.append(distances[0])
+            false_positives += len(distances) - 1
+        else:
+            false_positives += len(distances)
+    elapsed = end_time - start_time
+
+    detector.stop_pipeline()
+    stage_timings = metrics.summary(reset=True)
+    left_camera.stop()
+    right_camera.stop()
+    detector.executor.shutdown()
+
+    result = {
+        "frames_processed": len(durations),
+        "throughput_hz": round(len(durations) / elapsed, 1),
+        "latency": latency_stats(durations),
+        "accuracy": error_stats(errors, len(durations), false_positives), # recall over processed pairs, the pipeline drops some on purpose
+        "stage_timings_ms": stage_timings,
+    }
+    if use_pipeline:
+        result["latency"]["note"] = "time between results, the pipeline overlaps frames"
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detector on rendered stereo frames with known 3D positions")
+    parser.add_argument("--frames", type=int, default=120, help="stereo pairs per resolution")
+    parser.add_argument("--noise", type=float, default=4.0, help="sensor noise standard deviation")
+    parser.add_argument("--brightness", type=float, default=1.0, help="lighting, scales the background")
+    parser.add_argument("--distractors", type=int, default=3, help="ball colored specks per frame")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_report.json")
+    args = parser.parse_args()
+
+    low_hsv, upper_hsv = (configs[0] for configs in hsv_configs())
+    ball_rgb = hsv_to_rgb(target_hsv(low_hsv, upper_hsv))
+
+    report = {
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "scene": {
+            "frames": args.frames, "noise": args.noise, "brightness": args.brightness, "distractors": args.distractors,
+            "seed": args.seed, "ball_radius_cm": BALL_RADIUS_CM,
+            "separation_cm": BallDetector.SEPERATION_DISTANCE,
+            "horizontal_fov": BallDetector.HORIZONTAL_FOV, "vertical_fov": BallDetector.VERTICAL_FOV,
+        },
+        "resolutions": {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in RESOLUTIONS:
+            rng = np.random.default_rng(args.seed)
+            positions = generate_positions(args.frames, width, height, rng)
+            filepath = os.path.join(directory, f"scene_{width}x{height}.rec")
+            print(f"Rendering {args.frames} stereo pairs at {width}x{height}...")
+            centers = render_scene(filepath, width, height, positions, ball_rgb, rng, args)
+            recording = StereoRecording(filepath)
+
+            results = {"stages": bench_stages(recording, positions, centers, low_hsv, upper_hsv), "detector": {}}
+            for name, detector_kwargs, use_pipeline in DETECTOR_MODES:
+                results["detector"][name] = bench_detector(recording, positions, detector_kwargs, use_pipeline)
+                detector_result = results["detector"][name]
+                print(f"  {name:<9} {detector_result['throughput_hz']:>7.1f} fps  recall {detector_result['accuracy']['recall']:.2%}  "
+                      f"mean error {detector_result['accuracy']['mean_cm']} cm")
+            report["resolutions"][f"{width}x{height}"] = results
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# compares single scale detection with the coarse-to-fine pyramid search on rendered frames
+# usage: python bench_pyramid.py [frames per case]
+
+import math
+import sys
+import time
+
+import numpy as np
+
+from analyze_frame import find_targets, get_raw_target_mask, get_targets_pyramid, hsv_configs
+from synthetic import SyntheticCamera, hsv_to_rgb, render_ball_frame, target_hsv
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+SCALES = [1, 2, 4]
+BALL_RADIUS_640 = 12 # ball radius in pixels at 640 wide, scaled with the resolution
+
+
+def main():
+    frames_per_case = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    low_hsv, upper_hsv = (configs[0] for configs in hsv_configs())
+    ball_rgb = hsv_to_rgb(target_hsv(low_hsv, upper_hsv))
+
+    print(f"{'resolution':>11} {'scale':>5} {'fps':>8} {'recall':>7} {'mean err px':>11} {'max err px':>10}")
+    for width, height in RESOLUTIONS:
+        camera = SyntheticCamera(width, height)
+        radius = BALL_RADIUS_640 * width / 640
+        truths = [(rng.uniform(radius, width - radius), rng.uniform(radius, height - radius)) for _ in range(frames_per_case)]
+        frames = [render_ball_frame(width, height, truth, radius, ball_rgb, rng) for truth in truths]
+
+        for scale in SCALES:
+            detections = []
+            start_time = time.perf_counter()
+            for frame in frames:
+                if scale == 1:
+                    detections.append(find_targets(get_raw_target_mask(camera, frame, low_hsv, upper_hsv)))
+                else:
+                    detections.append(get_targets_pyramid(camera, frame, low_hsv, upper_hsv, scale))
+            elapsed = time.perf_counter() - start_time
+
+            errors = [
+                min(math.dist(center, truth) for center, _ in targets)
+                for targets, truth in zip(detections, truths) if targets
+            ]
+            recall = len(errors) / len(frames)
+            mean_error = float(np.mean(errors)) if errors else float("nan")
+            max_error = float(np.max(errors)) if errors else float("nan")
+            print(f"{width:>6}x{height:<4} {scale:>5} {len(frames) / elapsed:>8.1f} {recall:>7.2%} {mean_error:>11.2f} {max_error:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 # Artificial Intelligence was used in this file to : debug errors
 
+import argparse
+import time
 import cv2
 import numpy as np
-from camera import Camera
+from recording import add_camera_arguments, open_camera
+from hsv_calibration import HsvHistograms, region_masks
+
+AUTO_CALIBRATION_FRAMES = 90 # per camera, a few seconds of video
+BACKGROUND_RADIUS_FACTOR = 2 # background starts at this many aim circle radii from the center
 
 def calculate_hsv_stats(hsv_values_list):
     if not hasattr(hsv_values_list, '__len__') or len(hsv_values_list) == 0:
@@ -23,11 +29,86 @@ def calculate_hsv_stats(hsv_values_list):
     }
     return stats
 
+def auto_calibrate(args, circle_radius):
+    # both cameras at once: ENTER starts collecting, the thresholds go straight into hsv_config.json
+    from analyze_frame import CONFIG_FILE_PATH, save_hsv_configs
+
+    cameras = [open_camera(camera_idx, args.replay, args.fast, args.loop, mock=args.mock_camera) for camera_idx in range(2)]
+    histograms = [HsvHistograms() for _ in cameras]
+    masks = None
+    collecting = args.now
+    start_time = time.perf_counter()
+
+    print("Auto calibration: hold the ball inside both circles and press ENTER, Q to quit")
+    while histograms[0].frames < args.frames:
+        frames_hsv = [camera.get_frame() for camera in cameras]
+        if any(frame is None for frame in frames_hsv):
+            print("Error: Could not get frames from both cameras.")
+            if args.replay:
+                break
+            continue
+
+        height, width = frames_hsv[0].shape[:2]
+        center = (width // 2, height // 2)
+        if masks is None:
+            masks = region_masks(height, width, center, circle_radius, circle_radius * BACKGROUND_RADIUS_FACTOR)
+
+        if collecting:
+            for histogram, frame_hsv in zip(histograms, frames_hsv):
+                histogram.add(frame_hsv, *masks)
+
+        if not args.no_display:
+            displays = []
+            for frame_hsv in frames_hsv:
+                frame_bgr = cv2.cvtColor(frame_hsv, cv2.COLOR_HSV2BGR)
+                cv2.circle(frame_bgr, center, circle_radius, (0, 0, 255), 2)
+                cv2.circle(frame_bgr, center, circle_radius * BACKGROUND_RADIUS_FACTOR, (255, 0, 0), 1)
+                displays.append(frame_bgr)
+            status = f"collecting {histograms[0].frames}/{args.frames}" if collecting else "ENTER to start"
+            cv2.putText(displays[0], status, (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+            cv2.imshow("Auto Calibration - Left | Right", np.hstack(displays))
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            elif key == 13 and not collecting:
+                collecting = True
+                start_time = time.perf_counter()
+
+    for camera in cameras:
+        camera.stop()
+    if not args.no_display:
+        cv2.destroyAllWindows()
+
+    if histograms[0].frames < args.frames:
+        print(f"Stopped after {histograms[0].frames} frames, nothing saved.")
+        return
+
+    thresholds = [histogram.thresholds() for histogram in histograms]
+    print(f"Collected {args.frames} frames per camera in {time.perf_counter() - start_time:.1f} s")
+    for camera_idx, (low_hsv, upper_hsv) in enumerate(thresholds):
+        print(f"camera_{camera_idx}: low {low_hsv.tolist()} upper {upper_hsv.tolist()}")
+    save_hsv_configs(CONFIG_FILE_PATH, [low for low, _ in thresholds], [upper for _, upper in thresholds])
+
 def main():
-    camera_index = 0
-    cam = Camera(camera_index)
+    parser = argparse.ArgumentParser(description="Sample the HSV values inside the aiming circle")
+    parser.add_argument("--camera", type=int, default=0, help="camera index, 0 = left, 1 = right")
+    parser.add_argument("--auto", action="store_true", help="derive thresholds for both cameras and save them to hsv_config.json")
+    parser.add_argument("--frames", type=int, default=AUTO_CALIBRATION_FRAMES, help="frames per camera for --auto")
+    parser.add_argument("--now", action="store_true", help="--auto starts collecting right away instead of on ENTER")
+    parser.add_argument("--no-display", action="store_true", help="--auto without windows, implies --now")
+    add_camera_arguments(parser)
+    args = parser.parse_args()
 
     circle_radius = 75 # aim circle radius
+
+    if args.auto:
+        args.now = args.now or args.no_display
+        auto_calibrate(args, circle_radius)
+        return
+
+    camera_index = args.camera
+    cam = open_camera(camera_index, args.replay, args.fast, args.loop, mock=args.mock_camera)
+
     circle_color = (0, 0, 255)
     circle_thickness = 2
 
@@ -74,9 +155,9 @@ def main():
                 print("No pixels found in the circle. Make sure the circle is on the object.")
                 continue
 
-            h_stats = calculate_hsv_stats(h_values_in_circle.tolist())
-            s_stats = calculate_hsv_stats(s_values_in_circle.tolist())
-            v_stats = calculate_hsv_stats(v_values_in_circle.tolist())
+            h_stats = calculate_hsv_stats(h_values_in_circle)
+            s_stats = calculate_hsv_stats(s_values_in_circle)
+            v_stats = calculate_hsv_stats(v_values_in_circle)
 
             print(f"Hue - Count: {h_stats['count']}")
             print(f"  Min: {h_stats['min']}, Q1: {h_stats['q1']}, Median: {h_stats['median']}, Q3: {h_stats['q3']}, Mean: {h_stats['mean']}, Max: {h_stats['max']}")
@@ -0,0 +1,173 @@
+# Artificial Intelligence was used in this file to : debug errors, research camera calibration
+
+# lens calibration from checkerboard captures
+# usage: python calibration.py <camera index>
+#   SPACE = keep the current frame (only when the board is found), C = calibrate and save, Q = quit
+
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from capture_config import FULL_SENSOR_WINDOW, upright_window
+
+CALIBRATION_FILE_PATH = "camera_calibration.json" # lives next to hsv_config.json
+
+CHECKERBOARD = (9, 6) # inner corners per row, per column
+SQUARE_SIZE_CM = 2.5
+MIN_CALIBRATION_FRAMES = 10
+WINDOW_TOLERANCE = 1e-3 # share of the sensor, rounding in crop_limits
+
+
+def find_checkerboard(frame_gray: np.ndarray) -> np.ndarray | None:
+    found, corners = cv2.findChessboardCorners(frame_gray, CHECKERBOARD, cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    return cv2.cornerSubPix(frame_gray, corners, (11, 11), (-1, -1), criteria)
+
+def calibrate(corners_list: list[np.ndarray], image_size: tuple[int, int], sensor_window=FULL_SENSOR_WINDOW) -> dict:
+    # image_size = (width, height), sensor_window = Camera.sensor_window() the frames were taken with,
+    # returns the entry that gets saved for one camera
+    board_points = np.zeros((CHECKERBOARD[0] * CHECKERBOARD[1], 3), np.float32)
+    board_points[:, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2) * SQUARE_SIZE_CM
+
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera([board_points] * len(corners_list), corners_list, image_size, None, None)
+    return {
+        "image_size": list(image_size),
+        "sensor_window": list(sensor_window),
+        "camera_matrix": camera_matrix.tolist(),
+        "dist_coeffs": dist_coeffs.ravel().tolist(),
+        "rms": float(rms),
+    }
+
+def load_calibrations(filepath: str = CALIBRATION_FILE_PATH) -> dict:
+    if not os.path.exists(filepath):
+        return {}
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def save_calibration(camera_idx: int, calibration: dict, filepath: str = CALIBRATION_FILE_PATH):
+    calibrations = load_calibrations(filepath)
+    calibrations[f"camera_{camera_idx}"] = calibration
+    try:
+        with open(filepath, 'w') as f:
+            json.dump(calibrations, f, indent=4)
+        print(f"Calibration for camera {camera_idx} saved to {filepath}")
+    except Exception as e:
+        print(f"Error saving calibration to {filepath}: {e}")
+
+
+class RayTable:
+    # (yaw, pitch) in degrees for every pixel of the upright frame, lens distortion already taken out,
+    # so the angle of a detected center is an array lookup instead of an undistortion per frame
+    # sensor_window: Camera.sensor_window() of the frames the table is for. ValueError when it reaches outside
+    # the part of the sensor the calibration saw, the lens model isnt known there
+    def __init__(self, calibration: dict, width: int, height: int, sensor_window=FULL_SENSOR_WINDOW):
+        camera_matrix = np.array(calibration["camera_matrix"], dtype=np.float64)
+        dist_coeffs = np.array(calibration["dist_coeffs"], dtype=np.float64)
+        camera_matrix[:2] = rescale_intrinsics(camera_matrix[:2], calibration, width, height, sensor_window)
+
+        pixels = np.mgrid[0:height, 0:width][::-1].reshape(2, -1).T.astype(np.float64)
+        normalized = cv2.undistortPoints(pixels.reshape(-1, 1, 2), camera_matrix, dist_coeffs).reshape(height, width, 2)
+
+        # same conventions as the linear model: yaw in the XZ plane, pitch in the YZ plane, both 0 on the optical axis
+        self.angles = np.degrees(np.arctan(normalized)).astype(np.float32)
+        self.width = width
+        self.height = height
+
+    def lookup(self, pixels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # bilinear interpolation so sub-pixel centers keep their precision
+        pixel_x = np.clip(pixels[:, 0], 0, self.width - 1)
+        pixel_y = np.clip(pixels[:, 1], 0, self.height - 1)
+        x0 = np.minimum(pixel_x.astype(np.intp), self.width - 2)
+        y0 = np.minimum(pixel_y.astype(np.intp), self.height - 2)
+        fx = (pixel_x - x0)[:, None]
+        fy = (pixel_y - y0)[:, None]
+
+        top = self.angles[y0, x0] * (1 - fx) + self.angles[y0, x0 + 1] * fx
+        bottom = self.angles[y0 + 1, x0] * (1 - fx) + self.angles[y0 + 1, x0 + 1] * fx
+        angles = top * (1 - fy) + bottom * fy
+        return angles[:, 0].astype(np.float64), angles[:, 1].astype(np.float64)
+
+
+def rescale_intrinsics(rows: np.ndarray, calibration: dict, width: int, height: int, sensor_window) -> np.ndarray:
+    # the fx/cx and fy/cy rows of the camera matrix for frames of width x height showing sensor_window.
+    # pixels go back to shares of the whole sensor through the window the calibration was made with (calibrations from
+    # before windows were saved were made in the full view mode), then out through the new one. same window = plain scaling
+    calibrated_width, calibrated_height = calibration["image_size"]
+    old_x, old_y, old_w, old_h = upright_window(calibration.get("sensor_window", FULL_SENSOR_WINDOW))
+    new_x, new_y, new_w, new_h = upright_window(sensor_window)
+    if (new_x < old_x - WINDOW_TOLERANCE or new_y < old_y - WINDOW_TOLERANCE
+            or new_x + new_w > old_x + old_w + WINDOW_TOLERANCE or new_y + new_h > old_y + old_h + WINDOW_TOLERANCE):
+        raise ValueError(f"the frames show sensor area {tuple(round(v, 3) for v in sensor_window)}, outside the "
+                         f"{tuple(round(v, 3) for v in calibration.get('sensor_window', FULL_SENSOR_WINDOW))} the lens was calibrated on")
+    rows = rows.copy()
+    for row, size, calibrated_size, old_start, old_size, new_start, new_size in (
+            (rows[0], width, calibrated_width, old_x, old_w, new_x, new_w),
+            (rows[1], height, calibrated_height, old_y, old_h, new_y, new_h)):
+        to_sensor = old_size / calibrated_size # calibrated pixels -> share of the sensor
+        from_sensor = size / new_size # share of the sensor -> new pixels
+        center = old_start + row[2] * to_sensor
+        row[:2] *= to_sensor * from_sensor # focal length (and skew)
+        row[2] = (center - new_start) * from_sensor
+    return rows
+
+def load_ray_tables(width: int, height: int, sensor_windows=(FULL_SENSOR_WINDOW, FULL_SENSOR_WINDOW),
+                    filepath: str = CALIBRATION_FILE_PATH) -> list[RayTable] | None:
+    # [left, right] tables, None until both cameras have been calibrated, or when a camera shows part of the sensor
+    # its calibration didnt cover (then the linear model is used, with a warning)
+    calibrations = load_calibrations(filepath)
+    if "camera_0" not in calibrations or "camera_1" not in calibrations:
+        return None
+    try:
+        return [RayTable(calibrations[f"camera_{idx}"], width, height, sensor_windows[idx]) for idx in range(2)]
+    except ValueError as e:
+        print(f"Lens calibration doesnt fit the current sensor mode ({e}), using the linear FOV model for angles.")
+        return None
+
+
+def main():
+    from camera import Camera
+
+    camera_idx = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    cam = Camera(camera_idx)
+    corners_list = []
+    image_size = None
+
+    print(f"Calibrating camera {camera_idx}: SPACE to keep a frame, C to calibrate, Q to quit")
+    while True:
+        frame_hsv = cam.get_frame()
+        if frame_hsv is None:
+            continue
+        frame_bgr = cv2.cvtColor(frame_hsv, cv2.COLOR_HSV2BGR)
+        frame_gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        image_size = (frame_gray.shape[1], frame_gray.shape[0])
+
+        corners = find_checkerboard(frame_gray)
+        if corners is not None:
+            cv2.drawChessboardCorners(frame_bgr, CHECKERBOARD, corners, True)
+        cv2.putText(frame_bgr, f"frames: {len(corners_list)}", (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        cv2.imshow(f"Calibration - Camera {camera_idx}", frame_bgr)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+        elif key == ord(' ') and corners is not None:
+            corners_list.append(corners)
+            print(f"Kept frame {len(corners_list)}")
+        elif key == ord('c'):
+            if len(corners_list) < MIN_CALIBRATION_FRAMES:
+                print(f"Need at least {MIN_CALIBRATION_FRAMES} frames, have {len(corners_list)}")
+                continue
+            calibration = calibrate(corners_list, image_size, cam.sensor_window())
+            print(f"RMS reprojection error: {calibration['rms']:.3f} px")
+            save_calibration(camera_idx, calibration)
+
+    cam.stop()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
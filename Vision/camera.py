@@ -2,8 +2,21 @@
 
 import cv2
 import numpy as np
-from picamera2 import Picamera2 # type: ignore
+try:
+    from picamera2 import Picamera2, MappedArray # type: ignore
+except ImportError: # off the pi, only ReplayCamera (recording.py) can be used
+    Picamera2 = MappedArray = None
+import sys
 import time
+import threading
+from collections import deque
+
+from capture_config import CaptureSettings, FPS_TOLERANCE, choose_sensor_mode, describe_mode, measure_fps, sensor_modes, sensor_window, video_configuration
+from instrumentation import metrics, log
+
+class EndOfStream(Exception):
+    # capture_raw of a source that has no more frames (a recording that ran out), the capture loop stops on it quietly
+    pass
 
 class Camera:
     DIAGONAL_FOV = 62
@@ -20,32 +33,234 @@ class Camera:
     VERTICAL_RES = 480
 
     FPS = 30 * 2
+    # same for both cameras: frame duration locked to FPS, 2 ms exposure so a thrown ball doesnt smear (see capture_config.py)
+    CAPTURE_SETTINGS = CaptureSettings(fps=FPS, exposure_us=2000, analogue_gain=4.0)
+    VERIFY_FRAMES = 8 # frames timed at startup to check the sensor really runs at FPS, they double as warmup
+    FPS_WINDOW = 120 # sensor timestamps kept for measured_fps()
+
+    # libcamera's camera manager is shared, so cameras are opened one at a time. configuring and starting them can overlap
+    _open_lock = threading.Lock()
+
+    FRAME_HISTORY = 2 # latest frame slots kept by the capture thread (double buffer)
+
+    CAPTURE_FORMAT = "XBGR8888" # R, G, B, X bytes per pixel, converts to HSV in one cvtColor
+    # zero copy mode converts into reused HSV buffers: FRAME_HISTORY buffered, one being converted and however many
+    # the consumer holds (hold_frames). a buffer is only converted into again once nothing refers to it anymore,
+    # not _frames, not a consumer, not a view of it (views keep their base alive). when every buffer is still in use
+    # a new one is added instead of overwriting one
+    FREE_BUFFER_REFCOUNT = 3 # sys.getrefcount of a buffer only _hsv_buffers holds: the list, the loop variable, the argument
     
-    def __init__(self, index):
+    def __init__(self, index, zero_copy=False, backend=None):
         print(f"Initializing camera at index {index}...")
-        self.camera = Picamera2(index)
-        self.camera.configure(self.camera.create_video_configuration(main={"size": (self.HORZONTAL_RES, self.VERTICAL_RES)}))
+        self.camera_id = index
+        # zero copy: convert straight out of the capture buffer into reused HSV buffers and skip the flip,
+        # frames stay upside down and BallDetector.getAngle rotates the detected centers instead
+        self.zero_copy = zero_copy
+        # backend: a module with Picamera2 and MappedArray, mock_picamera2 off the pi. None = the real picamera2
+        self._picamera2 = backend.Picamera2 if backend is not None else Picamera2
+        self._mapped_array = backend.MappedArray if backend is not None else MappedArray
+        if self._picamera2 is None:
+            raise RuntimeError("picamera2 is not installed, use a recording (recording.py, --replay) or --mock-camera instead")
+        with self._open_lock:
+            self.camera = self._picamera2(index)
+        self.sensor_modes = sensor_modes(self.camera)
+        self.sensor_mode = None # set by _video_configuration()
+        self.camera.configure(self._video_configuration())
         self.camera.start()
-        # self.camera.set_controls({"ExposureTime": 5000}) 
-        time.sleep(0.1) # warmup
 
-    def get_frame(self):
-        frame_rgb = self.camera.capture_array()
+        self._init_capture_state()
+        self.startup_fps = self.verify_frame_rate()
+        print(f"Camera {index}: sensor mode {describe_mode(self.sensor_mode, self.sensor_modes)}, "
+              f"{self.HORZONTAL_RES}x{self.VERTICAL_RES} out, measured {self.startup_fps or 0:.1f} fps")
+
+    def _video_configuration(self):
+        # the sensor mode is picked again for every output size, both cameras pick the same one from the same list
+        self.sensor_mode = choose_sensor_mode(self.sensor_modes, (self.HORZONTAL_RES, self.VERTICAL_RES), self.CAPTURE_SETTINGS.fps,
+                                              self.CAPTURE_SETTINGS.allow_crop)
+        return video_configuration(self.camera, (self.HORZONTAL_RES, self.VERTICAL_RES), self.CAPTURE_FORMAT, self.CAPTURE_SETTINGS, self.sensor_mode)
+
+    def verify_frame_rate(self, frames: int | None = None) -> float | None:
+        # frame rate from the sensor timestamps of a few frames, before the capture loop runs. warns when the
+        # sensor cant keep up with FPS (e.g. exposure longer than a frame, or a mode that is too slow)
+        timestamps = []
+        for _ in range(frames or self.VERIFY_FRAMES):
+            request = self.camera.capture_request()
+            try:
+                timestamp = request.get_metadata().get("SensorTimestamp")
+            finally:
+                request.release()
+            if timestamp is not None:
+                timestamps.append(timestamp)
+        fps = measure_fps(timestamps)
+        if fps is not None and fps < self.CAPTURE_SETTINGS.fps * FPS_TOLERANCE:
+            print(f"Warning: camera {self.camera_id} runs at {fps:.1f} fps, {self.CAPTURE_SETTINGS.fps:.0f} were asked for")
+        return fps
+
+    def sensor_window(self) -> tuple[float, float, float, float]:
+        # which part of the sensor the frames show (capture_config.sensor_window), changes with reconfigure()
+        return sensor_window(self.sensor_mode, self.sensor_modes, (self.HORZONTAL_RES, self.VERTICAL_RES))
+
+    def measured_fps(self) -> float | None:
+        # from the sensor timestamps of the last FPS_WINDOW captured frames
+        with self._frames_condition:
+            timestamps = list(self._timestamps)
+        return measure_fps(timestamps)
+
+    def reconfigure(self, width: int, height: int):
+        # new output size without restarting the process: stop the capture loop and the sensor, configure, start again.
+        # frame_count keeps counting so consumers pairing frames by count dont have to start over
+        was_capturing = self.capturing
+        self.stop_capture()
+        self.camera.stop()
+        self.HORZONTAL_RES, self.VERTICAL_RES = width, height
+        self.camera.configure(self._video_configuration())
+        self.camera.start()
+        self._reset_buffers()
+        if was_capturing:
+            self.start_capture()
+
+    def _reset_buffers(self):
+        # frames of the old size are dropped, frames already handed out stay valid
+        with self._frames_condition:
+            self._frames.clear()
+            self._timestamps.clear()
+        self._hsv_buffers = []
+        self._add_hsv_buffers()
+
+    def _add_hsv_buffers(self):
+        if self.zero_copy:
+            missing = self.FRAME_HISTORY + 1 + self.frames_held - len(self._hsv_buffers)
+            self._hsv_buffers += [np.empty((self.VERTICAL_RES, self.HORZONTAL_RES, 3), dtype=np.uint8) for _ in range(missing)]
+
+    def hold_frames(self, count: int):
+        # most frames the consumer keeps at once after getting them: 1 when detecting serially,
+        # DetectionPipeline.frames_held() pipelined. only ever grows, zero copy mode gets enough buffers for it
+        self.frames_held = max(self.frames_held, count)
+        self._add_hsv_buffers()
 
+    def _init_capture_state(self):
+        # background capture state, only used after start_capture()
+        self.capturing = False
+        self.capture_thread = None
+        self.frame_count = 0
+        self._frames = deque(maxlen=self.FRAME_HISTORY) # (sensor_timestamp_ns, frame_count, raw frame)
+        self._frames_condition = threading.Condition()
+        self._timestamps = deque(maxlen=self.FPS_WINDOW)
+        self.frames_held = 1
+        self._reset_buffers()
+
+    def capture_raw(self):
+        # returns (frame, SensorTimestamp in ns)
+        # normal mode: the raw RGBX capture, no conversion. zero copy mode: an HSV frame already (see convert_frame)
+        request = self.camera.capture_request()
+        try:
+            if self.zero_copy:
+                with self._mapped_array(request, "main") as mapped:
+                    frame = self._convert_into_buffer(mapped.array)
+            else:
+                frame = request.make_array("main")
+            timestamp = request.get_metadata().get("SensorTimestamp")
+        finally:
+            request.release()
+        if timestamp is None:
+            timestamp = time.monotonic_ns() # older firmware doesnt always report it
+        return frame, timestamp
+
+    def _free_hsv_buffer(self):
+        # a frame stays valid for as long as anything holds it, a slow detection pass just means one buffer more
+        for buffer in self._hsv_buffers:
+            if sys.getrefcount(buffer) <= self.FREE_BUFFER_REFCOUNT:
+                return buffer
+        log.log(f"hsv_buffers_{self.camera_id}", f"Camera {self.camera_id}: all {len(self._hsv_buffers)} HSV buffers in use, adding one")
+        buffer = np.empty((self.VERTICAL_RES, self.HORZONTAL_RES, 3), dtype=np.uint8)
+        self._hsv_buffers.append(buffer)
+        return buffer
+
+    def _convert_into_buffer(self, frame_rgb):
+        frame_hsv = self._free_hsv_buffer()
+        with metrics.stage("conversion"):
+            cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2HSV, dst=frame_hsv)
+        return frame_hsv
+
+    def orient(self, image):
+        # cameras are mounted upside down, zero copy mode leaves that to the detected coordinates
+        if self.zero_copy:
+            return image
+        return cv2.flip(image, -1)
+
+    def crop_raw(self, frame_raw, window):
+        # window is (x0, y0, x1, y1) in processed frame coordinates, returns the matching view of the raw frame
+        # so that convert_frame(crop) == convert_frame(frame)[y0:y1, x0:x1]
+        x0, y0, x1, y1 = window
+        if not self.zero_copy:
+            height, width = frame_raw.shape[:2]
+            x0, y0, x1, y1 = width - x1, height - y1, width - x0, height - y0
+        return frame_raw[y0:y1, x0:x1]
+
+    def convert_frame(self, frame_rgb):
         if frame_rgb is None:
             return None
 
-        frame_flipped = cv2.flip(frame_rgb, -1) 
-        
-        frame_bgr = cv2.cvtColor(frame_flipped, cv2.COLOR_RGB2BGR)
+        if self.zero_copy:
+            return frame_rgb # capture_raw already converted it
+
+        frame_flipped = self.orient(frame_rgb) 
         
-        # BGR -> HSV
-        frame_hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
+        # RGB(X) -> HSV in one go, same result as going through BGR first
+        frame_hsv = cv2.cvtColor(frame_flipped, cv2.COLOR_RGB2HSV)
         
         return frame_hsv
+
+    def get_frame(self):
+        if self.zero_copy:
+            frame_hsv, _ = self.capture_raw()
+            return frame_hsv
+        frame_rgb = self.camera.capture_array()
+        return self.convert_frame(frame_rgb)
+
+    def start_capture(self):
+        # free running capture loop so the sensor never waits on processing
+        if self.capturing:
+            return
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self._capture_loop, name=f"CaptureThread{self.camera_id}")
+        self.capture_thread.daemon = True
+        self.capture_thread.start()
+
+    def _capture_loop(self):
+        while self.capturing:
+            try:
+                frame_raw, timestamp = self.capture_raw()
+            except EndOfStream:
+                return
+            except Exception as e:
+                log.log(f"capture_error_{self.camera_id}", f"Capture error on camera {self.camera_id}: {e}")
+                time.sleep(0.01)
+                continue
+            with self._frames_condition:
+                self.frame_count += 1
+                self._frames.append((timestamp, self.frame_count, frame_raw))
+                self._timestamps.append(timestamp)
+                self._frames_condition.notify_all()
+
+    def get_latest_frames(self, newer_than=0, timeout=1.0):
+        # waits for a frame newer than frame_count newer_than, then returns every buffered
+        # (sensor_timestamp_ns, frame_count, raw frame), oldest first
+        # _frames is empty for a moment after reconfigure() while frame_count is not, so both are waited on
+        with self._frames_condition:
+            if not self._frames_condition.wait_for(lambda: self.frame_count > newer_than and self._frames, timeout):
+                return []
+            return list(self._frames)
+
+    def stop_capture(self):
+        self.capturing = False
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=1.0)
+            self.capture_thread = None
     
     def stop(self):
         print("Stopping camera...")
+        self.stop_capture()
         self.camera.stop()
 
 
@@ -0,0 +1,347 @@
+# Artificial Intelligence was used in this file to : debug errors, research multiprocessing and shared memory
+
+# one process per camera: capture, masking, contours and tracking run in a worker process per camera, so the
+# python glue of both cameras and the TCP threads no longer share one interpreter (the pi has four cores)
+#   - every captured frame goes into a FrameRing, a ring of frame slots in multiprocessing.shared_memory that the
+#     coordinator created, and is detected right there. any process can read a frame back by slot, nothing is pickled
+#   - only (frame count, timestamp, slot, targets) records go to the coordinator, through one queue per worker,
+#     after one ("sensor_window", window) record so the coordinator's angle model knows what part of the sensor is seen
+#   - the coordinator side is CameraWorker, which stands in for Camera, and MultiprocessDetector, a BallDetector
+#     that pairs records instead of frames and triangulates them. TCPClient takes it like any BallDetector
+#   - a worker that crashes is started again (with backoff), stop() shuts everything down and frees the memory
+#   - recordings always replay in real time here: --fast keeps the two sides in lockstep through the one consumer of
+#     both ReplayCameras, two workers running flat out drift apart and hardly ever form a stereo pair
+# usage: python camera_workers.py [--replay FILE] [--loop]   prints positions like hello.py
+
+import math
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from analyze_frame import blob_limits, find_targets, get_raw_target_mask, get_targets_pyramid, blob_backend_configs, hsv_configs
+from camera import Camera
+from capture_config import FULL_SENSOR_WINDOW
+from hello import BallDetector
+from instrumentation import metrics, log
+from recording import StereoRecording, open_camera
+from tracker import TargetTracker
+
+RING_SLOTS = 4 # frames kept per camera, a frame can be read back until RING_SLOTS newer ones were captured
+RECORD_QUEUE_SIZE = 32 # records waiting for the coordinator, a worker drops records instead of blocking on it
+HEADER_ALIGNMENT = 64 # frames start on a cache line
+
+# spawn, not fork: libcamera doesnt survive a fork, and the coordinator already runs threads
+CONTEXT = get_context("spawn")
+
+
+class FrameRing:
+    # frames of one camera in shared memory, a header row (frame count, timestamp) per slot then the slots
+    # frame count 0 = empty, -1 = being written. name=None creates the memory, otherwise attaches to it
+    def __init__(self, shape: tuple[int, ...], slots: int = RING_SLOTS, name: str | None = None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_size = -(-slots * 16 // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+        size = header_size + slots * math.prod(self.shape)
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.name = self.memory.name
+        self.headers = np.ndarray((slots, 2), dtype=np.int64, buffer=self.memory.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf, offset=header_size)
+        if name is None:
+            self.headers[:] = 0
+
+    def write(self, frame: np.ndarray, frame_count: int, timestamp_ns: int) -> int:
+        # only the worker of this camera writes, returns the slot
+        slot = frame_count % self.slots
+        self.headers[slot, 0] = -1 # readers that see this (or a different count afterwards) know the copy is torn
+        np.copyto(self.frames[slot], frame)
+        self.headers[slot, 1] = timestamp_ns
+        self.headers[slot, 0] = frame_count
+        return slot
+
+    def read(self, slot: int, frame_count: int) -> np.ndarray | None:
+        # copy of the frame if the slot still holds frame_count, None once it was overwritten
+        if self.headers[slot, 0] != frame_count:
+            return None
+        frame = self.frames[slot].copy()
+        if self.headers[slot, 0] != frame_count:
+            return None
+        return frame
+
+    def close(self):
+        # the numpy views have to go before the memory can be closed
+        self.headers = self.frames = None
+        self.memory.close()
+
+    def unlink(self):
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def frame_shape(replay: str | None = None, zero_copy: bool = False) -> tuple[int, int, int]:
+    # (height, width, channels) of what capture_raw hands out, zero copy frames are HSV already
+    if replay is not None:
+        recording = StereoRecording(replay)
+        height, width, channels = recording.height, recording.width, recording.channels
+    else:
+        height, width, channels = Camera.VERTICAL_RES, Camera.HORZONTAL_RES, 4 # XBGR8888
+    return height, width, 3 if zero_copy else channels
+
+
+def run_camera_worker(camera_idx: int, ring_name: str, shape: tuple, records, stop_event, source: dict, detector_kwargs: dict):
+    # body of a worker process. returns normally on stop or at the end of a recording, anything else is a crash
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C goes to the whole process group, the coordinator stops us
+    camera = open_camera(camera_idx, **source)
+    records.put(("sensor_window", camera.sensor_window()))
+    ring = FrameRing(shape, name=ring_name)
+    low_hsv_configs, upper_hsv_configs = hsv_configs()
+    low_hsv, upper_hsv = low_hsv_configs[camera_idx], upper_hsv_configs[camera_idx]
+    tracker = TargetTracker(camera.HORZONTAL_RES, camera.VERTICAL_RES) if detector_kwargs.get("track_targets") else None
+    detection_scale = detector_kwargs.get("detection_scale", 1)
+    centroid_mode = detector_kwargs.get("centroid_mode")
+    blob_backends = detector_kwargs.get("blob_backends") or blob_backend_configs()
+    backend = blob_backends[camera_idx]
+    min_area, min_radius = blob_limits(camera.HORZONTAL_RES)
+
+    camera.start_capture()
+    last_count = 0
+    dropped = 0
+    try:
+        while not stop_event.is_set():
+            frames = camera.get_latest_frames(last_count, timeout=0.1)
+            frames = [frame for frame in frames if frame[1] > last_count]
+            if not frames:
+                if getattr(camera, "finished", False):
+                    break
+                continue
+            timestamp, frame_count, frame_raw = frames[-1]
+            if frame_raw.shape != ring.shape:
+                raise ValueError(f"camera {camera_idx} gives {frame_raw.shape} frames, the ring was made for {ring.shape}")
+            slot = ring.write(frame_raw, frame_count, timestamp)
+            frame_raw = ring.frames[slot]
+
+            # same detection as BallDetector._get_frame_and_targets, on the frame in shared memory
+            window = tracker.search_window() if tracker is not None else None
+            if window is None and detection_scale > 1:
+                targets = get_targets_pyramid(camera, frame_raw, low_hsv, upper_hsv, detection_scale, min_area, min_radius, centroid_mode, backend)
+            else:
+                targets = find_targets(get_raw_target_mask(camera, frame_raw, low_hsv, upper_hsv, window), min_area, min_radius, centroid_mode, backend)
+            if tracker is not None:
+                targets = tracker.update(targets, window)
+
+            record = (frame_count, timestamp, slot, tuple((float(center[0]), float(center[1]), float(radius)) for center, radius in targets))
+            try:
+                records.put_nowait(record)
+            except queue.Full:
+                dropped += 1
+                log.log("record_dropped", f"Camera worker {camera_idx}: coordinator is behind, {dropped} records dropped")
+            last_count = frame_count
+            metrics.report_if_due()
+    finally:
+        camera.stop()
+        ring.close()
+
+
+class CameraWorker:
+    # stands in for Camera in the coordinator. the camera lives in a worker process, get_latest_frames hands out
+    # (timestamp, frame count, targets) instead of frames, so BallDetector's stereo pairing works on them unchanged
+    FRAME_HISTORY = 4 # a bit more than Camera, the two workers dont run in lockstep
+    RESTART_DELAY = 0.5 # seconds before restarting a crashed worker, doubles with every crash in a row
+    MAX_RESTART_DELAY = 5.0
+    STOP_TIMEOUT = 3.0
+
+    def __init__(self, camera_idx: int, replay: str | None = None, fast: bool = False, loop: bool = False, zero_copy: bool = False, mock: bool = False,
+                 track_targets: bool = False, detection_scale: int = 1, centroid_mode: str | None = None, blob_backends: list[str] | None = None):
+        self.camera_id = camera_idx
+        if replay is not None and fast:
+            print(f"Camera worker {camera_idx}: fast replay cant keep two worker processes in lockstep, replaying in real time")
+            fast = False
+        self.zero_copy = zero_copy # frames_rotated in BallDetector follows it, same as Camera
+        self.source = {"replay": replay, "fast": fast, "loop": loop, "zero_copy": zero_copy, "mock": mock}
+        self.detector_kwargs = {"track_targets": track_targets, "detection_scale": detection_scale, "centroid_mode": centroid_mode, "blob_backends": blob_backends}
+        shape = frame_shape(replay, zero_copy)
+        self.VERTICAL_RES, self.HORZONTAL_RES = shape[:2]
+
+        self.ring = FrameRing(shape)
+        self.process = None
+        self.records = None
+        self.stop_event = None
+        self.receive_thread = None
+        self.capturing = False
+        self.finished = False # the worker ran out of frames (end of a recording)
+
+        # (timestamp, frame_count, targets) like Camera._frames, frame_count counts records so it keeps going up across restarts
+        self.frame_count = 0
+        self._frames = deque(maxlen=self.FRAME_HISTORY)
+        self._frames_condition = threading.Condition()
+        self._last_slot = None # (slot, worker frame count) of the newest record, for latest_frame()
+        self._sensor_window = FULL_SENSOR_WINDOW # the worker's camera.sensor_window(), sent before its first frame
+
+        self.restarts = 0
+        self._restart_delay = self.RESTART_DELAY
+
+    def _start_process(self):
+        # a fresh queue every time, one the old worker died while writing to may be broken
+        self.records = CONTEXT.Queue(RECORD_QUEUE_SIZE)
+        self.stop_event = CONTEXT.Event()
+        self.process = CONTEXT.Process(
+            target=run_camera_worker, name=f"CameraWorker{self.camera_id}",
+            args=(self.camera_id, self.ring.name, self.ring.shape, self.records, self.stop_event, self.source, self.detector_kwargs))
+        self.process.daemon = True
+        self.process.start()
+
+    def start_capture(self):
+        if self.capturing:
+            return
+        self.capturing = True
+        self._start_process()
+        self.receive_thread = threading.Thread(target=self._receive_loop, name=f"CameraWorkerReceiver{self.camera_id}")
+        self.receive_thread.daemon = True
+        self.receive_thread.start()
+
+    def _receive_loop(self):
+        # takes the worker's records and restarts it when it dies
+        while self.capturing:
+            try:
+                record = self.records.get(timeout=0.1)
+            except queue.Empty:
+                if not self.process.is_alive() and self.capturing:
+                    self._handle_exit()
+                continue
+            except (EOFError, OSError):
+                continue # the worker died halfway through a record, the next get notices it is gone
+            if record[0] == "sensor_window":
+                self._sensor_window = tuple(record[1])
+                continue
+            frame_count, timestamp, slot, targets = record
+            self._restart_delay = self.RESTART_DELAY
+            with self._frames_condition:
+                self.frame_count += 1
+                self._frames.append((timestamp, self.frame_count, [((x, y), radius) for x, y, radius in targets]))
+                self._last_slot = (slot, frame_count)
+                self._frames_condition.notify_all()
+
+    def _handle_exit(self):
+        exitcode = self.process.exitcode
+        if exitcode == 0:
+            print(f"Camera worker {self.camera_id} finished.")
+            with self._frames_condition:
+                self.finished = True
+                self.capturing = False
+                self._frames_condition.notify_all()
+            return
+        self.restarts += 1
+        print(f"Camera worker {self.camera_id} exited with code {exitcode}, restarting in {self._restart_delay:.1f} s (restart {self.restarts})")
+        self.records.close()
+        self.records.cancel_join_thread()
+        time.sleep(self._restart_delay)
+        self._restart_delay = min(self._restart_delay * 2, self.MAX_RESTART_DELAY)
+        if self.capturing:
+            self._start_process()
+
+    def get_latest_frames(self, newer_than=0, timeout=1.0):
+        with self._frames_condition:
+            if not self._frames_condition.wait_for(lambda: self.frame_count > newer_than or self.finished, timeout):
+                return []
+            if self.frame_count <= newer_than:
+                return [] # finished, nothing more is coming
+            return list(self._frames)
+
+    def sensor_window(self) -> tuple[float, float, float, float]:
+        return self._sensor_window
+
+    def latest_frame(self) -> np.ndarray | None:
+        # copy of the raw frame behind the newest record, straight out of shared memory. None if it was overwritten already
+        with self._frames_condition:
+            last_slot = self._last_slot
+        if last_slot is None:
+            return None
+        return self.ring.read(*last_slot)
+
+    def stop_capture(self):
+        if self.process is None:
+            return
+        self.capturing = False
+        self.stop_event.set()
+        if self.receive_thread is not None:
+            self.receive_thread.join(timeout=1.0)
+            self.receive_thread = None
+        self.process.join(self.STOP_TIMEOUT)
+        if self.process.is_alive():
+            print(f"Camera worker {self.camera_id} did not stop in time, terminating it.")
+            self.process.terminate()
+            self.process.join(self.STOP_TIMEOUT)
+        self.records.close()
+        self.records.cancel_join_thread()
+        self.process = None
+        with self._frames_condition:
+            self._frames_condition.notify_all()
+
+    def stop(self):
+        print(f"Stopping camera worker {self.camera_id}...")
+        self.stop_capture()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+    def stats(self) -> dict:
+        return {"records": self.frame_count, "restarts": self.restarts, "alive": self.process is not None and self.process.is_alive()}
+
+
+class MultiprocessDetector(BallDetector):
+    # BallDetector for two CameraWorkers: the workers already did capture, masking, contours and tracking,
+    # this process only pairs their records by timestamp and triangulates
+    def __init__(self, left_worker: CameraWorker, right_worker: CameraWorker):
+        super().__init__(left_worker, right_worker) # starts the workers through start_capture()
+
+    def start_pipeline(self, depth: int = 2):
+        pass # the workers overlap capture and detection on their own
+
+    def getTargets(self, max_points: int = BallDetector.MAX_TARGETS) -> list[tuple[float, float, float]]:
+        stereo_pair = self._get_stereo_pair()
+        if stereo_pair is None:
+            return []
+        left_targets, right_targets, self.last_capture_timestamp_ns = stereo_pair
+        return self._triangulate(left_targets, right_targets, max_points)
+
+    def worker_stats(self) -> dict[str, dict]:
+        return {"left": self.left_camera.stats(), "right": self.right_camera.stats()}
+
+    def stop(self):
+        self.left_camera.stop()
+        self.right_camera.stop()
+        self.executor.shutdown()
+
+
+def open_camera_workers(args, zero_copy: bool = False, **detector_kwargs) -> tuple[CameraWorker, CameraWorker]:
+    # open_cameras_from_args for the multiprocess mode, detector_kwargs are the BallDetector ones (track_targets, ...)
+    return tuple(CameraWorker(camera_idx, args.replay, args.fast, args.loop, zero_copy, args.mock_camera, **detector_kwargs) for camera_idx in range(2))
+
+
+if __name__ == "__main__":
+    import argparse
+    from recording import add_camera_arguments
+
+    parser = argparse.ArgumentParser(description="Print the detected ball position, one process per camera")
+    add_camera_arguments(parser)
+    args = parser.parse_args()
+
+    left_worker, right_worker = open_camera_workers(args, zero_copy=True, track_targets=True)
+    ball_detector = MultiprocessDetector(left_worker, right_worker)
+    try:
+        while not ball_detector.finished:
+            start_time = time.time()
+            result = ball_detector.getTarget()
+            fps = 1 / max(time.time() - start_time, 1e-9)
+            log.log("result", f'FPS: {fps:.2f} | skew: {ball_detector.frame_skew_ms} ms | workers: {ball_detector.worker_stats()} | {result}')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ball_detector.stop()
@@ -0,0 +1,126 @@
+# Artificial Intelligence was used in this file to : debug errors, research picamera2 sensor modes
+
+# how the sensor is set up, not just the output size: picamera2's default configuration picks whatever sensor
+# mode fits the output size best at full resolution, which on the imx219 is the 1640x1232 mode at ~42 fps,
+# and leaves frame duration and exposure to auto exposure (long exposures smear a fast ball)
+#   choose_sensor_mode(): the mode that reaches the frame rate with the least readout, binned/cropped ones included,
+#   never one smaller than the output
+#   CaptureSettings.controls(): frame duration locked to the frame rate, short fixed exposure, fixed gain
+# both cameras get the same CaptureSettings and the same choice, check_matching() says when they ended up different
+# a cropped mode sees less of the scene: sensor_window() says which part of the sensor the frames show, the angle models
+# (BallDetector.getAngles, calibration.RayTable) map pixels through it instead of assuming the whole sensor
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+EXPOSURE_MARGIN_US = 100 # the exposure has to end a bit before the frame does
+FULL_SENSOR_WINDOW = (0.0, 0.0, 1.0, 1.0)
+FPS_TOLERANCE = 0.95 # measured below this share of the requested frame rate gets a warning
+
+
+@dataclass(frozen=True)
+class CaptureSettings:
+    fps: float
+    exposure_us: int # short so the ball doesnt smear, capped to the frame duration
+    analogue_gain: float # makes up for the short exposure
+    allow_crop: bool = True # cropped modes are faster but see less, a lens calibration only covers modes inside its own crop
+
+    def frame_duration_us(self) -> int:
+        return int(round(1e6 / self.fps))
+
+    def controls(self) -> dict:
+        frame_duration = self.frame_duration_us()
+        return {
+            "FrameDurationLimits": (frame_duration, frame_duration), # min == max locks the frame rate
+            "AeEnable": False,
+            "ExposureTime": min(self.exposure_us, frame_duration - EXPOSURE_MARGIN_US),
+            "AnalogueGain": self.analogue_gain,
+        }
+
+
+def sensor_modes(picam) -> list[dict]:
+    # what picamera2 reports, one dict per mode: size, fps, bit_depth, format, crop_limits (x, y, w, h on the full sensor), ...
+    # the first call is slow on a real camera (it tries every mode), picamera2 keeps the result
+    return list(picam.sensor_modes)
+
+def field_of_view(mode: dict, modes: list[dict]) -> float:
+    # share of the full sensor area the mode sees, 1.0 = uncropped
+    full_w, full_h = max((m["size"] for m in modes), key=lambda size: size[0] * size[1])
+    crop = mode.get("crop_limits")
+    if crop is None:
+        return 1.0
+    return min(1.0, crop[2] * crop[3] / (full_w * full_h))
+
+def sensor_window(mode: dict | None, modes: list[dict], output_size: tuple[int, int]) -> tuple[float, float, float, float]:
+    # (x, y, width, height) of the part of the whole sensor the output shows, as shares of it, in sensor orientation (not flipped).
+    # the mode's crop_limits, then the centered part of that with the output's aspect ratio like the ISP's default ScalerCrop.
+    # no mode (recordings) = the whole sensor
+    if mode is None or mode.get("crop_limits") is None:
+        return FULL_SENSOR_WINDOW
+    full_w, full_h = max((m["size"] for m in modes), key=lambda size: size[0] * size[1])
+    x, y, w, h = (float(value) for value in mode["crop_limits"])
+    out_w, out_h = output_size
+    if w * out_h > h * out_w: # mode wider than the output
+        x, w = x + (w - h * out_w / out_h) / 2, h * out_w / out_h
+    else:
+        y, h = y + (h - w * out_h / out_w) / 2, w * out_h / out_w
+    return x / full_w, y / full_h, w / full_w, h / full_h
+
+def upright_window(window: tuple[float, float, float, float]) -> tuple[float, float, float, float]:
+    # sensor_window() of the frames after Camera.orient's 180 degree flip
+    x, y, w, h = window
+    return 1.0 - x - w, 1.0 - y - h, w, h
+
+def choose_sensor_mode(modes: list[dict], output_size: tuple[int, int], fps: float, allow_crop: bool = True) -> dict:
+    # only modes at least as big as the output (the ISP only scales down), of those in order: reaches the frame rate,
+    # matches the output aspect ratio, sees the most of the sensor, reads out the fewest pixels, then the fastest.
+    # when none of them reaches the frame rate the camera runs slower, verify_frame_rate() warns about it
+    if not modes:
+        raise ValueError("the camera reported no sensor modes")
+    width, height = output_size
+    covering = [mode for mode in modes if mode["size"][0] >= width and mode["size"][1] >= height]
+    if not covering:
+        raise ValueError(f"no sensor mode is at least {width}x{height}, the largest is {max(mode['size'] for mode in modes)}")
+    candidates = [mode for mode in covering if allow_crop or field_of_view(mode, modes) >= 0.99] or covering
+
+    def rank(mode):
+        mode_w, mode_h = mode["size"]
+        return (
+            mode["fps"] < fps,
+            round(abs(math.log((mode_w / mode_h) / (width / height))), 2),
+            -round(field_of_view(mode, modes), 2),
+            mode_w * mode_h,
+            -mode["fps"],
+        )
+    return min(candidates, key=rank)
+
+def video_configuration(picam, output_size: tuple[int, int], capture_format: str, settings: CaptureSettings, mode: dict) -> dict:
+    return picam.create_video_configuration(
+        main={"size": output_size, "format": capture_format},
+        sensor={"output_size": mode["size"], "bit_depth": mode["bit_depth"]},
+        controls=settings.controls(),
+    )
+
+def describe_mode(mode: dict, modes: list[dict]) -> str:
+    fov = field_of_view(mode, modes)
+    cropped = f", cropped to {fov:.0%} of the sensor" if fov < 0.99 else ""
+    return f"{mode['size'][0]}x{mode['size'][1]} {mode['bit_depth']}-bit up to {mode['fps']:.0f} fps{cropped}"
+
+def measure_fps(timestamps_ns) -> float | None:
+    # frame rate from consecutive SensorTimestamps, the median interval so one late frame doesnt count
+    intervals = np.diff(np.asarray(timestamps_ns, dtype=np.int64))
+    intervals = intervals[intervals > 0]
+    if len(intervals) == 0:
+        return None
+    return 1e9 / float(np.median(intervals))
+
+def check_matching(cameras) -> bool:
+    # the stereo pair only lines up if both sensors run the same mode, frame rate and exposure
+    setups = [(camera.sensor_mode["size"], camera.sensor_mode["bit_depth"], camera.CAPTURE_SETTINGS.controls()) for camera in cameras
+              if getattr(camera, "sensor_mode", None) is not None]
+    if len(setups) < 2 or all(setup == setups[0] for setup in setups):
+        return True
+    print(f"Warning: the cameras are not configured the same way: {setups}")
+    return False
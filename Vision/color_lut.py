@@ -0,0 +1,117 @@
+# Artificial Intelligence was used in this file to : debug errors, research lookup tables
+
+import cv2
+import numpy as np
+
+# a pixel is a target if at least two of its H, S, V values are in range
+# each channel lut marks "in range" with its own bit, so the vote is just a lookup on the sum
+H_BIT = 1
+S_BIT = 2
+V_BIT = 4
+VOTE_LUT = np.zeros(256, dtype=np.uint8)
+VOTE_LUT[[H_BIT | S_BIT, H_BIT | V_BIT, S_BIT | V_BIT, H_BIT | S_BIT | V_BIT]] = 255
+
+MAX_CACHED_CLASSIFIERS = 4
+
+def in_range_lut(low: int, high: int, bit: int, wrap_max: int | None = None) -> np.ndarray:
+    values = np.arange(256)
+    if wrap_max is not None and low > high:
+        # hue wraps around, same as the two inRange calls in get_target_masks
+        in_range = ((values >= low) & (values <= wrap_max)) | (values <= high)
+    else:
+        in_range = (values >= low) & (values <= high)
+    return (in_range * bit).astype(np.uint8)
+
+
+class ColorClassifier:
+    # bakes one camera's HSV thresholds into lookup tables so classifying a frame
+    # is a table lookup instead of split + inRange + and/or per frame
+    RGB_TABLE_CHUNK = 16 # blue values converted per step while building the rgb table, keeps memory low
+
+    def __init__(self, low_hsv: np.ndarray, upper_hsv: np.ndarray):
+        self.low_hsv = np.array(low_hsv, dtype=np.uint8)
+        self.upper_hsv = np.array(upper_hsv, dtype=np.uint8)
+
+        low_h, low_s, low_v = (int(value) for value in self.low_hsv)
+        high_h, high_s, high_v = (int(value) for value in self.upper_hsv)
+        self.channel_lut = np.dstack([
+            in_range_lut(low_h, high_h, H_BIT, wrap_max=179),
+            in_range_lut(low_s, high_s, S_BIT),
+            in_range_lut(low_v, high_v, V_BIT),
+        ]).reshape(1, 256, 3)
+
+        self._rgb_table = None # built on first classify_rgb, 16 MB
+
+    def classify_hsv(self, frame_hsv: np.ndarray) -> np.ndarray:
+        bits = cv2.LUT(frame_hsv, self.channel_lut)
+        h_bits, s_bits, v_bits = cv2.split(bits)
+        return cv2.LUT(cv2.add(cv2.add(h_bits, s_bits), v_bits), VOTE_LUT)
+
+    @property
+    def rgb_table(self) -> np.ndarray:
+        # flat table indexed by r | g << 8 | b << 16, i.e. the first three bytes of an RGBX pixel
+        if self._rgb_table is None:
+            table = np.empty(1 << 24, dtype=np.uint8)
+            for blue_start in range(0, 256, self.RGB_TABLE_CHUNK):
+                start, end = blue_start << 16, (blue_start + self.RGB_TABLE_CHUNK) << 16
+                codes = np.arange(start, end, dtype=np.uint32)
+                colors = np.empty((codes.size, 1, 3), dtype=np.uint8)
+                colors[:, 0, 0] = codes & 0xFF
+                colors[:, 0, 1] = (codes >> 8) & 0xFF
+                colors[:, 0, 2] = codes >> 16
+                # same conversion as Camera.convert_frame so the result is bit exact
+                colors_hsv = cv2.cvtColor(colors, cv2.COLOR_RGB2HSV)
+                table[start:end] = self.classify_hsv(colors_hsv).ravel()
+            self._rgb_table = table
+        return self._rgb_table
+
+    def classify_rgb(self, frame_rgb: np.ndarray) -> np.ndarray:
+        # classifies the raw capture (RGB or RGBX byte order) directly, no HSV conversion
+        if frame_rgb.shape[2] == 4 and frame_rgb.strides[1:] == (4, 1):
+            codes = frame_rgb.view(np.uint32)[..., 0] & 0xFFFFFF
+        else:
+            codes = frame_rgb[..., 0].astype(np.uint32)
+            codes |= frame_rgb[..., 1].astype(np.uint32) << 8
+            codes |= frame_rgb[..., 2].astype(np.uint32) << 16
+        return self.rgb_table[codes]
+
+
+_classifier_cache = {}
+
+def get_classifier(low_hsv: np.ndarray, upper_hsv: np.ndarray) -> ColorClassifier:
+    # keyed on the threshold values, so moving a trackbar builds a new table on the next frame
+    key = (tuple(int(value) for value in low_hsv), tuple(int(value) for value in upper_hsv))
+    classifier = _classifier_cache.get(key)
+    if classifier is None:
+        if len(_classifier_cache) >= MAX_CACHED_CLASSIFIERS:
+            del _classifier_cache[next(iter(_classifier_cache))]
+        classifier = ColorClassifier(low_hsv, upper_hsv)
+        _classifier_cache[key] = classifier
+    return classifier
+
+
+if __name__ == "__main__":
+    # how long each way of getting the mask takes here, tests/test_color_lut.py checks they agree
+    import time
+    from analyze_frame import get_target_masks, hsv_configs
+
+    def reference_mask(frame_hsv, low_hsv, upper_hsv):
+        mask_h, mask_s, mask_v = get_target_masks(frame_hsv, low_hsv, upper_hsv)
+        return cv2.bitwise_or(cv2.bitwise_and(mask_h, mask_s), cv2.bitwise_or(cv2.bitwise_and(mask_h, mask_v), cv2.bitwise_and(mask_s, mask_v)))
+
+    rng = np.random.default_rng(0)
+    low_hsv, upper_hsv = (configs[0] for configs in hsv_configs())
+    classifier = ColorClassifier(low_hsv, upper_hsv)
+    frame_rgbx = rng.integers(0, 256, (480, 640, 4), dtype=np.uint8)
+    classifier.rgb_table # built once up front, not inside the timing
+
+    iterations = 100
+    for name, function in [
+        ("split/inRange", lambda: reference_mask(cv2.cvtColor(cv2.cvtColor(frame_rgbx, cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2HSV), low_hsv, upper_hsv)),
+        ("hsv lut", lambda: classifier.classify_hsv(cv2.cvtColor(cv2.cvtColor(frame_rgbx, cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2HSV))),
+        ("rgb table", lambda: classifier.classify_rgb(frame_rgbx)),
+    ]:
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        print(f"{name}: {(time.perf_counter() - start_time) / iterations * 1000:.2f} ms per frame (including conversion)")
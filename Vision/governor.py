@@ -0,0 +1,263 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# holds the frame rate by giving up image quality instead of frames: watches how long the detector works on
+# each stereo pair and moves along QUALITY_LEVELS (capture resolution, full frame detection scale, tracker ROI margin)
+#   over the frame budget           -> one level down, right away
+#   well under it for UP_HOLD secs  -> one level up, if the level above is estimated to fit too
+#   dropping again right after going up doubles the wait before the next try, so it doesnt flap between two levels
+# the cameras are reconfigured in place (BallDetector.apply_quality), no restart. every decision is printed and kept
+# only levels whose sensor mode shows the same part of the sensor as now are used: a level from a mode with another
+# crop would change the field of view under the tracker, and could fall outside what the lens calibration covers
+#
+#   governor = QualityGovernor(ball_detector, target_fps=60)
+#   while True:
+#       points = ball_detector.getTargets()
+#       governor.update()
+#
+# usage: python governor.py --replay FILE [--target-fps 60] [--load 3] shows it stepping down under CPU load and back up after
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from capture_config import choose_sensor_mode, sensor_window
+from instrumentation import log
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    width: int
+    height: int
+    detection_scale: int # 1, 2 or 4, see BallDetector
+    search_margin: int # TargetTracker ROI margin in pixels at this resolution
+
+    def cost(self) -> float:
+        # rough relative work per frame, the pixels that get converted and masked. the coarse search divides the full frame part
+        return self.width * self.height / self.detection_scale
+
+    def __str__(self):
+        return f"{self.width}x{self.height} scale {self.detection_scale} margin {self.search_margin}"
+
+
+# best first, each level is cheaper than the one before. the cameras' 640x480 default sits in the middle
+QUALITY_LEVELS = [
+    QualityLevel(1280, 960, 1, 60),
+    QualityLevel(1280, 960, 2, 60),
+    QualityLevel(960, 720, 2, 50),
+    QualityLevel(640, 480, 1, 40),
+    QualityLevel(640, 480, 2, 40),
+    QualityLevel(480, 360, 2, 30),
+    QualityLevel(320, 240, 1, 20),
+]
+
+
+@dataclass
+class GovernorDecision:
+    time: float # time.monotonic() when it was made
+    old_level: int
+    new_level: int
+    reason: str
+    frame_cost_ms: float # p90 detector time per stereo pair over the window that triggered it
+    budget_ms: float
+
+    def __str__(self):
+        return f"level {self.old_level} -> {self.new_level}: {self.reason}, p90 {self.frame_cost_ms:.1f} ms of {self.budget_ms:.1f} ms"
+
+
+class QualityGovernor:
+    WINDOW = 30 # frames per decision
+    DOWN_RATIO = 0.9 # a window p90 above this share of the frame budget steps down
+    UP_RATIO = 0.6 # below this share counts towards stepping up
+    UP_HOLD = 3.0 # seconds it has to stay below UP_RATIO before stepping up
+    MAX_UP_HOLD = 60.0
+    FAILED_UP_WINDOW = 5.0 # stepping down this soon after stepping up counts as a failed try and doubles the hold
+    SETTLE_FRAMES = 10 # frames ignored after a change, the first ones after reconfiguring are slow
+
+    def __init__(self, ball_detector, target_fps: float | None = None, levels: list[QualityLevel] = QUALITY_LEVELS, level: int | None = None,
+                 clock=time.monotonic):
+        if not ball_detector.can_apply_quality():
+            raise RuntimeError("the quality governor reconfigures the cameras, which only works with the cameras in this process (not with --processes)")
+        self.ball_detector = ball_detector
+        self.target_fps = target_fps if target_fps is not None else getattr(ball_detector.left_camera, "FPS", 60)
+        self.budget_s = 1 / self.target_fps
+        # levels the sensor has no mode for at the target frame rate would cost frames however fast detection is
+        self.levels = [level for level in levels if self._fits_sensor(level)] or levels
+        if len(self.levels) < len(levels):
+            print(f"[governor] skipping levels the sensor cant run at {self.target_fps:.0f} fps with the current field of view: "
+                  f"{', '.join(str(level) for level in levels if level not in self.levels)}")
+        self.clock = clock
+
+        self.decisions = [] # every GovernorDecision, oldest first
+        self.samples = []
+        self.up_hold = self.UP_HOLD
+        self._under_since = None # start of the current stretch below UP_RATIO
+        self._last_up = -np.inf
+        self._settle = 0
+        self._level_since = clock()
+        self.time_per_level = [0.0 for _ in levels]
+
+        # start where the detector already is unless told otherwise, so nothing gets reconfigured just for starting
+        self.level = level if level is not None else self._matching_level()
+        self._apply(self.level)
+
+    def _fits_sensor(self, level: QualityLevel) -> bool:
+        # the mode Camera.reconfigure would pick for the level reaches the target frame rate and has the camera's current crop
+        camera = self.ball_detector.left_camera
+        modes = getattr(camera, "sensor_modes", None)
+        if not modes:
+            return True # a recording, it is scaled to any size
+        size = (level.width, level.height)
+        try:
+            mode = choose_sensor_mode(modes, size, camera.CAPTURE_SETTINGS.fps, camera.CAPTURE_SETTINGS.allow_crop)
+        except ValueError:
+            return False
+        same_window = np.allclose(sensor_window(mode, modes, size), camera.sensor_window(), atol=1e-3)
+        return mode["fps"] >= self.target_fps and same_window
+
+    def _matching_level(self) -> int:
+        detector = self.ball_detector
+        size = (detector.HORIZONTAL_RESOLUTION, detector.VERTICAL_RESOLUTION)
+        same_size = [idx for idx, level in enumerate(self.levels) if (level.width, level.height) == size]
+        for idx in same_size:
+            if self.levels[idx].detection_scale == detector.detection_scale:
+                return idx
+        if same_size:
+            return same_size[0]
+        # closest pixel count
+        pixels = size[0] * size[1]
+        return int(np.argmin([abs(level.width * level.height - pixels) for level in self.levels]))
+
+    def _apply(self, level_idx: int):
+        level = self.levels[level_idx]
+        self.ball_detector.apply_quality(level.width, level.height, level.detection_scale, level.search_margin)
+        self.samples = []
+        self._settle = self.SETTLE_FRAMES
+
+    def update(self, frame_cost: float | None = None) -> GovernorDecision | None:
+        # call once per processed stereo pair. frame_cost = seconds of detector work, None = ask the detector.
+        # returns the decision if this call changed the level
+        cost = frame_cost if frame_cost is not None else self.ball_detector.frame_cost()
+        if cost is None:
+            return None
+        if self._settle > 0:
+            self._settle -= 1
+            return None
+        self.samples.append(cost)
+        if len(self.samples) < self.WINDOW:
+            return None
+
+        p90 = float(np.percentile(self.samples, 90))
+        self.samples = []
+        now = self.clock()
+
+        if p90 > self.budget_s * self.DOWN_RATIO:
+            self._under_since = None
+            if self.level == len(self.levels) - 1:
+                log.log("governor_floor", f"[governor] lowest level and still over budget, p90 {p90 * 1e3:.1f} ms of {self.budget_s * 1e3:.1f} ms")
+                return None
+            reason = "over budget"
+            if now - self._last_up < self.FAILED_UP_WINDOW:
+                self.up_hold = min(self.up_hold * 2, self.MAX_UP_HOLD)
+                self._last_up = -np.inf # only the first step down after a step up counts against it
+                reason += f" right after stepping up, next try in {self.up_hold:.0f} s"
+            return self._step(self.level + 1, reason, p90, now)
+
+        if p90 < self.budget_s * self.UP_RATIO and self.level > 0:
+            if self._under_since is None:
+                self._under_since = now
+            elif now - self._under_since >= self.up_hold:
+                predicted = p90 * self.levels[self.level - 1].cost() / self.levels[self.level].cost()
+                if predicted < self.budget_s * self.DOWN_RATIO:
+                    self._last_up = now
+                    return self._step(self.level - 1, f"under budget for {now - self._under_since:.1f} s", p90, now)
+                self._under_since = now # the level above wouldnt fit yet, keep waiting
+            return None
+
+        self._under_since = None
+        if now - self._last_up >= self.FAILED_UP_WINDOW:
+            self.up_hold = max(self.UP_HOLD, self.up_hold / 2) # held up fine, be less careful next time
+        return None
+
+    def _step(self, new_level: int, reason: str, p90: float, now: float) -> GovernorDecision:
+        decision = GovernorDecision(now, self.level, new_level, reason, p90 * 1e3, self.budget_s * 1e3)
+        self.time_per_level[self.level] += now - self._level_since
+        self._level_since = now
+        self.decisions.append(decision)
+        print(f"[governor] {decision} -> {self.levels[new_level]}")
+        self.level = new_level
+        self._under_since = None
+        self._apply(new_level)
+        return decision
+
+    def stats(self) -> dict:
+        time_per_level = list(self.time_per_level)
+        time_per_level[self.level] += self.clock() - self._level_since
+        return {
+            "level": self.level,
+            "quality": str(self.levels[self.level]),
+            "decisions": len(self.decisions),
+            "seconds_per_level": {str(level): round(seconds, 1) for level, seconds in zip(self.levels, time_per_level) if seconds > 0},
+        }
+
+
+def _burn_cpu(stop_event):
+    while not stop_event.is_set():
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    from hello import BallDetector
+    from instrumentation import metrics
+    from recording import add_camera_arguments, open_cameras_from_args
+
+    parser = argparse.ArgumentParser(description="Run the detector with the quality governor, optionally under CPU load")
+    add_camera_arguments(parser)
+    parser.add_argument("--target-fps", type=float, default=None, help="frame rate to hold, the cameras' FPS by default")
+    parser.add_argument("--load", type=int, default=0, help="busy processes started a third of the way in and stopped at two thirds")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--pipeline", type=int, default=None, metavar="DEPTH", help="run the detection pipeline instead of the serial path")
+    args = parser.parse_args()
+
+    left_camera, right_camera = open_cameras_from_args(args, zero_copy=True)
+    ball_detector = BallDetector(left_camera, right_camera, track_targets=True)
+    if args.pipeline:
+        ball_detector.start_pipeline(args.pipeline)
+    governor = QualityGovernor(ball_detector, args.target_fps)
+    print(f"target {governor.target_fps:.0f} fps, starting at level {governor.level} ({governor.levels[governor.level]})")
+
+    stop_load = multiprocessing.Event()
+    load_processes = []
+    start = time.monotonic()
+    frames = 0
+    try:
+        while time.monotonic() - start < args.seconds and not ball_detector.finished:
+            elapsed = time.monotonic() - start
+            if args.load and not load_processes and args.seconds / 3 <= elapsed < args.seconds * 2 / 3:
+                print(f"[{elapsed:.1f} s] starting {args.load} busy processes")
+                load_processes = [multiprocessing.Process(target=_burn_cpu, args=(stop_load,), daemon=True) for _ in range(args.load)]
+                for process in load_processes:
+                    process.start()
+            elif load_processes and not stop_load.is_set() and elapsed >= args.seconds * 2 / 3:
+                print(f"[{elapsed:.1f} s] stopping the busy processes")
+                stop_load.set()
+
+            ball_detector.getTargets()
+            if ball_detector.frame_cost() is not None:
+                frames += 1
+            governor.update()
+            metrics.report_if_due()
+    finally:
+        stop_load.set()
+        for process in load_processes:
+            process.join()
+        ball_detector.stop_pipeline()
+        left_camera.stop_capture()
+        right_camera.stop_capture()
+
+    print(f"{frames / (time.monotonic() - start):.1f} stereo pairs per second overall, {governor.stats()}")
+    for decision in governor.decisions:
+        print(f"  {decision.time - start:6.1f} s  {decision}")
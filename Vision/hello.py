@@ -1,11 +1,16 @@
 # Artificial Intelligence was used in this file to : debug errors, and verify FOV calculations
 
-from logging import PlaceHolder
 import math
+import time
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 from camera import Camera
-from analyze_frame import get_targets, LOW_TARGET_HSV_CONFIGS, UPPER_TARGET_HSV_CONFIGS
+from analyze_frame import get_targets, get_raw_target_mask, get_targets_pyramid, find_targets, blob_limits, blob_backend_configs, hsv_configs, BLOB_BACKENDS, CENTROID_MODES
+from pipeline import DetectionPipeline
+from tracker import TargetTracker
+from calibration import load_ray_tables
+from capture_config import FULL_SENSOR_WINDOW, upright_window
+from instrumentation import metrics, log, startup
 
 def getAngle(cameranum: int) -> tuple[float, float]:
     # get the angles from the camera
@@ -27,6 +32,7 @@ class BallDetector:
     # this class is used to detect the ball in the camera
     # it will take the angles from the camera and return the 3D coordinates of the ball
     # it will also check if the ball is on the screen or not
+    # field of view across the whole sensor (what the full view modes show), a cropped sensor mode sees part of it, see getAngles
     HORIZONTAL_FOV = 55.28168977
     VERTICAL_FOV = 32.82769798
 
@@ -34,8 +40,14 @@ class BallDetector:
 
     SCREEN_RANGE = 30
 
+    MAX_FRAME_SKEW_MS = 10 # left and right frames further apart than this are not triangulated together
 
-    def __init__(self, left_camera: Camera, right_camera: Camera):
+    MAX_TARGETS = 2 # points per message, the unity side takes up to two
+    MAX_PITCH_DISPARITY = 3.0 # degrees, the cameras are side by side so the same ball has about the same pitch in both
+
+
+    def __init__(self, left_camera: Camera, right_camera: Camera, track_targets: bool = False, detection_scale: int = 1, centroid_mode: str | None = None,
+                 blob_backends: list[str] | None = None):
 
         self.left_camera = left_camera
         self.right_camera = right_camera
@@ -43,18 +55,149 @@ class BallDetector:
         self.HORIZONTAL_RESOLUTION = self.left_camera.HORZONTAL_RES
         self.VERTICAL_RESOLUTION = self.left_camera.VERTICAL_RES
 
-    def getAngle(self, pixel_x: int, pixel_y: int) -> tuple[float, float]:
+        # zero copy cameras skip the 180 degree flip, so the centers get rotated here instead
+        self.frames_rotated = self.left_camera.zero_copy
+
+        # per pixel angles from calibration.py, falls back to the linear FOV model until both cameras are calibrated
+        # (or when a camera shows part of the sensor its calibration didnt). False = always the linear model
+        self.use_calibration = True
+        self._ray_table_cache = {} # (width, height, sensor windows) -> tables, so switching back to a mode is cheap
+        self.ray_tables = self._load_ray_tables()
+        if self.ray_tables is None:
+            print("No lens calibration for this sensor mode, using the linear FOV model for angles.")
+
+        # per camera HSV thresholds, the first detector reads hsv_config.json
+        self.low_hsv_configs, self.upper_hsv_configs = hsv_configs()
+
+        # one pool for the lifetime of the detector instead of one per frame
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+        self.frame_skew_ms = None # sensor timestamp difference of the last stereo pair used
+        self.last_capture_timestamp_ns = None # sensor time of the stereo pair behind the last getTargets() result
+        self._last_frame_counts = (0, 0)
+        self.finished = False # a replay ran out on both sides, getTargets() wont find anything new, loops should stop on it
+        self.last_frame_cost_s = None # seconds the serial path spent on the last stereo pair, not counting the wait for frames
+
+        self.pipeline = None # set by start_pipeline(), getTarget() then reads from it
+
+        # only search around where the ball was last seen, falls back to the full frame on its own
+        self.trackers = [TargetTracker(self.HORIZONTAL_RESOLUTION, self.VERTICAL_RESOLUTION) for _ in range(2)] if track_targets else None
+
+        # 2 or 4: full frame searches look for candidates on a downscaled mask first, then refine them at full resolution
+        self.detection_scale = detection_scale
+
+        # "circle", "moments" or "ellipse" (see analyze_frame), None = analyze_frame.CENTROID_MODE
+        if centroid_mode is not None and centroid_mode not in CENTROID_MODES:
+            raise ValueError(f"centroid_mode has to be one of {CENTROID_MODES}, not {centroid_mode!r}")
+        self.centroid_mode = centroid_mode
+        # blob size limits follow the capture width, so a far away ball is still found at lower resolutions
+        self.min_area, self.min_radius = blob_limits(self.HORIZONTAL_RESOLUTION)
+        # find_targets backend per camera (see analyze_frame), None = what hsv_config.json says
+        self.blob_backends = list(blob_backends) if blob_backends is not None else list(blob_backend_configs())
+        for backend in self.blob_backends:
+            if backend not in BLOB_BACKENDS:
+                raise ValueError(f"blob backend has to be one of {BLOB_BACKENDS}, not {backend!r}")
+
+        self.left_camera.start_capture()
+        self.right_camera.start_capture()
+
+    def start_pipeline(self, depth: int = 2):
+        # run capture, masking, contours and triangulation as overlapping stages
+        if self.pipeline is None:
+            self.pipeline = DetectionPipeline(self, depth=depth)
+            for camera in (self.left_camera, self.right_camera):
+                camera.hold_frames(self.pipeline.frames_held()) # zero copy buffers cant be reused while a stage has them
+            self.pipeline.start()
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def _load_ray_tables(self):
+        # tables for the current resolution and sensor windows. a window can change without this class doing it
+        # (a camera_workers.CameraWorker only learns its window from the worker's first record), so getAngles asks every time
+        if not self.use_calibration:
+            return None
+        windows = tuple(camera.sensor_window() if hasattr(camera, "sensor_window") else FULL_SENSOR_WINDOW
+                        for camera in (self.left_camera, self.right_camera))
+        key = (self.HORIZONTAL_RESOLUTION, self.VERTICAL_RESOLUTION, windows)
+        if key not in self._ray_table_cache:
+            self._ray_table_cache[key] = load_ray_tables(self.HORIZONTAL_RESOLUTION, self.VERTICAL_RESOLUTION, windows)
+        return self._ray_table_cache[key]
+
+    def frame_cost(self) -> float | None:
+        # seconds of work per stereo pair, what governor.py compares against the frame budget. the slowest stage when pipelined
+        if self.pipeline is not None:
+            return self.pipeline.busy_time()
+        return self.last_frame_cost_s
+
+    def can_apply_quality(self) -> bool:
+        # only cameras in this process can be reconfigured, not ones behind camera_workers.CameraWorker
+        return all(hasattr(camera, "reconfigure") for camera in (self.left_camera, self.right_camera))
+
+    def apply_quality(self, width: int, height: int, detection_scale: int, search_margin: int | None = None):
+        # switch capture resolution, full frame detection scale and tracker ROI margin while running.
+        # the cameras are reconfigured in place (both at once), everything that depends on the resolution follows them
+        if not self.can_apply_quality():
+            raise RuntimeError("the cameras cant be reconfigured while running, they have to be in this process (not camera_workers.CameraWorker)")
+        pipeline_depth = self.pipeline.depth if self.pipeline is not None else None
+        if (width, height) != (self.HORIZONTAL_RESOLUTION, self.VERTICAL_RESOLUTION):
+            self.stop_pipeline() # frames of the old size must not meet the new size halfway through
+            futures = [self.executor.submit(camera.reconfigure, width, height) for camera in (self.left_camera, self.right_camera)]
+            for future in futures:
+                future.result()
+            self.HORIZONTAL_RESOLUTION, self.VERTICAL_RESOLUTION = width, height
+            self.ray_tables = self._load_ray_tables()
+            self.min_area, self.min_radius = blob_limits(width)
+            if self.trackers is not None:
+                self.trackers = [TargetTracker(width, height, search_margin) for _ in range(2)]
+            self.last_frame_cost_s = None
+        elif self.trackers is not None:
+            for tracker in self.trackers:
+                tracker.search_margin = search_margin if search_margin is not None else TargetTracker.SEARCH_MARGIN
+        self.detection_scale = detection_scale
+        if pipeline_depth is not None and self.pipeline is None:
+            self.start_pipeline(pipeline_depth)
+
+    def getAngle(self, pixel_x: float, pixel_y: float, camera_idx: int | None = None) -> tuple[float, float]:
         # get the angle from the camera
         # pixel_x = x coordinate of the target
         # pixel_y = y coordinate of the target
+        # camera_idx = 0 or 1 to use that camera's lens calibration, None for the linear model
         # return the angle in degrees
         # XZangle = horizontal angle between the x and z axis
         # YZangle = vertical angle between the y and z axis
-
-        yaw = self.HORIZONTAL_FOV * (pixel_x / self.HORIZONTAL_RESOLUTION) - self.HORIZONTAL_FOV / 2
-        pitch = self.VERTICAL_FOV * (pixel_y / self.VERTICAL_RESOLUTION) - self.VERTICAL_FOV / 2
+        yaw, pitch = self.getAngles(np.array([[pixel_x, pixel_y]], dtype=np.float64), camera_idx)
+        return float(yaw[0]), float(pitch[0])
+
+    def getAngles(self, pixels: np.ndarray, camera_idx: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        # getAngle for an (N, 2) array of pixel coordinates, returns (yaw, pitch) arrays in degrees
+        pixel_x = pixels[:, 0]
+        pixel_y = pixels[:, 1]
+
+        if self.frames_rotated:
+            # same as cv2.flip(frame, -1) but on the points instead of every pixel
+            pixel_x = (self.HORIZONTAL_RESOLUTION - 1) - pixel_x
+            pixel_y = (self.VERTICAL_RESOLUTION - 1) - pixel_y
+
+        if camera_idx is not None:
+            self.ray_tables = self._load_ray_tables()
+        if camera_idx is not None and self.ray_tables is not None:
+            return self.ray_tables[camera_idx].lookup(np.column_stack((pixel_x, pixel_y)))
+
+        # linear over the whole sensor, the frame covers the camera's sensor window of it (all of it in a full view mode)
+        window_x, window_y, window_w, window_h = self.sensor_window(camera_idx)
+        yaw = self.HORIZONTAL_FOV * (window_x + window_w * pixel_x / self.HORIZONTAL_RESOLUTION) - self.HORIZONTAL_FOV / 2
+        pitch = self.VERTICAL_FOV * (window_y + window_h * pixel_y / self.VERTICAL_RESOLUTION) - self.VERTICAL_FOV / 2
         return yaw, pitch
 
+    def sensor_window(self, camera_idx: int | None = None) -> tuple[float, float, float, float]:
+        # part of the sensor the upright frames of a camera show, read every time so it follows reconfigure()
+        camera = self.right_camera if camera_idx == 1 else self.left_camera
+        window = camera.sensor_window() if hasattr(camera, "sensor_window") else FULL_SENSOR_WINDOW
+        return upright_window(window)
+
     def findPosition(self, XZangle1: float, YZangle1: float, XZangle2: float, YZangle2: float) -> tuple[float, float, float] | None:
         # take angles from two cameras and return the 3D coordinates of the object
         # XZangle1 = horizontal angle between the x and z axis of camera 1
@@ -83,47 +226,163 @@ class BallDetector:
 
         return x, y, z
 
-    def _get_frame_and_targets(self, camera: Camera, low_hsv_config: np.ndarray, upper_hsv_config: np.ndarray):
-        frame = camera.get_frame()
-        if frame is None:
-            print(f"Error: Failed to get frame from camera {camera.camera_id if hasattr(camera, 'camera_id') else 'unknown'}.")
+    def findPositions(self, left_centers: np.ndarray, right_centers: np.ndarray, max_points: int = MAX_TARGETS) -> np.ndarray:
+        # findPosition for every left/right pairing at once
+        # left_centers = (N, 2) pixel coordinates, right_centers = (M, 2)
+        # pairings are scored by how far apart their pitches are (vertical disparity), each candidate is used once
+        # returns up to max_points rows of x, y, z, best pairing first
+        left_yaw, left_pitch = self.getAngles(np.asarray(left_centers, dtype=np.float64).reshape(-1, 2), 0)
+        right_yaw, right_pitch = self.getAngles(np.asarray(right_centers, dtype=np.float64).reshape(-1, 2), 1)
+
+        a = np.radians(90 - left_yaw)[:, None]
+        b = np.radians(90 + right_yaw)[None, :]
+        c = np.pi - (a + b)
+        d = np.radians((left_pitch[:, None] + right_pitch[None, :]) / 2)
+
+        sin_c = np.sin(c)
+        stable = np.abs(sin_c) >= 1e-6
+        r1 = self.SEPERATION_DISTANCE * np.sin(b) / np.where(stable, sin_c, 1.0)
+
+        z = r1 * np.sin(a)
+        x = -(self.SEPERATION_DISTANCE / 2) + r1 * np.cos(a)
+        y = -z * np.tan(d)
+
+        cost = np.abs(left_pitch[:, None] - right_pitch[None, :])
+        cost[~stable | (z <= 0) | (cost > self.MAX_PITCH_DISPARITY)] = np.inf
+
+        points = []
+        for _ in range(min(max_points, cost.shape[0], cost.shape[1])):
+            left_idx, right_idx = np.unravel_index(np.argmin(cost), cost.shape)
+            if not np.isfinite(cost[left_idx, right_idx]):
+                break
+            points.append((x[left_idx, right_idx], y[left_idx, right_idx], z[left_idx, right_idx]))
+            cost[left_idx, :] = np.inf
+            cost[:, right_idx] = np.inf
+        return np.array(points, dtype=np.float64).reshape(-1, 3)
+
+    def _get_stereo_pair(self):
+        # pick the left/right frames with the closest sensor timestamps out of the latest buffered ones
+        # returns (left raw frame, right raw frame, capture timestamp in ns)
+        with metrics.stage("capture"):
+            left_frames = self.left_camera.get_latest_frames(self._last_frame_counts[0])
+            right_frames = self.right_camera.get_latest_frames(self._last_frame_counts[1])
+        if not left_frames or not right_frames:
+            if all(getattr(camera, "finished", False) for camera in (self.left_camera, self.right_camera)):
+                self.finished = True # the recordings are over, get_latest_frames returns at once from now on
+                return None
+            log.log("frame_timeout", "Error: Timed out waiting for frames from the cameras.")
             return None
-        targets = get_targets(frame, low_hsv_config, upper_hsv_config)
-        if not targets:
+
+        last_left_count, last_right_count = self._last_frame_counts
+        pairs = [
+            (left, right) for left in left_frames for right in right_frames
+            if left[1] >= last_left_count and right[1] >= last_right_count and (left[1], right[1]) != self._last_frame_counts
+        ]
+        if not pairs:
             return None
-        if len(targets) > 1:
-             print(f"Warning: {len(targets)} targets found in camera {camera.camera_id if hasattr(camera, 'camera_id') else 'unknown'}, expected 1. Using the first one.")
-        return targets[0][0] # return only the center of the first target cuz idk how to do calculations for more
+        left, right = min(pairs, key=lambda pair: abs(pair[0][0] - pair[1][0]))
 
-    def getTarget(self) -> tuple[float, float, float] | None:
-        left_targets_center = None
-        right_targets_center = None
+        self._last_frame_counts = (left[1], right[1])
+        self.frame_skew_ms = abs(left[0] - right[0]) / 1e6
+        if self.frame_skew_ms > self.MAX_FRAME_SKEW_MS:
+            log.log("frame_skew", f"Warning: stereo frames are {self.frame_skew_ms:.1f} ms apart (max {self.MAX_FRAME_SKEW_MS} ms), skipping pair.")
+            return None
+        return left[2], right[2], (left[0] + right[0]) // 2
+
+    def _get_frame_and_targets(self, camera: Camera, low_hsv_config: np.ndarray, upper_hsv_config: np.ndarray, frame_raw: np.ndarray | None = None):
+        if frame_raw is not None:
+            window = self.search_window(camera)
+            if window is None and self.detection_scale > 1:
+                targets = get_targets_pyramid(camera, frame_raw, low_hsv_config, upper_hsv_config, self.detection_scale,
+                                              self.min_area, self.min_radius, self.centroid_mode, self.blob_backends[self._camera_idx(camera)])
+            else:
+                targets = self.find_targets(get_raw_target_mask(camera, frame_raw, low_hsv_config, upper_hsv_config, window), self._camera_idx(camera))
+            return self.track(camera, targets, window)
 
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future_left_processed = executor.submit(self._get_frame_and_targets, self.left_camera, LOW_TARGET_HSV_CONFIGS[0], UPPER_TARGET_HSV_CONFIGS[0])
-            future_right_processed = executor.submit(self._get_frame_and_targets, self.right_camera, LOW_TARGET_HSV_CONFIGS[1], UPPER_TARGET_HSV_CONFIGS[1])
+        frame = camera.get_frame()
+        if frame is None:
+            log.log("frame_failed", f"Error: Failed to get frame from camera {camera.camera_id if hasattr(camera, 'camera_id') else 'unknown'}.")
+            return []
+        return get_targets(frame, low_hsv_config, upper_hsv_config)
+
+    def find_targets(self, target_mask: np.ndarray, camera_idx: int = 0):
+        # analyze_frame.find_targets with this detector's size limits, centroid mode and the camera's backend
+        return find_targets(target_mask, self.min_area, self.min_radius, self.centroid_mode, self.blob_backends[camera_idx])
 
-            left_targets_center = future_left_processed.result()
-            right_targets_center = future_right_processed.result()
+    def _camera_idx(self, camera: Camera) -> int:
+        return 0 if camera is self.left_camera else 1
 
-        if left_targets_center is None:
-            print("Error: Failed to get targets from left camera pipeline.")
+    def _tracker_for(self, camera: Camera) -> TargetTracker | None:
+        if self.trackers is None:
             return None
-        if right_targets_center is None:
-            print("Error: Failed to get targets from right camera pipeline.")
+        return self.trackers[self._camera_idx(camera)]
+
+    def search_window(self, camera: Camera) -> tuple[int, int, int, int] | None:
+        tracker = self._tracker_for(camera)
+        return tracker.search_window() if tracker is not None else None
+
+    def track(self, camera: Camera, targets, window):
+        # moves targets found in window back to frame coordinates and updates the camera's tracker
+        tracker = self._tracker_for(camera)
+        if tracker is None:
+            return targets
+        return tracker.update(targets, window)
+
+    def tracking_stats(self) -> dict[str, dict[str, int]] | None:
+        # how many frames each camera handled around the prediction vs. over the full frame
+        if self.trackers is None:
             return None
-            
-        left_yaw, left_pitch = self.getAngle(left_targets_center[0], left_targets_center[1])
-        right_yaw, right_pitch = self.getAngle(right_targets_center[0], right_targets_center[1])
-        
-        position_3d = self.findPosition(left_yaw, left_pitch, right_yaw, right_pitch)
-        
-        if position_3d is None:
-            print("Error: Failed to determine target 3D position from findPosition.")
+        return {"left": self.trackers[0].stats(), "right": self.trackers[1].stats()}
+
+    def getTarget(self) -> tuple[float, float, float] | None:
+        points = self.getTargets(max_points=1)
+        if not points:
             return None
-    
-        x, y, z = position_3d
-        return x, y, z
+        return points[0]
+
+    def getTargets(self, max_points: int = MAX_TARGETS) -> list[tuple[float, float, float]]:
+        # up to max_points 3D positions from one stereo pair, best match first
+        if self.pipeline is not None:
+            points, self.last_capture_timestamp_ns = self.pipeline.get_result()
+            self.finished = self.pipeline.finished # only once the pairs still in the stages have come out
+            return points[:max_points]
+
+        self.last_frame_cost_s = None # stays None when there was no new pair to work on
+        stereo_pair = self._get_stereo_pair()
+        if stereo_pair is None:
+            return []
+        left_frame_raw, right_frame_raw, self.last_capture_timestamp_ns = stereo_pair
+        start = time.perf_counter()
+
+        future_left_processed = self.executor.submit(self._get_frame_and_targets, self.left_camera, self.low_hsv_configs[0], self.upper_hsv_configs[0], left_frame_raw)
+        future_right_processed = self.executor.submit(self._get_frame_and_targets, self.right_camera, self.low_hsv_configs[1], self.upper_hsv_configs[1], right_frame_raw)
+
+        left_targets = future_left_processed.result()
+        right_targets = future_right_processed.result()
+
+        points = self._triangulate(left_targets, right_targets, max_points)
+        self.last_frame_cost_s = time.perf_counter() - start
+        return points
+
+    def _triangulate(self, left_targets, right_targets, max_points: int = MAX_TARGETS) -> list[tuple[float, float, float]]:
+        # misses are normal (no ball in view), so they only get logged once in a while
+        if not left_targets:
+            log.log("left_miss", "Error: Failed to get targets from left camera pipeline.")
+            return []
+        if not right_targets:
+            log.log("right_miss", "Error: Failed to get targets from right camera pipeline.")
+            return []
+
+        with metrics.stage("triangulation"):
+            left_centers = np.array([center for center, _ in left_targets], dtype=np.float64)
+            right_centers = np.array([center for center, _ in right_targets], dtype=np.float64)
+            positions_3d = self.findPositions(left_centers, right_centers, max_points)
+
+        if len(positions_3d) == 0:
+            log.log("no_pair", "Error: No left/right target pair could be triangulated.")
+            return []
+
+        return [(float(x), float(y), float(z)) for x, y, z in positions_3d]
 
 
 # def calibrateCamera() -> list[float]:
@@ -150,19 +409,31 @@ class BallDetector:
 
 
 if __name__ == "__main__":
-    import time
-    left_camera = Camera(0)
-    right_camera = Camera(1)
-    ball_detector = BallDetector(left_camera, right_camera)
-    while True:
+    import argparse
+    from recording import add_camera_arguments, open_cameras_from_args
+
+    startup.mark("imports")
+
+    parser = argparse.ArgumentParser(description="Print the detected ball position")
+    add_camera_arguments(parser)
+    args = parser.parse_args()
+
+    with startup.phase("cameras"):
+        left_camera, right_camera = open_cameras_from_args(args, zero_copy=True)
+    with startup.phase("detector"):
+        ball_detector = BallDetector(left_camera, right_camera, track_targets=True)
+    while not ball_detector.finished:
         start_time = time.time()
         result = ball_detector.getTarget()
         end_time = time.time()
         fps = 1 / (end_time - start_time)
+        if result is not None:
+            startup.mark("first target")
         # if result is None:
         #     pass
         # elif result[2] > 265:
         #     print(f'FPS: {fps:.2f} | {result}')
         # else:
         #     print("no ball")
-        print(f'FPS: {fps:.2f} | {result}')
\ No newline at end of file
+        log.log("result", f'FPS: {fps:.2f} | skew: {ball_detector.frame_skew_ms} ms | tracking: {ball_detector.tracking_stats()} | {result}')
+        metrics.report_if_due()
\ No newline at end of file
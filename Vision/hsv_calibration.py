@@ -0,0 +1,70 @@
+# Artificial Intelligence was used in this file to : debug errors, research histogram thresholding
+
+# automatic HSV thresholds: H/S/V histograms of the target region vs. the background, accumulated over
+# many frames, then per channel the range that keeps the most target and the least background pixels
+# used by calibrate_test.py --auto
+
+import cv2
+import numpy as np
+
+CHANNEL_BINS = (180, 256, 256) # H, S, V like OpenCV's 8 bit HSV
+HUE_CHANNEL = 0
+WIDTH_PENALTY = 1e-4 # per bin, breaks ties towards the tightest range so empty bins at the edges are left out
+
+
+class HsvHistograms:
+    # fixed size counts, adding a frame is one calcHist per channel and region
+    def __init__(self):
+        self.target = [np.zeros(bins, dtype=np.float64) for bins in CHANNEL_BINS]
+        self.background = [np.zeros(bins, dtype=np.float64) for bins in CHANNEL_BINS]
+        self.frames = 0
+
+    def add(self, frame_hsv: np.ndarray, target_mask: np.ndarray, background_mask: np.ndarray):
+        # masks are uint8, non zero = pixel belongs to that region, pixels in neither are ignored
+        for channel, bins in enumerate(CHANNEL_BINS):
+            self.target[channel] += cv2.calcHist([frame_hsv], [channel], target_mask, [bins], [0, bins]).ravel()
+            self.background[channel] += cv2.calcHist([frame_hsv], [channel], background_mask, [bins], [0, bins]).ravel()
+        self.frames += 1
+
+    def thresholds(self) -> tuple[np.ndarray, np.ndarray]:
+        # (low_hsv, upper_hsv) like hsv_config.json, low hue > upper hue means the range wraps around 180
+        low, upper = [], []
+        for channel in range(len(CHANNEL_BINS)):
+            channel_low, channel_upper = best_range(self.target[channel], self.background[channel], circular=channel == HUE_CHANNEL)
+            low.append(channel_low)
+            upper.append(channel_upper)
+        return np.array(low, dtype=np.uint8), np.array(upper, dtype=np.uint8)
+
+
+def best_range(target_hist: np.ndarray, background_hist: np.ndarray, circular: bool = False) -> tuple[int, int]:
+    # inclusive [low, upper] bin range maximizing (share of target inside) - (share of background inside) - a little per bin,
+    # every range is scored at once from cumulative sums, circular ranges wrap from the last bin to the first
+    bins = len(target_hist)
+    target_share = target_hist / max(target_hist.sum(), 1)
+    background_share = background_hist / max(background_hist.sum(), 1)
+    cumulative = np.concatenate(([0.0], np.cumsum(target_share - background_share)))
+
+    low = np.arange(bins)[:, None]
+    upper = np.arange(bins)[None, :]
+    score = cumulative[upper + 1] - cumulative[low] # low <= upper
+    width = upper - low + 1
+    if circular:
+        # low > upper: everything except the bins between upper and low
+        wrapped = cumulative[bins] - (cumulative[low] - cumulative[upper + 1])
+        score = np.where(low <= upper, score, wrapped)
+        width = np.where(low <= upper, width, width + bins)
+    else:
+        score = np.where(low <= upper, score, -np.inf)
+    score = score - WIDTH_PENALTY * width
+
+    best_low, best_upper = np.unravel_index(np.argmax(score), score.shape)
+    return int(best_low), int(best_upper)
+
+def region_masks(height: int, width: int, center: tuple[int, int], target_radius: int, background_radius: int) -> tuple[np.ndarray, np.ndarray]:
+    # target = inside the aiming circle, background = outside a larger circle, the ring between is left out
+    # so the ball edge and anything the ball doesnt quite cover dont pollute either side
+    target_mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.circle(target_mask, center, target_radius, 255, -1)
+    background_mask = np.full((height, width), 255, dtype=np.uint8)
+    cv2.circle(background_mask, center, background_radius, 0, -1)
+    return target_mask, background_mask
@@ -0,0 +1,218 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# live HSV threshold tuning with trackbars and mask windows, split out of analyze_frame.py so the
+# detector never imports any of the GUI side. Enter saves to hsv_config.json, m toggles the masks, 1/2 switch cameras
+# usage: python hsv_tuner.py [--replay FILE] (python analyze_frame.py still starts it too)
+
+import argparse
+
+import cv2
+import numpy as np
+
+from analyze_frame import CONFIG_FILE_PATH, get_target_mask, get_target_masks, get_targets, hsv_configs, save_hsv_configs
+from recording import add_camera_arguments, open_cameras_from_args
+
+
+def on_trackbar_change(val):
+    pass
+
+def create_hsv_trackbars(initial_low_hsv, initial_upper_hsv):
+    cv2.namedWindow("HSV Thresholds")
+    cv2.createTrackbar("Low H", "HSV Thresholds", initial_low_hsv[0], 179, on_trackbar_change)
+    cv2.createTrackbar("High H", "HSV Thresholds", initial_upper_hsv[0], 179, on_trackbar_change)
+    cv2.createTrackbar("Low S", "HSV Thresholds", initial_low_hsv[1], 255, on_trackbar_change)
+    cv2.createTrackbar("High S", "HSV Thresholds", initial_upper_hsv[1], 255, on_trackbar_change)
+    cv2.createTrackbar("Low V", "HSV Thresholds", initial_low_hsv[2], 255, on_trackbar_change)
+    cv2.createTrackbar("High V", "HSV Thresholds", initial_upper_hsv[2], 255, on_trackbar_change)
+
+def set_trackbar_positions(low_hsv, high_hsv):
+    cv2.setTrackbarPos("Low H", "HSV Thresholds", low_hsv[0])
+    cv2.setTrackbarPos("High H", "HSV Thresholds", high_hsv[0])
+    cv2.setTrackbarPos("Low S", "HSV Thresholds", low_hsv[1])
+    cv2.setTrackbarPos("High S", "HSV Thresholds", high_hsv[1])
+    cv2.setTrackbarPos("Low V", "HSV Thresholds", low_hsv[2])
+    cv2.setTrackbarPos("High V", "HSV Thresholds", high_hsv[2])
+
+def update_hsv_configs_from_trackbars(camera_idx_to_update, low_hsv_configs, upper_hsv_configs):
+    # changes the arrays in place, the detector code holding the same arrays sees the new thresholds right away
+    low_hsv_configs[camera_idx_to_update][0] = cv2.getTrackbarPos("Low H", "HSV Thresholds")
+    upper_hsv_configs[camera_idx_to_update][0] = cv2.getTrackbarPos("High H", "HSV Thresholds")
+    low_hsv_configs[camera_idx_to_update][1] = cv2.getTrackbarPos("Low S", "HSV Thresholds")
+    upper_hsv_configs[camera_idx_to_update][1] = cv2.getTrackbarPos("High S", "HSV Thresholds")
+    low_hsv_configs[camera_idx_to_update][2] = cv2.getTrackbarPos("Low V", "HSV Thresholds")
+    upper_hsv_configs[camera_idx_to_update][2] = cv2.getTrackbarPos("High V", "HSV Thresholds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the HSV thresholds on a live feed")
+    add_camera_arguments(parser)
+    args = parser.parse_args()
+
+    camera_left, camera_right = open_cameras_from_args(args)
+    low_hsv_configs, upper_hsv_configs = hsv_configs()
+    
+    cameras = [camera_left, camera_right]
+    current_camera_idx = 0
+    active_camera_names = ["Left", "Right"]
+
+    show_masks = True
+    all_masks_width = 1920
+    all_masks_height = 1080
+    first_run_masks = True
+    all_masks_display = None
+    first_run_hsv_trackbars = True
+
+    print("Starting frame analysis loop...")
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    font_color = (0, 255, 0) 
+    line_type = 1
+    text_offset_x = 5 
+    text_offset_y = 15
+
+    while True:
+        active_camera = cameras[current_camera_idx]
+        active_camera_name_str = active_camera_names[current_camera_idx]
+        live_feed_window_name = f"Live Feed {active_camera_name_str}"
+
+        active_low_hsv = low_hsv_configs[current_camera_idx]
+        active_upper_hsv = upper_hsv_configs[current_camera_idx]
+
+        frame_hsv = active_camera.get_frame()
+
+        if frame_hsv is None:
+            print(f"Error: Failed to get frame from {active_camera_name_str} camera.")
+        else:
+            if show_masks:
+                if first_run_hsv_trackbars:
+                    create_hsv_trackbars(active_low_hsv, active_upper_hsv)
+                    first_run_hsv_trackbars = False
+                
+                update_hsv_configs_from_trackbars(current_camera_idx, low_hsv_configs, upper_hsv_configs)
+                # refresh active_low_hsv and active_upper_hsv after potential update from trackbars
+                active_low_hsv = low_hsv_configs[current_camera_idx]
+                active_upper_hsv = upper_hsv_configs[current_camera_idx]
+
+            targets = get_targets(frame_hsv, active_low_hsv, active_upper_hsv)
+            frame_display_bgr = cv2.cvtColor(frame_hsv, cv2.COLOR_HSV2BGR)
+            if targets:
+                for center, radius in targets:
+                    center = (round(center[0]), round(center[1])) # sub-pixel modes give floats, drawing wants whole pixels
+                    cv2.circle(frame_display_bgr, center, round(radius), (0, 255, 0), 2)
+                    cv2.circle(frame_display_bgr, center, 2, (0, 0, 255), 3)
+            cv2.imshow(live_feed_window_name, frame_display_bgr)
+
+            if show_masks:
+                if first_run_masks:
+                    cv2.namedWindow("All Masks", cv2.WINDOW_NORMAL)
+                    cv2.setWindowProperty("All Masks", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+                    all_masks_display = np.zeros((all_masks_height, all_masks_width, 3), dtype=np.uint8)
+                    first_run_masks = False
+                
+                if all_masks_display is not None:
+                    mask_h_display, mask_s_display, mask_v_display = get_target_masks(frame_hsv, active_low_hsv, active_upper_hsv)
+                    
+                    final_mask_display = get_target_mask(frame_hsv, active_low_hsv, active_upper_hsv)
+
+                    quad_width = all_masks_width // 2
+                    quad_height = all_masks_height // 2
+
+                    mask_h_bgr = cv2.cvtColor(mask_h_display, cv2.COLOR_GRAY2BGR)
+                    mask_s_bgr = cv2.cvtColor(mask_s_display, cv2.COLOR_GRAY2BGR)
+                    mask_v_bgr = cv2.cvtColor(mask_v_display, cv2.COLOR_GRAY2BGR)
+                    final_mask_bgr = cv2.cvtColor(final_mask_display, cv2.COLOR_GRAY2BGR)
+                    
+                    if quad_width > 0 and quad_height > 0:
+                        resized_h = cv2.resize(mask_h_bgr, (quad_width, quad_height))
+                        resized_s = cv2.resize(mask_s_bgr, (quad_width, quad_height))
+                        resized_v = cv2.resize(mask_v_bgr, (quad_width, quad_height))
+                        resized_final = cv2.resize(final_mask_bgr, (quad_width, quad_height))
+                        
+                        all_masks_display[0:quad_height, 0:quad_width] = resized_h
+                        all_masks_display[0:quad_height, quad_width:all_masks_width] = resized_s
+                        all_masks_display[quad_height:all_masks_height, 0:quad_width] = resized_v
+                        all_masks_display[quad_height:all_masks_height, quad_width:all_masks_width] = resized_final
+
+                        cv2.putText(all_masks_display, "Hue Mask", (text_offset_x, text_offset_y), font, font_scale, font_color, line_type)
+                        cv2.putText(all_masks_display, "Saturation Mask", (quad_width + text_offset_x, text_offset_y), font, font_scale, font_color, line_type)
+                        cv2.putText(all_masks_display, "Value Mask", (text_offset_x, quad_height + text_offset_y), font, font_scale, font_color, line_type)
+                        cv2.putText(all_masks_display, f"Combined Mask ({active_camera_name_str})", (quad_width + text_offset_x, quad_height + text_offset_y), font, font_scale, font_color, line_type)
+                    
+                    cv2.imshow("All Masks", all_masks_display)
+            else:
+                if not first_run_masks:
+                    try:
+                        cv2.destroyWindow("All Masks")
+                    except:
+                        pass
+                    first_run_masks = True
+                    all_masks_display = None
+                
+                if not first_run_hsv_trackbars: 
+                    try:
+                        cv2.destroyWindow("HSV Thresholds")
+                    except:
+                        pass
+                    first_run_hsv_trackbars = True
+
+        key = cv2.waitKey(1) & 0xFF
+        if key != 255 and key != -1 : # 255 or -1 often mean no key pressed btw
+            print(f"Key pressed: {key}")
+
+        if key == ord('q'):
+            break
+        elif key == 13:
+            print(f"showing masks: {show_masks}")
+            if show_masks:
+                print("calling save_hsv_configs...")
+                save_hsv_configs(CONFIG_FILE_PATH, low_hsv_configs, upper_hsv_configs)
+        elif key == ord('m'):
+            show_masks = not show_masks
+            if not show_masks: 
+                if not first_run_masks:
+                    try:
+                        cv2.destroyWindow("All Masks")
+                    except:
+                        pass
+                    first_run_masks = True 
+                    all_masks_display = None
+                if not first_run_hsv_trackbars:
+                    try:
+                        cv2.destroyWindow("HSV Thresholds")
+                    except:
+                        pass
+                    first_run_hsv_trackbars = True
+            else:
+                if first_run_hsv_trackbars:
+                    pass
+                    
+        elif key == ord('1'):
+            if current_camera_idx != 0:
+                print("Switching to Left Camera")
+                try: 
+                    cv2.destroyWindow(f"Live Feed {active_camera_names[1]}")
+                except:
+                    pass 
+                current_camera_idx = 0
+                if show_masks and not first_run_hsv_trackbars:
+                    set_trackbar_positions(low_hsv_configs[current_camera_idx], upper_hsv_configs[current_camera_idx])
+        elif key == ord('2'):
+            if current_camera_idx != 1:
+                print("Switching to Right Camera")
+                try: 
+                    cv2.destroyWindow(f"Live Feed {active_camera_names[0]}")
+                except:
+                    pass
+                current_camera_idx = 1
+                if show_masks and not first_run_hsv_trackbars:
+                    set_trackbar_positions(low_hsv_configs[current_camera_idx], upper_hsv_configs[current_camera_idx])
+    
+    print("Exiting...")
+    camera_left.stop()
+    camera_right.stop()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# Artificial Intelligence was used in this file to : debug errors, research latency histograms
+
+# where the milliseconds go: per stage duration histograms in fixed memory, a periodic summary,
+# and a rate limited logger so per frame messages dont slow down the loop being measured
+# startup times the phases of coming back up after a restart, up to the first target
+#
+#   with metrics.stage("masking"):
+#       mask = ...
+#   metrics.report_if_due() # prints p50/p95/p99/max per stage every REPORT_INTERVAL seconds
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# in pipeline order, stages that are never recorded are left out of the summary
+STAGES = ["capture", "conversion", "masking", "contours", "triangulation", "trajectory", "enqueue", "socket_write"]
+
+REPORT_INTERVAL = 5.0 # seconds between summaries
+
+
+class LatencyHistogram:
+    # log spaced buckets from 1 us to ~16 s, 8 per doubling so a percentile is off by at most ~9%
+    MIN_NS = 1_000
+    BUCKETS_PER_DOUBLING = 8
+    BUCKET_COUNT = BUCKETS_PER_DOUBLING * 24
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKET_COUNT + 1) # bucket 0 holds everything under MIN_NS
+        self.count = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns: int):
+        if duration_ns < self.MIN_NS:
+            bucket = 0
+        else:
+            bucket = min(int(math.log2(duration_ns / self.MIN_NS) * self.BUCKETS_PER_DOUBLING) + 1, self.BUCKET_COUNT)
+        self.counts[bucket] += 1
+        self.count += 1
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, q: float) -> float:
+        # upper edge of the bucket the q-th sample falls in, in ms
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                upper_ns = self.MIN_NS * 2 ** (bucket / self.BUCKETS_PER_DOUBLING)
+                return min(upper_ns, self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "p50": round(self.percentile(50), 3),
+            "p95": round(self.percentile(95), 3),
+            "p99": round(self.percentile(99), 3),
+            "max": round(self.max_ns / 1e6, 3),
+        }
+
+
+class Instrumentation:
+    # one histogram per stage name, summaries cover the time since the last report
+    def __init__(self, report_interval: float = REPORT_INTERVAL, enabled: bool = True):
+        self.report_interval = report_interval
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.last_report = time.monotonic()
+
+    def record(self, stage: str, duration_ns: int):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(duration_ns)
+
+    @contextmanager
+    def stage(self, name: str):
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start_ns)
+
+    def summary(self, reset: bool = False) -> dict[str, dict]:
+        # {stage: {"count", "p50", "p95", "p99", "max"}}, times in ms
+        with self.lock:
+            names = [name for name in STAGES if name in self.histograms]
+            names += sorted(name for name in self.histograms if name not in STAGES)
+            summary = {name: self.histograms[name].summary() for name in names}
+            if reset:
+                self.histograms = {}
+        return summary
+
+    def format_summary(self, summary: dict[str, dict]) -> str:
+        return "\n".join(
+            f"  {name:<14} n={stats['count']:<6} p50={stats['p50']:.2f} p95={stats['p95']:.2f} p99={stats['p99']:.2f} max={stats['max']:.2f} ms"
+            for name, stats in summary.items()
+        )
+
+    def report_if_due(self) -> bool:
+        # cheap enough to call every frame, prints and resets at most once per report_interval
+        now = time.monotonic()
+        if not self.enabled or now - self.last_report < self.report_interval:
+            return False
+        elapsed = now - self.last_report
+        self.last_report = now
+        summary = self.summary(reset=True)
+        if summary:
+            print(f"Stage timings over the last {elapsed:.1f} s:\n{self.format_summary(summary)}")
+        return True
+
+
+class RateLimitedLogger:
+    # prints a message at most once per interval per key, and says how many were held back in between
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_printed = {}
+        self.suppressed = {}
+
+    def log(self, key: str, message: str):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_printed.get(key, -math.inf) < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return
+            self.last_printed[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            message += f" ({suppressed} similar in the last {self.interval:.0f} s)"
+        print(message)
+
+
+def process_age() -> float:
+    # seconds since this process started, from /proc on linux, 0 elsewhere (then the clock starts at this import)
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTimer:
+    # how long a restart takes until targets stream again: each phase's duration and when it finished since the process started
+    #   with startup.phase("cameras"):
+    #       ...
+    #   startup.mark("first target") # once, from the loop
+    def __init__(self):
+        self.process_start = time.monotonic() - process_age()
+        self.lock = threading.Lock()
+        self.phases = [] # (name, seconds, seconds since process start)
+        self.marked = set()
+
+    def since_start(self) -> float:
+        return time.monotonic() - self.process_start
+
+    def record(self, name: str, seconds: float):
+        since_start = self.since_start()
+        with self.lock:
+            self.phases.append((name, seconds, since_start))
+        print(f"[startup] {name}: {seconds * 1e3:.0f} ms, {since_start:.2f} s since start")
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def mark(self, name: str) -> bool:
+        # a point in time instead of a phase, only the first mark of a name counts
+        with self.lock:
+            if name in self.marked:
+                return False
+            self.marked.add(name)
+            last_end = self.phases[-1][2] if self.phases else 0.0
+        self.record(name, self.since_start() - last_end)
+        return True
+
+    def summary(self) -> str:
+        with self.lock:
+            return ", ".join(f"{name} {seconds * 1e3:.0f} ms" for name, seconds, _ in self.phases)
+
+
+metrics = Instrumentation()
+log = RateLimitedLogger()
+startup = StartupTimer()
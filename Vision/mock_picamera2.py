@@ -0,0 +1,135 @@
+# Artificial Intelligence was used in this file to : debug errors, research picamera2 sensor modes
+
+# stands in for the picamera2 module off the pi (--mock-camera, or Camera(idx, backend=mock_picamera2)):
+# reports the imx219's sensor modes, honours the sensor mode, FrameDurationLimits and ExposureTime it is configured
+# with, and hands out flat frames at the frame rate that mode and those controls would really give,
+# with SensorTimestamp/FrameDuration/ExposureTime metadata like libcamera fills in
+# only the parts of the picamera2 api Camera uses are here
+
+import threading
+import time
+
+import numpy as np
+
+# what picamera2 reports for the imx219 (camera module v2), 10-bit modes. 640x480 is 2x2 binned from a 1280x960 crop
+SENSOR_MODES = [
+    {"format": "SRGGB10_CSI2P", "unpacked": "SRGGB10", "bit_depth": 10, "size": (640, 480), "fps": 206.65,
+     "crop_limits": (1000, 752, 1280, 960), "exposure_limits": (75, 11766829, None)},
+    {"format": "SRGGB10_CSI2P", "unpacked": "SRGGB10", "bit_depth": 10, "size": (1640, 1232), "fps": 41.85,
+     "crop_limits": (0, 0, 3280, 2464), "exposure_limits": (75, 11766829, None)},
+    {"format": "SRGGB10_CSI2P", "unpacked": "SRGGB10", "bit_depth": 10, "size": (1920, 1080), "fps": 47.57,
+     "crop_limits": (680, 692, 1920, 1080), "exposure_limits": (75, 11766829, None)},
+    {"format": "SRGGB10_CSI2P", "unpacked": "SRGGB10", "bit_depth": 10, "size": (3280, 2464), "fps": 21.19,
+     "crop_limits": (0, 0, 3280, 2464), "exposure_limits": (75, 11766829, None)},
+]
+
+DEFAULT_EXPOSURE_US = 20000 # what auto exposure settles on indoors
+
+
+class MockRequest:
+    def __init__(self, frame: np.ndarray, metadata: dict):
+        self.frame = frame
+        self.metadata = metadata
+
+    def make_array(self, name: str = "main") -> np.ndarray:
+        return self.frame.copy()
+
+    def get_metadata(self) -> dict:
+        return dict(self.metadata)
+
+    def release(self):
+        pass
+
+
+class MappedArray:
+    def __init__(self, request: MockRequest, stream: str = "main"):
+        self.array = request.frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Picamera2:
+    def __init__(self, camera_num: int = 0):
+        self.camera_num = camera_num
+        self.camera_properties = {"Model": "imx219", "PixelArraySize": (3280, 2464)}
+        self.sensor_modes = [dict(mode) for mode in SENSOR_MODES]
+        self.started = False
+        self.lock = threading.Lock()
+        self.configure(self.create_video_configuration())
+
+    def create_video_configuration(self, main: dict | None = None, sensor: dict | None = None, controls: dict | None = None, **kwargs) -> dict:
+        main = {"size": (640, 480), "format": "XBGR8888", **(main or {})}
+        return {"main": main, "sensor": dict(sensor or {}), "controls": dict(controls or {}), **kwargs}
+
+    def configure(self, config: dict):
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        self.config = config
+        self.mode = self._sensor_mode(config["main"]["size"], config.get("sensor", {}).get("output_size"))
+        self.controls = {}
+        self.set_controls(config.get("controls", {}))
+        channels = 4 if config["main"]["format"] in ("XBGR8888", "XRGB8888") else 3
+        width, height = config["main"]["size"]
+        self.frame = np.full((height, width, channels), (40, 60, 80, 255)[:channels], dtype=np.uint8)
+
+    def _sensor_mode(self, output_size, sensor_size) -> dict:
+        if sensor_size is not None:
+            for mode in self.sensor_modes:
+                if tuple(mode["size"]) == tuple(sensor_size):
+                    return mode
+            raise RuntimeError(f"no sensor mode of size {sensor_size}")
+        # like libcamera without a sensor config: the smallest full field of view mode that still covers the output
+        full_view = [mode for mode in self.sensor_modes if mode["crop_limits"][:2] == (0, 0)]
+        covering = [mode for mode in full_view if mode["size"][0] >= output_size[0] and mode["size"][1] >= output_size[1]]
+        return min(covering or full_view, key=lambda mode: mode["size"][0] * mode["size"][1])
+
+    def set_controls(self, controls: dict):
+        with self.lock:
+            self.controls.update(controls)
+
+    def frame_duration_us(self) -> int:
+        # the mode sets the shortest frame, FrameDurationLimits can only make it longer
+        duration = 1e6 / self.mode["fps"]
+        limits = self.controls.get("FrameDurationLimits")
+        if limits is not None:
+            duration = min(max(duration, limits[0]), max(duration, limits[1]))
+        exposure = self.exposure_us()
+        return int(round(max(duration, exposure)))
+
+    def exposure_us(self) -> int:
+        if self.controls.get("AeEnable", True) and "ExposureTime" not in self.controls:
+            return DEFAULT_EXPOSURE_US
+        return int(self.controls.get("ExposureTime", DEFAULT_EXPOSURE_US))
+
+    def start(self):
+        self.started = True
+        self.next_frame_ns = time.monotonic_ns()
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    def capture_request(self) -> MockRequest:
+        if not self.started:
+            raise RuntimeError("Camera is not started")
+        with self.lock:
+            duration_us = self.frame_duration_us()
+            exposure_us = min(self.exposure_us(), duration_us)
+        self.next_frame_ns += duration_us * 1000
+        delay = (self.next_frame_ns - time.monotonic_ns()) / 1e9
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.next_frame_ns = time.monotonic_ns() # fell behind, the sensor doesnt wait either
+        metadata = {"SensorTimestamp": self.next_frame_ns, "FrameDuration": duration_us, "ExposureTime": exposure_us,
+                    "AnalogueGain": self.controls.get("AnalogueGain", 1.0)}
+        return MockRequest(self.frame, metadata)
+
+    def capture_array(self, name: str = "main") -> np.ndarray:
+        return self.capture_request().make_array(name)
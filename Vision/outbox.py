@@ -0,0 +1,70 @@
+# Artificial Intelligence was used in this file to : debug errors, research threading
+
+import queue
+import threading
+import time
+from collections import deque
+
+
+class ConflatingOutbox:
+    # send queue where position data is latest-value-wins: only the newest sample waits to be sent,
+    # so after a network stall we send one fresh position instead of replaying seconds of old ones.
+    # control messages (calibration, QUIT, ...) keep their order, are never dropped and go out first
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.control_messages = deque()
+        self.latest_data = None
+
+        self.enqueued = 0 # data samples put in
+        self.conflated = 0 # data samples replaced by a newer one before they were sent
+        self.sent = 0 # messages written to the socket, data and control
+        self.send_blocked_time = 0.0 # seconds spent inside socket writes
+
+    def put_data(self, message):
+        with self.condition:
+            self.enqueued += 1
+            if self.latest_data is not None:
+                self.conflated += 1
+            self.latest_data = message
+            self.condition.notify()
+
+    def put_control(self, message):
+        with self.condition:
+            self.control_messages.append(message)
+            self.condition.notify()
+
+    def get(self, timeout: float | None = None):
+        # same contract as queue.Queue.get, raises queue.Empty on timeout
+        return self.get_item(timeout)[0]
+
+    def get_item(self, timeout: float | None = None) -> tuple[object, bool]:
+        # (message, True if it is a control message), for senders that hand data on to another conflating queue
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.control_messages or self.latest_data is not None, timeout):
+                raise queue.Empty
+            if self.control_messages:
+                return self.control_messages.popleft(), True
+            message = self.latest_data
+            self.latest_data = None
+            return message, False
+
+    def empty(self) -> bool:
+        with self.condition:
+            return not self.control_messages and self.latest_data is None
+
+    def timed_send(self, send_function, data):
+        # wraps the socket write so blocked time gets counted
+        start_time = time.perf_counter()
+        send_function(data)
+        with self.condition:
+            self.send_blocked_time += time.perf_counter() - start_time
+            self.sent += 1
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "enqueued": self.enqueued,
+                "conflated": self.conflated,
+                "sent": self.sent,
+                "send_blocked_s": round(self.send_blocked_time, 3),
+            }
@@ -0,0 +1,210 @@
+# Artificial Intelligence was used in this file to : debug errors, research threading
+
+import queue
+import threading
+import time
+
+from analyze_frame import get_raw_target_mask, get_coarse_target_mask, refine_targets
+from instrumentation import log
+
+END_OF_STREAM = object() # goes down the stages after the last stereo pair of a recording, each stage passes it on and stops
+
+
+class DropOldestQueue:
+    # bounded queue that throws away the oldest item instead of blocking the producer,
+    # so a slow stage never makes latency build up behind it
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float | None = None):
+        return self.queue.get(timeout=timeout)
+
+    def close(self):
+        pass
+
+
+class BlockingQueue(DropOldestQueue):
+    # waits for room instead of dropping, for replays that run as fast as they are consumed: a full queue holds up
+    # the stage in front of it, and in the end the capture stage and with it the ReplayCameras, so every frame is processed
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.closed = False
+
+    def put(self, item):
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def close(self):
+        # a put() still waiting gives up, the pipeline is stopping
+        self.closed = True
+
+
+class DetectionPipeline:
+    # capture -> color conversion/masking -> contours -> triangulation, one worker per stage
+    # cv2 releases the GIL so the stages overlap and throughput is set by the slowest one
+    STAGE_NAMES = ["capture", "mask", "contours", "triangulate"]
+    BUSY_SMOOTHING = 0.1 # weight of the newest item in the per stage busy time average
+
+    def __init__(self, ball_detector, depth: int = 2, lossless: bool | None = None):
+        self.ball_detector = ball_detector
+        self.depth = depth
+        self.running = False
+        self.finished = False # get_result() got END_OF_STREAM, nothing more will come
+        self.threads = []
+
+        # lossless: stages wait for the next one instead of dropping. None = only for replays that arent paced in real time
+        if lossless is None:
+            lossless = any(getattr(camera, "realtime", True) is False for camera in (ball_detector.left_camera, ball_detector.right_camera))
+        self.lossless = lossless
+
+        # queues[i] feeds stage i + 1, the last one holds the results
+        self.queues = [(BlockingQueue if lossless else DropOldestQueue)(depth) for _ in self.STAGE_NAMES]
+
+        # smoothed seconds each stage spends working on one item, not counting the wait for its input
+        self.busy_times = [None for _ in self.STAGE_NAMES]
+
+    def start(self):
+        self.running = True
+        stage_functions = [self._capture_stage, self._mask_stage, self._contour_stage, self._triangulate_stage]
+        for stage_idx, stage_function in enumerate(stage_functions):
+            name = self.STAGE_NAMES[stage_idx]
+            thread = threading.Thread(target=self._run_stage, args=(stage_idx, stage_function), name=f"Pipeline-{name}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        for stage_queue in self.queues:
+            stage_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+            if thread.is_alive():
+                print(f"{thread.name} did not finish in time.")
+        self.threads = []
+
+    def frames_held(self) -> int:
+        # most frames of one camera the stages hold at once: one in each of capture, mask and contours,
+        # plus full queues in front of mask and contours (mask results carry the frame for refine_targets)
+        return 3 + 2 * self.depth
+
+    def get_result(self, timeout: float = 1.0) -> tuple[list[tuple[float, float, float]], int | None]:
+        # (3D points, capture timestamp in ns) of the next processed stereo pair, no points if nothing was found
+        if self.finished:
+            return [], None
+        try:
+            timestamp, points = self.queues[-1].get(timeout=timeout)
+        except queue.Empty:
+            return [], None
+        if points is END_OF_STREAM:
+            self.finished = True
+            return [], None
+        return points, timestamp
+
+    def dropped(self) -> dict[str, int]:
+        # items thrown away at the input of each stage (and at the output for "result")
+        names = self.STAGE_NAMES[1:] + ["result"]
+        return {name: q.dropped for name, q in zip(names, self.queues)}
+
+    def busy_time(self) -> float | None:
+        # seconds per stereo pair of the slowest processing stage, which is what limits the frame rate.
+        # capture is left out, it mostly waits for the cameras
+        times = [busy for busy in self.busy_times[1:] if busy is not None]
+        return max(times) if times else None
+
+    def _record_busy(self, stage_idx: int, seconds: float):
+        previous = self.busy_times[stage_idx]
+        self.busy_times[stage_idx] = seconds if previous is None else previous + (seconds - previous) * self.BUSY_SMOOTHING
+
+    def _run_stage(self, stage_idx, stage_function):
+        name = self.STAGE_NAMES[stage_idx]
+        input_queue = self.queues[stage_idx - 1] if stage_idx > 0 else None
+        output_queue = self.queues[stage_idx]
+        is_last_stage = stage_idx == len(self.STAGE_NAMES) - 1
+        while self.running:
+            # items travel as (capture timestamp, data) so the result still knows when its frames were taken
+            try:
+                if input_queue is None:
+                    item = stage_function(None)
+                else:
+                    timestamp, data = input_queue.get(timeout=0.1)
+                    if data is END_OF_STREAM:
+                        item = (timestamp, data)
+                    else:
+                        start = time.perf_counter()
+                        item = stage_function(data)
+                        self._record_busy(stage_idx, time.perf_counter() - start)
+                        if item is not None or is_last_stage:
+                            item = (timestamp, item)
+            except queue.Empty:
+                continue
+            except Exception as e:
+                log.log(f"stage_error_{name}", f"Error in pipeline stage {name}: {e}")
+                continue
+            # misses are still reported at the end so consumers see every processed pair
+            if item is not None or is_last_stage:
+                output_queue.put(item)
+            if item is not None and item[1] is END_OF_STREAM:
+                return # the stages before this one have stopped, nothing else is coming
+
+    def _capture_stage(self, _):
+        stereo_pair = self.ball_detector._get_stereo_pair()
+        if stereo_pair is None:
+            return (None, END_OF_STREAM) if self.ball_detector.finished else None
+        left_frame_raw, right_frame_raw, timestamp = stereo_pair
+        return timestamp, (left_frame_raw, right_frame_raw)
+
+    def _mask_stage(self, stereo_pair):
+        left_frame_raw, right_frame_raw = stereo_pair
+        detector = self.ball_detector
+        future_left = detector.executor.submit(self._convert_and_mask, detector.left_camera, left_frame_raw, 0)
+        future_right = detector.executor.submit(self._convert_and_mask, detector.right_camera, right_frame_raw, 1)
+        return future_left.result(), future_right.result()
+
+    def _convert_and_mask(self, camera, frame_raw, camera_idx):
+        # the window is predicted before the previous frame has left the contour stage, the tracker margin covers that
+        low_hsv, upper_hsv = self.ball_detector.low_hsv_configs[camera_idx], self.ball_detector.upper_hsv_configs[camera_idx]
+        window = self.ball_detector.search_window(camera)
+        scale = self.ball_detector.detection_scale
+        if window is None and scale > 1:
+            # coarse mask only, the contour stage refines the candidates on the full resolution frame
+            return get_coarse_target_mask(camera, frame_raw, low_hsv, upper_hsv, scale), window, scale, frame_raw
+        return get_raw_target_mask(camera, frame_raw, low_hsv, upper_hsv, window), window, 1, frame_raw
+
+    def _find_camera_targets(self, camera, camera_idx, mask_result):
+        mask, window, scale, frame_raw = mask_result
+        detector = self.ball_detector
+        if scale > 1:
+            targets = refine_targets(camera, frame_raw, detector.low_hsv_configs[camera_idx], detector.upper_hsv_configs[camera_idx], mask, scale,
+                                     detector.min_area, detector.min_radius, detector.centroid_mode, detector.blob_backends[camera_idx])
+        else:
+            targets = detector.find_targets(mask, camera_idx)
+        return detector.track(camera, targets, window)
+
+    def _contour_stage(self, masks):
+        left_result, right_result = masks
+        detector = self.ball_detector
+        left_targets = self._find_camera_targets(detector.left_camera, 0, left_result)
+        right_targets = self._find_camera_targets(detector.right_camera, 1, right_result)
+        return left_targets, right_targets
+
+    def _triangulate_stage(self, targets):
+        left_targets, right_targets = targets
+        return self.ball_detector._triangulate(left_targets, right_targets)
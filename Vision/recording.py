@@ -0,0 +1,288 @@
+# Artificial Intelligence was used in this file to : debug errors, research mmap
+
+# record synchronized stereo frames on the pi, replay them anywhere
+#
+# file layout (little endian), fixed size so the recorder never allocates while capturing:
+#   header, HEADER_SIZE bytes: magic, version, width, height, channels, capacity (slots), frames written
+#   capacity slots of SLOT_SIZE bytes: left sensor timestamp (int64 ns), right sensor timestamp, sequence (uint64),
+#   then the left and right raw frames (height * width * channels uint8 each, RGB from Camera.capture_raw's RGBX,
+#   the X byte isnt stored. not flipped, so still upside down like the mounted cameras see them)
+# the slots are a ring, once capacity frames are written the oldest ones get overwritten
+#
+# usage: python recording.py <file> [--frames N] [--capacity N]     records until Ctrl+C or N frames
+
+import argparse
+import mmap
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from camera import Camera, EndOfStream
+from capture_config import check_matching
+
+MAGIC = b"KAKEREC1"
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sHHHHIQ")
+HEADER_SIZE = 64
+SLOT_HEADER_STRUCT = struct.Struct("<qqQ")
+SLOT_ALIGNMENT = 64 # frames start on cache line boundaries
+
+DEFAULT_CAPACITY = 600 # ~10 s of 60 fps stereo, at 640x480 RGB (2 * 0.92 MB per slot) that is ~1.1 GB
+
+
+def _slot_size(width: int, height: int, channels: int) -> int:
+    size = SLOT_HEADER_STRUCT.size + 2 * width * height * channels
+    return -(-size // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+
+
+class StereoRecorder:
+    # channels: bytes per pixel kept, the first ones of each pixel written (3 = RGB out of RGBX captures)
+    def __init__(self, filepath: str, width: int, height: int, channels: int = 3, capacity: int = DEFAULT_CAPACITY):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.capacity = capacity
+        self.slot_size = _slot_size(width, height, channels)
+        self.frame_size = width * height * channels
+        self.frames_written = 0
+
+        self.file = open(filepath, "w+b")
+        self.file.truncate(HEADER_SIZE + capacity * self.slot_size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self._write_header()
+
+    def _write_header(self):
+        HEADER_STRUCT.pack_into(self.map, 0, MAGIC, FORMAT_VERSION, self.width, self.height, self.channels, self.capacity, self.frames_written)
+
+    def write(self, left_frame: np.ndarray, left_timestamp_ns: int, right_frame: np.ndarray, right_timestamp_ns: int):
+        offset = HEADER_SIZE + (self.frames_written % self.capacity) * self.slot_size
+        SLOT_HEADER_STRUCT.pack_into(self.map, offset, left_timestamp_ns, right_timestamp_ns, self.frames_written)
+        offset += SLOT_HEADER_STRUCT.size
+        frames = np.frombuffer(self.map, dtype=np.uint8, count=2 * self.frame_size, offset=offset)
+        frames[:self.frame_size].reshape(self.height, self.width, self.channels)[...] = left_frame[..., :self.channels]
+        frames[self.frame_size:].reshape(self.height, self.width, self.channels)[...] = right_frame[..., :self.channels]
+        del frames # mmap cant be closed while a view into it is alive
+        self.frames_written += 1
+        self._write_header()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class StereoRecording:
+    # read only view of a recording, frames come straight out of the page cache
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        with open(filepath, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.channels, self.capacity, frames_written = HEADER_STRUCT.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{filepath} is not a version {FORMAT_VERSION} stereo recording")
+        self.slot_size = _slot_size(self.width, self.height, self.channels)
+        self.length = min(frames_written, self.capacity)
+        self.first_slot = frames_written % self.capacity if frames_written > self.capacity else 0
+        if self.length == 0:
+            raise ValueError(f"{filepath} has no frames")
+
+        # all frames of one camera as a single strided array, indexing it copies nothing
+        frame_shape = (self.height, self.width, self.channels)
+        self.frames = [
+            np.ndarray((self.capacity,) + frame_shape, dtype=np.uint8, buffer=self.map,
+                       offset=HEADER_SIZE + SLOT_HEADER_STRUCT.size + camera_idx * self.height * self.width * self.channels,
+                       strides=(self.slot_size, self.width * self.channels, self.channels, 1))
+            for camera_idx in range(2)
+        ]
+        slot_headers = np.ndarray((self.capacity, 3), dtype="<i8", buffer=self.map, offset=HEADER_SIZE, strides=(self.slot_size, 8))
+        self.timestamps = slot_headers[:, :2].copy()
+
+    def __len__(self):
+        return self.length
+
+    def frame(self, index: int, camera_idx: int) -> tuple[np.ndarray, int]:
+        # (frame, sensor timestamp in ns) of the index-th oldest pair
+        slot = (self.first_slot + index) % self.capacity
+        return self.frames[camera_idx][slot], int(self.timestamps[slot, camera_idx])
+
+    def duration_ns(self) -> int:
+        return self.frame(self.length - 1, 0)[1] - self.frame(0, 0)[1]
+
+
+class ReplayCamera(Camera):
+    # stands in for Camera(camera_idx), serving one side of a recording
+    # realtime: frames come at the recorded rate. otherwise as fast as they are consumed, every frame once
+    # (DetectionPipeline doesnt drop between its stages then, so consumed means by the last stage),
+    # and both sides stay in lockstep so the stereo pairing sees the same pairs as on the pi
+    def __init__(self, recording: StereoRecording, camera_idx: int, realtime: bool = True, loop: bool = False, zero_copy: bool = False):
+        print(f"Replaying camera {camera_idx} from {recording.filepath} ({len(recording)} frames)")
+        self.camera_id = camera_idx
+        self.recording = recording
+        self.realtime = realtime
+        self.loop = loop
+        self.zero_copy = zero_copy
+        self.HORZONTAL_RES = recording.width
+        self.VERTICAL_RES = recording.height # reconfigure() can change these, frames are then scaled on the way out
+        self.sensor_mode = None # the recording doesnt know its sensor mode, sensor_window() is the whole sensor
+        self.sensor_modes = []
+
+        self.next_index = 0
+        self.start_time_ns = None
+        self.finished = False
+        self._consumed_count = 0 # newest frame_count the consumer has moved past
+        self._init_capture_state()
+
+    def capture_raw(self):
+        if self.next_index >= len(self.recording) and not self.loop:
+            self.finished = True
+            self.capturing = False # ends the capture loop
+            raise EndOfStream(f"End of recording for camera {self.camera_id}")
+
+        if self.capturing and not self.realtime:
+            # never more than FRAME_HISTORY unread frames, so nothing is dropped and the two sides dont drift apart
+            with self._frames_condition:
+                self._frames_condition.wait_for(lambda: self.frame_count - self._consumed_count < self.FRAME_HISTORY or not self.capturing, timeout=1.0)
+
+        loop_count, index = divmod(self.next_index, len(self.recording))
+        frame, timestamp = self.recording.frame(index, self.camera_id)
+        # timestamps keep increasing across loops, one average frame interval between the end and the restart
+        loop_span_ns = self.recording.duration_ns() * len(self.recording) // max(len(self.recording) - 1, 1)
+        timestamp += loop_count * loop_span_ns
+        self.next_index += 1
+
+        if self.realtime:
+            first_timestamp = self.recording.frame(0, self.camera_id)[1]
+            if self.start_time_ns is None:
+                self.start_time_ns = time.monotonic_ns() - (timestamp - first_timestamp)
+            delay_ns = self.start_time_ns + (timestamp - first_timestamp) - time.monotonic_ns()
+            if delay_ns > 0:
+                time.sleep(delay_ns / 1e9)
+
+        if (self.HORZONTAL_RES, self.VERTICAL_RES) != (self.recording.width, self.recording.height):
+            frame = cv2.resize(frame, (self.HORZONTAL_RES, self.VERTICAL_RES), interpolation=cv2.INTER_AREA)
+        if self.zero_copy:
+            frame = self._convert_into_buffer(frame)
+        return frame, timestamp
+
+    def reconfigure(self, width: int, height: int):
+        # like Camera.reconfigure, the recording is scaled to the new size instead of the sensor being set up again
+        was_capturing = self.capturing
+        self.stop_capture()
+        self.HORZONTAL_RES, self.VERTICAL_RES = width, height
+        self._reset_buffers()
+        if was_capturing and not self.finished:
+            self.start_capture()
+
+    def get_latest_frames(self, newer_than=0, timeout=1.0):
+        with self._frames_condition:
+            self._consumed_count = max(self._consumed_count, newer_than)
+            self._frames_condition.notify_all()
+            if self.finished and self.frame_count <= newer_than:
+                return [] # nothing more is coming, dont make the caller wait for the timeout
+        return super().get_latest_frames(newer_than, timeout)
+
+    def get_frame(self):
+        try:
+            frame_raw, _ = self.capture_raw()
+        except EndOfStream:
+            return None
+        return self.convert_frame(frame_raw)
+
+    def stop_capture(self):
+        self.capturing = False
+        with self._frames_condition:
+            self._frames_condition.notify_all()
+        super().stop_capture()
+
+    def stop(self):
+        print("Stopping replay camera...")
+        self.stop_capture()
+
+
+_open_recordings = {}
+_open_recordings_lock = threading.Lock()
+
+def open_camera(camera_idx: int, replay: str | None = None, fast: bool = False, loop: bool = False, zero_copy: bool = False, mock: bool = False) -> Camera:
+    # Camera(camera_idx) on the pi, ReplayCamera when a recording is given, both sides share one mapping
+    # mock: Camera on mock_picamera2, to try the capture setup (sensor modes, frame rate) off the pi
+    if replay is None:
+        if mock:
+            import mock_picamera2
+            return Camera(camera_idx, zero_copy=zero_copy, backend=mock_picamera2)
+        return Camera(camera_idx, zero_copy=zero_copy)
+    with _open_recordings_lock: # both sides can be opened at the same time
+        if replay not in _open_recordings:
+            _open_recordings[replay] = StereoRecording(replay)
+    return ReplayCamera(_open_recordings[replay], camera_idx, realtime=not fast, loop=loop, zero_copy=zero_copy)
+
+def add_camera_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--replay", metavar="FILE", help="read frames from a recording made with recording.py instead of the cameras")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as frames are processed instead of in real time (not with --processes, the workers always replay in real time)")
+    parser.add_argument("--loop", action="store_true", help="start the replay over when it reaches the end")
+    parser.add_argument("--mock-camera", action="store_true", help="use mock_picamera2 instead of the cameras, for trying the capture setup off the pi")
+
+def open_cameras_from_args(args, zero_copy: bool = False) -> tuple[Camera, Camera]:
+    # both at once, bringing a camera up (sensor modes, configure, start, frame rate check) is mostly waiting on the sensor
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(open_camera, camera_idx, args.replay, args.fast, args.loop, zero_copy, args.mock_camera) for camera_idx in range(2)]
+    failed = [future.exception() for future in futures if future.exception() is not None]
+    if failed:
+        for future in futures:
+            if future.exception() is None:
+                future.result().stop() # dont leave the one that did open running
+        raise failed[0]
+    cameras = tuple(future.result() for future in futures)
+    check_matching(cameras)
+    return cameras
+
+
+def record(filepath: str, frames: int | None = None, capacity: int = DEFAULT_CAPACITY):
+    left_camera, right_camera = Camera(0), Camera(1)
+    left_camera.start_capture()
+    right_camera.start_capture()
+    recorder = None
+    last_counts = (0, 0)
+    print(f"Recording to {filepath}, Ctrl+C to stop")
+    try:
+        while frames is None or recorder is None or recorder.frames_written < frames:
+            left_frames = left_camera.get_latest_frames(last_counts[0])
+            right_frames = right_camera.get_latest_frames(last_counts[1])
+            if not left_frames or not right_frames:
+                continue
+            # newest left frame with the right frame closest to it in time
+            left = left_frames[-1]
+            right = min(right_frames, key=lambda frame: abs(frame[0] - left[0]))
+            if left[1] == last_counts[0] or right[1] == last_counts[1]:
+                continue
+            last_counts = (left[1], right[1])
+
+            if recorder is None:
+                height, width = left[2].shape[:2]
+                recorder = StereoRecorder(filepath, width, height, capacity=capacity)
+            recorder.write(left[2], left[0], right[2], right[0])
+            if recorder.frames_written % 60 == 0:
+                print(f"{recorder.frames_written} frames recorded")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        left_camera.stop()
+        right_camera.stop()
+        if recorder is not None:
+            print(f"Recorded {recorder.frames_written} frames ({min(recorder.frames_written, capacity)} kept)")
+            recorder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record synchronized stereo frames for ReplayCamera")
+    parser.add_argument("file")
+    parser.add_argument("--frames", type=int, default=None, help="stop after this many stereo pairs")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="ring size in stereo pairs, older pairs get overwritten")
+    args = parser.parse_args()
+    record(args.file, args.frames, args.capacity)
+
+if __name__ == "__main__":
+    main()
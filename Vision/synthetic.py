@@ -0,0 +1,102 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+import math
+
+import cv2
+import numpy as np
+
+DRAW_SHIFT = 4 # fractional bits for cv2 drawing, lets the ball sit on sub-pixel centers
+
+
+class SyntheticCamera:
+    # stands in for Camera when feeding rendered frames to the detection functions off the pi,
+    # frames are raw RGBX like the sensor gives but already upright
+    zero_copy = False
+
+    def __init__(self, width: int, height: int):
+        self.HORZONTAL_RES = width
+        self.VERTICAL_RES = height
+
+    def orient(self, image):
+        return image
+
+    def crop_raw(self, frame_raw, window):
+        x0, y0, x1, y1 = window
+        return frame_raw[y0:y1, x0:x1]
+
+    def convert_frame(self, frame_rgb):
+        return cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2HSV)
+
+
+def hsv_to_rgb(hsv) -> tuple[int, int, int]:
+    rgb = cv2.cvtColor(np.array([[hsv]], dtype=np.uint8), cv2.COLOR_HSV2RGB)[0, 0]
+    return int(rgb[0]), int(rgb[1]), int(rgb[2])
+
+def target_hsv(low_hsv: np.ndarray, upper_hsv: np.ndarray) -> tuple[int, int, int]:
+    # middle of the configured thresholds, handles hue wrap around
+    low_h, high_h = int(low_hsv[0]), int(upper_hsv[0])
+    if low_h > high_h:
+        hue = ((low_h + high_h + 180) // 2) % 180
+    else:
+        hue = (low_h + high_h) // 2
+    return hue, (int(low_hsv[1]) + int(upper_hsv[1])) // 2, (int(low_hsv[2]) + int(upper_hsv[2])) // 2
+
+def render_background(width: int, height: int, rng: np.random.Generator, brightness: float = 1.0, noise: float = 4.0) -> np.ndarray:
+    # warm gradient so nothing in it is close to the blue ball
+    frame = np.zeros((height, width, 4), dtype=np.float32)
+    frame[..., 0] = np.linspace(150, 220, width, dtype=np.float32)[None, :]
+    frame[..., 1] = np.linspace(90, 140, height, dtype=np.float32)[:, None]
+    frame[..., 2] = 60
+    frame[..., :3] *= brightness
+    if noise > 0:
+        frame[..., :3] += rng.normal(0, noise, (height, width, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+def draw_ball(frame: np.ndarray, center: tuple[float, float], radius: float, rgb: tuple[int, int, int]):
+    scale = 1 << DRAW_SHIFT
+    center_fixed = (int(round(center[0] * scale)), int(round(center[1] * scale)))
+    cv2.circle(frame, center_fixed, int(round(radius * scale)), (*rgb, 0), -1, cv2.LINE_AA, DRAW_SHIFT)
+
+def render_ball_frame(width: int, height: int, center: tuple[float, float], radius: float, ball_rgb: tuple[int, int, int],
+                      rng: np.random.Generator, brightness: float = 1.0, noise: float = 4.0, distractors: int = 0) -> np.ndarray:
+    # one raw RGBX frame with the ball at center, distractors are small specks of the ball color
+    frame = render_background(width, height, rng, brightness, noise)
+    for _ in range(distractors):
+        speck_center = (rng.uniform(0, width), rng.uniform(0, height))
+        draw_ball(frame, speck_center, rng.uniform(1.0, 3.0), ball_rgb)
+    draw_ball(frame, center, radius, ball_rgb)
+    return frame
+
+
+def project_point(point: tuple[float, float, float], camera_idx: int, width: int, height: int,
+                  horizontal_fov: float, vertical_fov: float, separation: float) -> tuple[float, float]:
+    # inverse of BallDetector.findPosition with the linear FOV model: where a 3D point (cm) lands in
+    # the upright frame of camera 0 (left, at x = -separation / 2) or camera 1 (right, at x = +separation / 2)
+    x, y, z = point
+    if camera_idx == 0:
+        yaw = 90 - np.degrees(np.arctan2(z, x + separation / 2))
+    else:
+        yaw = np.degrees(np.arctan2(z, separation / 2 - x)) - 90
+    pitch = -np.degrees(np.arctan2(y, z))
+    pixel_x = (yaw + horizontal_fov / 2) / horizontal_fov * width
+    pixel_y = (pitch + vertical_fov / 2) / vertical_fov * height
+    return float(pixel_x), float(pixel_y)
+
+def apparent_radius(point: tuple[float, float, float], ball_radius_cm: float, width: int, horizontal_fov: float) -> float:
+    # ball radius in pixels at that distance
+    distance = math.sqrt(sum(value * value for value in point))
+    return math.degrees(math.atan2(ball_radius_cm, distance)) / horizontal_fov * width
+
+def render_stereo_pair(width: int, height: int, point: tuple[float, float, float], ball_radius_cm: float, ball_rgb: tuple[int, int, int],
+                       rng: np.random.Generator, horizontal_fov: float, vertical_fov: float, separation: float,
+                       brightness: float = 1.0, noise: float = 4.0, distractors: int = 0):
+    # (left frame, right frame, left center, right center) with the ball at point,
+    # centers are in upright frame coordinates, the frames are rotated 180 degrees like the mounted cameras deliver them
+    frames, centers = [], []
+    for camera_idx in range(2):
+        center = project_point(point, camera_idx, width, height, horizontal_fov, vertical_fov, separation)
+        radius = apparent_radius(point, ball_radius_cm, width, horizontal_fov)
+        frame = render_ball_frame(width, height, center, radius, ball_rgb, rng, brightness, noise, distractors)
+        frames.append(cv2.flip(frame, -1))
+        centers.append(center)
+    return frames[0], frames[1], centers[0], centers[1]
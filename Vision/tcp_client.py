@@ -1,6 +1,7 @@
 # Artificial Intelligence was used in this file to : debug errors, and research TCP (previously serial communication)
 
 
+import argparse
 import socket
 import errno
 import time
@@ -8,8 +9,13 @@ import select
 import threading
 import queue
 
-from camera import Camera
+from governor import QualityGovernor
 from hello import BallDetector
+from instrumentation import metrics, log, startup
+from outbox import ConflatingOutbox
+from recording import add_camera_arguments, open_cameras_from_args
+from telemetry_protocol import HANDSHAKE_ACCEPT, HANDSHAKE_REQUEST, encode_impact_record, encode_record, format_impact_message, format_points_message
+from trajectory import TrajectoryPredictor
 
 def bytes_to_string(data):
     try:
@@ -21,16 +27,42 @@ def bytes_to_string(data):
             return f"<hex: {data.hex()}>"
 
 class TCPClient:
-    def __init__(self, ball_detector: BallDetector, host='10.249.222.198', port=55000):
+    HANDSHAKE_TIMEOUT = 1.0 # seconds to wait for the server to accept the binary protocol
+
+    def __init__(self, ball_detector: BallDetector, host='10.249.222.198', port=55000, pipeline_depth=None, binary_protocol=False, transport="tcp", udp_port=None, async_io=False, predict_impact=False, target_fps=None):
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"Unknown transport '{transport}', expected 'tcp' or 'udp'")
         self.ball_detector = ball_detector
+        self.pipeline_depth = pipeline_depth # None = run detection serially in the producer loop
+        self.binary_protocol = binary_protocol # ask for the binary protocol on connect, see telemetry_protocol.py
+        self.binary = False # True once the server agreed to it
+        self.sequence = 0
         self.host = host
         self.port = port
+        # "udp" sends positions as one binary record per datagram (see udp_receiver.py),
+        # control messages and the keep-alive connection stay on TCP
+        self.transport = transport
+        self.udp_port = udp_port if udp_port is not None else port
         self.socket = None
+        self.udp_socket = None
+        # async_io: the connection is run by async_client.ThreadedClientCore, which also reads the server's
+        # echoes (a plain socket never does, so they pile up) and batches writes, instead of sendall here
+        self.async_io = async_io
+        self.core = None
+        self.echoes_received = 0
+        # predict_impact: every sample also carries where and when trajectory.py thinks the ball hits the screen,
+        # so the game can act on it before the ball gets there instead of on a position that is already a frame old
+        self.predictor = TrajectoryPredictor() if predict_impact else None
+        # target_fps: governor.py lowers resolution/detection quality when the detector cant keep up, instead of dropping frames
+        self.target_fps = target_fps
+        self.governor = None
         self.running = False
-        self.send_queue = queue.Queue()
+        self.send_queue = ConflatingOutbox() # positions are latest-value-wins, control messages stay in order
         self.lock = threading.Lock()
 
     def connect(self):
+        if self.async_io:
+            return self.connect_async()
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -39,26 +71,105 @@ class TCPClient:
             print(f"Connecting to {self.host}:{self.port}")
             self.socket.connect((self.host, self.port))
             print("Connected to server.")
+            if self.transport == "udp":
+                self.open_udp()
+            elif self.binary_protocol:
+                self.binary = self.negotiate_binary()
             return True
         except Exception as e:
             print(f"Connection error: {e}")
             self.socket = None # get rid of socket if borken
             return False
 
+    def connect_async(self):
+        from async_client import ThreadedClientCore # asyncio takes a while to import, only pay for it when it is used
+        print(f"Connecting to {self.host}:{self.port}")
+        self.core = ThreadedClientCore(self.host, self.port, on_message=self.on_server_message,
+                                       on_write=lambda duration_ns: metrics.record("socket_write", duration_ns))
+        if not self.core.start():
+            print(f"Connection error: {self.core.error}")
+            self.core = None
+            return False
+        print("Connected to server.")
+        if self.transport == "udp":
+            self.open_udp()
+        elif self.binary_protocol:
+            reply = self.core.request(HANDSHAKE_REQUEST, self.HANDSHAKE_TIMEOUT)
+            self.binary = reply is not None and reply.decode('utf-8', errors='replace').strip() == HANDSHAKE_ACCEPT
+            print("Server accepted the binary protocol." if self.binary else "Server did not accept the binary protocol, sending text.")
+        return True
+
+    def open_udp(self):
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.connect((self.host, self.udp_port)) # fixes the destination, nothing is sent yet
+        print(f"Sending positions over UDP to {self.host}:{self.udp_port}")
+
+    def on_server_message(self, data):
+        # runs on the core's event loop thread, once per echoed line
+        self.echoes_received += 1
+        log.log("echo", f"Received: {bytes_to_string(data)}")
+
+    def negotiate_binary(self) -> bool:
+        # servers that only know text (unity) just echo the request back, so anything but the accept line means text
+        reply = b""
+        try:
+            self.socket.settimeout(self.HANDSHAKE_TIMEOUT)
+            self.socket.sendall((HANDSHAKE_REQUEST + '\n').encode('utf-8'))
+            while b"\n" not in reply:
+                data = self.socket.recv(1024)
+                if not data:
+                    break
+                reply += data
+        except socket.timeout:
+            pass
+        finally:
+            self.socket.settimeout(None)
+
+        if reply.split(b"\n", 1)[0].decode('utf-8', errors='replace').strip() == HANDSHAKE_ACCEPT:
+            print("Server accepted the binary protocol.")
+            return True
+        print("Server did not accept the binary protocol, sending text.")
+        return False
+
+    def encode_points(self, points, timestamp_ns):
+        # bytes for the binary protocol and UDP datagrams, a text line otherwise
+        if self.binary or self.udp_socket:
+            self.sequence += 1
+            return encode_record(self.sequence, timestamp_ns if timestamp_ns is not None else time.monotonic_ns(), points)
+        return format_points_message(points)
+
+    def encode_impact(self, prediction, timestamp_ns):
+        # same encoding choice as encode_points, called right after it so the binary record shares its sequence
+        if self.binary or self.udp_socket:
+            return encode_impact_record(self.sequence, timestamp_ns if timestamp_ns is not None else time.monotonic_ns(), prediction)
+        return format_impact_message(prediction)
+
     def send_messages(self):
         while self.running or not self.send_queue.empty():
             try:
-                message = self.send_queue.get(timeout=0.1)
+                message, is_control = self.send_queue.get_item(timeout=0.1)
                 if message == "QUIT":
                     if self.running:
                         print("Sender thread received QUIT signal.")
                     break
                 
-                if self.socket:
-                    with self.lock:
-                        print(f"Attempting to send via socket: '{message}'")
-                        self.socket.sendall((message + '\n').encode('utf-8'))
-                        print(f"Successfully sent via socket: '{message}'")
+                if self.udp_socket and isinstance(message, bytes):
+                    # a lost or late datagram is simply replaced by the next one, the receiver drops stale sequences
+                    try:
+                        with metrics.stage("socket_write"):
+                            self.send_queue.timed_send(self.udp_socket.send, message)
+                    except OSError as e:
+                        log.log("udp_send_error", f"UDP send error: {e}") # e.g. ECONNREFUSED from an earlier ICMP, keep going
+                elif self.core:
+                    # only queues it, the core writes everything queued since its last write in one go and keeps
+                    # just the newest position while a write is in flight. the write itself is timed in the core (on_write)
+                    data = message if isinstance(message, bytes) else (message + '\n').encode('utf-8')
+                    self.core.send(data, conflate=not is_control, framed=False)
+                elif self.socket:
+                    data = message if isinstance(message, bytes) else (message + '\n').encode('utf-8')
+                    with self.lock, metrics.stage("socket_write"):
+                        self.send_queue.timed_send(self.socket.sendall, data)
+                    log.log("sent", f"Sent via socket: '{message}'")
                 else:
                     print("Send error: Socket is not connected.")
             except queue.Empty:
@@ -71,24 +182,44 @@ class TCPClient:
                 break
         print("Sender thread stopped.")
 
+    def predict(self, points, timestamp_ns):
+        if self.predictor is None:
+            return None
+        with metrics.stage("trajectory"):
+            self.predictor.update_points(points, timestamp_ns if timestamp_ns is not None else time.monotonic_ns())
+            return self.predictor.predict_impact()
+
     def data_producer_loop(self):
         print("Data producer thread started.")
         try:
             while self.running:
                 start_time = time.time()
-                result = self.ball_detector.getTarget()
+                points = self.ball_detector.getTargets()
                 end_time = time.time()
+                if self.ball_detector.finished:
+                    print("End of the recording, stopping.")
+                    break
                 
                 delta_time = end_time - start_time
                 fps = 1 / delta_time if delta_time > 0 else 0
+                if self.governor:
+                    self.governor.update()
 
-                if result is not None:
-                    x, y, z = result
-                    message_to_send = f"{x:.2f},{y:.2f},{z:.2f}" # Format: float,float,float
-                    self.send_queue.put(message_to_send)
-                    print(f'FPS: {fps:.2f} | BallDetector: Target found ({x:.2f}, {y:.2f}, {z:.2f}). Queued for sending: "{message_to_send}"')
+                if points:
+                    startup.mark("first target")
+                    timestamp_ns = self.ball_detector.last_capture_timestamp_ns
+                    with metrics.stage("enqueue"):
+                        message_to_send = self.encode_points(points, timestamp_ns)
+                        prediction = self.predict(points, timestamp_ns)
+                        if prediction is not None:
+                            # one data message, so conflating never separates a position from its prediction
+                            impact = self.encode_impact(prediction, timestamp_ns)
+                            message_to_send = message_to_send + impact if isinstance(impact, bytes) else f"{message_to_send}\n{impact}"
+                        self.send_queue.put_data(message_to_send)
+                    log.log("found", f'FPS: {fps:.2f} | BallDetector: {len(points)} target(s) found. Queued for sending: "{message_to_send}"')
                 else:
-                    print(f'FPS: {fps:.2f} | BallDetector: No target found. Nothing to send.')
+                    log.log("not_found", f'FPS: {fps:.2f} | BallDetector: No target found. Nothing to send.')
+                metrics.report_if_due()
 
                 if not self.running:
                     break
@@ -100,12 +231,19 @@ class TCPClient:
             self.running = False # bruh stop
 
     def start(self):
-        if not self.connect():
+        with startup.phase("connect"):
+            connected = self.connect()
+        if not connected:
             print("Failed to connect to server. Client will not start.")
             return
 
         self.running = True
 
+        if self.pipeline_depth:
+            self.ball_detector.start_pipeline(self.pipeline_depth)
+        if self.target_fps:
+            self.governor = QualityGovernor(self.ball_detector, self.target_fps)
+
         self.producer_thread = threading.Thread(target=self.data_producer_loop, name="DataProducerThread")
         self.send_thread = threading.Thread(target=self.send_messages, name="SendMessageThread")
         
@@ -127,7 +265,7 @@ class TCPClient:
             self.running = False
             
             print("Sending QUIT signal to message queue...")
-            self.send_queue.put("QUIT")
+            self.send_queue.put_control("QUIT")
 
             threads_to_join = []
             if hasattr(self, 'producer_thread') and self.producer_thread.is_alive():
@@ -140,6 +278,10 @@ class TCPClient:
                 t.join(timeout=2.0) # waiting for duh threads
                 if t.is_alive():
                     print(f"{t.name} did not finish in time.")
+
+            self.ball_detector.stop_pipeline()
+            if self.governor:
+                print(f"Quality governor: {self.governor.stats()}")
             
             if self.socket:
                 print("Closing socket...")
@@ -151,14 +293,45 @@ class TCPClient:
                 finally:
                     self.socket.close()
                     self.socket = None
+            if self.core:
+                print("Closing connection...")
+                self.core.stop()
+                print(f"Connection stats: {self.core.stats()}")
+                self.core = None
+            if self.udp_socket:
+                self.udp_socket.close()
+                self.udp_socket = None
+            print(f"Send stats: {self.send_queue.stats()}")
             print("TCP Client shut down.")
 
 def main():
+    startup.mark("imports")
+    parser = argparse.ArgumentParser(description="Stream detected ball positions to the unity server")
+    add_camera_arguments(parser)
+    parser.add_argument("--predict-impact", action="store_true", help="also send the predicted screen impact (trajectory.py)")
+    parser.add_argument("--processes", action="store_true", help="run each camera's capture and detection in its own process (camera_workers.py)")
+    parser.add_argument("--target-fps", type=float, default=None, help="hold this frame rate by lowering capture resolution and detection quality (governor.py)")
+    parser.add_argument("--binary", action="store_true", help="ask the server for the binary protocol (telemetry_protocol.py), text if it says no")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help="udp: positions as datagrams (udp_receiver.py), control stays on TCP")
+    parser.add_argument("--udp-port", type=int, default=None, help="server port for the position datagrams, the TCP port by default")
+    parser.add_argument("--async-io", action="store_true", help="run the connection on asyncio (async_client.py), also reads the server's echoes")
+    args = parser.parse_args()
+    if args.target_fps and args.processes:
+        parser.error("--target-fps needs the cameras in this process, it cant be combined with --processes")
+    if args.udp_port is not None and args.transport != "udp":
+        parser.error("--udp-port only applies with --transport udp")
+
     print("Initializing cameras and ball detector...")
     try:
-        left_camera = Camera(0)
-        right_camera = Camera(1)
-        ball_detector = BallDetector(left_camera, right_camera)
+        if args.processes:
+            from camera_workers import MultiprocessDetector, open_camera_workers # multiprocessing is only needed in this mode
+            with startup.phase("camera workers"):
+                ball_detector = MultiprocessDetector(*open_camera_workers(args, zero_copy=True, track_targets=True))
+        else:
+            with startup.phase("cameras"):
+                left_camera, right_camera = open_cameras_from_args(args, zero_copy=True)
+            with startup.phase("detector"):
+                ball_detector = BallDetector(left_camera, right_camera, track_targets=True)
         print("Initialization complete.")
     except Exception as e:
         print(f"Error initializing cameras or BallDetector: {e}")
@@ -166,8 +339,11 @@ def main():
         return
 
     # create and start the TCP client
-    client = TCPClient(ball_detector, host='10.249.222.198', port=55000)
+    client = TCPClient(ball_detector, host='10.249.222.198', port=55000, pipeline_depth=2, binary_protocol=args.binary, transport=args.transport,
+                       udp_port=args.udp_port, async_io=args.async_io, predict_impact=args.predict_impact, target_fps=args.target_fps)
     client.start()
+    if args.processes:
+        ball_detector.stop() # the worker processes and their shared memory
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,95 @@
+# Artificial Intelligence was used in this file to : debug errors, research struct packing
+
+# wire formats for position data sent by TCPClient
+#
+# text (default): one line per sample, "x,y,z" per point, points separated by " | "
+# binary (opt in): after the handshake below, fixed size little endian records:
+#   uint8 version, uint8 point count, uint16 kind, uint32 sequence, int64 capture timestamp (ns),
+#   MAX_POINTS * 3 float32 coordinates (unused points are zero)
+# kind: 0 = positions, 1 = impact prediction from trajectory.py
+# (point count 0, coordinates = impact x, y, z, seconds to impact after the capture, confidence, 0) so a receiver
+# that only knows positions sees an empty sample. the impact record has the same sequence as the positions it follows
+# text: the impact prediction is its own line, "IMPACT x,y,z,seconds,confidence"
+#
+# handshake: the client sends HANDSHAKE_REQUEST as a text line, a server that speaks binary answers
+# HANDSHAKE_ACCEPT, anything else (like the unity "Server received: ..." echo) means stay on text
+
+import struct
+from collections import namedtuple
+
+PROTOCOL_VERSION = 1
+MAX_POINTS = 2
+
+HANDSHAKE_REQUEST = f"PROTO BIN{PROTOCOL_VERSION}"
+HANDSHAKE_ACCEPT = f"PROTO BIN{PROTOCOL_VERSION} OK"
+
+RECORD_STRUCT = struct.Struct(f"<BBHIq{MAX_POINTS * 3}f")
+RECORD_SIZE = RECORD_STRUCT.size
+
+RECORD_KIND_POSITIONS = 0
+RECORD_KIND_IMPACT = 1
+IMPACT_PREFIX = "IMPACT "
+
+TelemetryRecord = namedtuple("TelemetryRecord", ["version", "sequence", "timestamp_ns", "points"])
+# timestamp_ns is the capture the prediction was made from, the ball arrives time_s later
+ImpactRecord = namedtuple("ImpactRecord", ["version", "sequence", "timestamp_ns", "point", "time_s", "confidence"])
+
+_EMPTY_COORDINATES = (0.0,) * (MAX_POINTS * 3)
+
+
+def format_points_message(points) -> str:
+    # Format: float,float,float per point, up to two points separated by " | " like generate_data in ELVINBOSS
+    return " | ".join(f"{x:.2f},{y:.2f},{z:.2f}" for x, y, z in points)
+
+def parse_points_message(message: str) -> list[tuple[float, float, float]]:
+    points = []
+    for point in message.split("|"):
+        x, y, z = (float(value) for value in point.split(","))
+        points.append((x, y, z))
+    return points
+
+def format_impact_message(prediction) -> str:
+    # prediction is a trajectory.ImpactPrediction
+    x, y, z = prediction.point
+    return f"{IMPACT_PREFIX}{x:.2f},{y:.2f},{z:.2f},{prediction.time_s:.4f},{prediction.confidence:.3f}"
+
+def parse_impact_message(message: str) -> tuple[tuple[float, float, float], float, float]:
+    # (point, time_s, confidence), ValueError if it isnt an impact line
+    if not message.startswith(IMPACT_PREFIX):
+        raise ValueError(f"Not an impact message: {message!r}")
+    x, y, z, time_s, confidence = (float(value) for value in message[len(IMPACT_PREFIX):].split(","))
+    return (x, y, z), time_s, confidence
+
+
+def encode_record(sequence: int, timestamp_ns: int, points) -> bytes:
+    points = list(points)[:MAX_POINTS]
+    coordinates = [value for point in points for value in point]
+    coordinates += _EMPTY_COORDINATES[len(coordinates):]
+    return RECORD_STRUCT.pack(PROTOCOL_VERSION, len(points), RECORD_KIND_POSITIONS, sequence & 0xFFFFFFFF, timestamp_ns, *coordinates)
+
+def encode_impact_record(sequence: int, timestamp_ns: int, prediction) -> bytes:
+    coordinates = (*prediction.point, prediction.time_s, prediction.confidence)
+    coordinates += _EMPTY_COORDINATES[len(coordinates):]
+    return RECORD_STRUCT.pack(PROTOCOL_VERSION, 0, RECORD_KIND_IMPACT, sequence & 0xFFFFFFFF, timestamp_ns, *coordinates)
+
+def decode_record(data) -> TelemetryRecord | ImpactRecord:
+    version, point_count, kind, sequence, timestamp_ns, *coordinates = RECORD_STRUCT.unpack(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported telemetry record version {version}")
+    if kind == RECORD_KIND_IMPACT:
+        return ImpactRecord(version, sequence, timestamp_ns, tuple(coordinates[:3]), coordinates[3], coordinates[4])
+    points = [tuple(coordinates[i * 3:i * 3 + 3]) for i in range(min(point_count, MAX_POINTS))]
+    return TelemetryRecord(version, sequence, timestamp_ns, points)
+
+
+class RecordDecoder:
+    # turns a byte stream into records, keeps partial records around until the rest arrives
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[TelemetryRecord | ImpactRecord]:
+        self.buffer += data
+        record_count = len(self.buffer) // RECORD_SIZE
+        records = [decode_record(self.buffer[i * RECORD_SIZE:(i + 1) * RECORD_SIZE]) for i in range(record_count)]
+        del self.buffer[:record_count * RECORD_SIZE]
+        return records
@@ -0,0 +1,146 @@
+# Artificial Intelligence was used in this file to : debug errors, research TCP
+
+# reference receiving side for TCPClient, speaks the text protocol like TCPServerUnity.cs
+# (including the "Server received: ..." echo) and the binary protocol from telemetry_protocol.py
+# usage: python telemetry_receiver.py [port]
+
+import socket
+import sys
+import threading
+
+from telemetry_protocol import HANDSHAKE_ACCEPT, HANDSHAKE_REQUEST, IMPACT_PREFIX, ImpactRecord, RecordDecoder, TelemetryRecord, parse_impact_message, parse_points_message
+
+
+class TelemetryReceiver:
+    # on_record is called with a TelemetryRecord for every sample and an ImpactRecord for every impact prediction,
+    # text samples get sequence None
+    def __init__(self, host='0.0.0.0', port=55000, on_record=None, accept_binary=True):
+        self.host = host
+        self.port = port
+        self.on_record = on_record
+        self.accept_binary = accept_binary
+        self.server_socket = None
+        self.running = False
+        self.threads = []
+        self.client_sockets = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        self.port = self.server_socket.getsockname()[1] # in case port 0 was asked for
+        self.running = True
+
+        accept_thread = threading.Thread(target=self._accept_loop, name="TelemetryAcceptThread")
+        accept_thread.daemon = True
+        accept_thread.start()
+        self.threads.append(accept_thread)
+
+    def stop(self):
+        # close() alone doesnt wake a thread blocked in accept() or recv(), shutdown() does
+        self.running = False
+        with self.lock:
+            sockets = list(self.client_sockets)
+        if self.server_socket:
+            sockets.append(self.server_socket)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass # already disconnected
+        if self.server_socket:
+            self.server_socket.close()
+            self.server_socket = None
+        for t in self.threads:
+            t.join(timeout=2.0)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except OSError:
+                break # socket closed by stop()
+            with self.lock:
+                self.client_sockets.add(client_socket)
+            client_thread = threading.Thread(target=self._handle_client, args=(client_socket, address), name=f"TelemetryClient-{address[1]}")
+            client_thread.daemon = True
+            client_thread.start()
+            self.threads.append(client_thread)
+
+    def _handle_client(self, client_socket, address):
+        print(f"Client connected: {address}")
+        text_buffer = b""
+        decoder = None # set once the client switched to binary
+        try:
+            with client_socket:
+                while self.running:
+                    data = client_socket.recv(4096)
+                    if not data:
+                        break
+                    if decoder is not None:
+                        for record in decoder.feed(data):
+                            self._deliver(record)
+                        continue
+
+                    text_buffer += data
+                    while b"\n" in text_buffer:
+                        line, text_buffer = text_buffer.split(b"\n", 1)
+                        try:
+                            line = line.decode('utf-8').strip()
+                        except UnicodeDecodeError:
+                            print(f"Client {address}: dropped a line that is not utf-8: {line[:40]!r}")
+                            continue
+                        if not line:
+                            continue
+                        if line == HANDSHAKE_REQUEST and self.accept_binary:
+                            client_socket.sendall((HANDSHAKE_ACCEPT + "\n").encode('utf-8'))
+                            decoder = RecordDecoder()
+                            # whatever came after the handshake line is already binary
+                            for record in decoder.feed(text_buffer):
+                                self._deliver(record)
+                            text_buffer = b""
+                            break
+                        client_socket.sendall(f"Server received: {line}\n".encode('utf-8'))
+                        self._handle_text_line(line)
+        except OSError as e:
+            print(f"Client {address} error: {e}")
+        finally:
+            with self.lock:
+                self.client_sockets.discard(client_socket)
+        print(f"Client disconnected: {address}")
+
+    def _handle_text_line(self, line):
+        if line.startswith(IMPACT_PREFIX):
+            try:
+                point, time_s, confidence = parse_impact_message(line)
+            except ValueError:
+                return
+            self._deliver(ImpactRecord(0, None, None, point, time_s, confidence))
+            return
+        try:
+            points = parse_points_message(line)
+        except ValueError:
+            return # calibration corners and other control messages
+        self._deliver(TelemetryRecord(0, None, None, points))
+
+    def _deliver(self, record):
+        if self.on_record is not None:
+            self.on_record(record)
+
+
+def main():
+    import time
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 55000
+    receiver = TelemetryReceiver(port=port, on_record=lambda record: print(record))
+    receiver.start()
+    print(f"Listening on port {receiver.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        receiver.stop()
+
+if __name__ == "__main__":
+    main()
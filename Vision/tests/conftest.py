@@ -0,0 +1,5 @@
+# the Vision modules import each other by plain name (from analyze_frame import ...), so the tests need Vision/ on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,29 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# a blob_backend in hsv_config.json that isnt one of BLOB_BACKENDS is refused instead of running the contour backend
+
+import json
+
+import numpy as np
+import pytest
+
+from analyze_frame import BLOB_BACKEND, find_targets, load_blob_backends
+
+
+def write_config(tmp_path, left, right=None):
+    configs = {"camera_0": {"blob_backend": left}, "camera_1": {} if right is None else {"blob_backend": right}}
+    filepath = tmp_path / "hsv_config.json"
+    filepath.write_text(json.dumps(configs))
+    return str(filepath)
+
+
+def test_known_backends_load(tmp_path):
+    assert load_blob_backends(write_config(tmp_path, "components")) == ["components", BLOB_BACKEND]
+
+def test_misspelled_backend_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="camera_1"):
+        load_blob_backends(write_config(tmp_path, "hough", "component"))
+
+def test_find_targets_refuses_unknown_backends():
+    with pytest.raises(ValueError):
+        find_targets(np.zeros((48, 64), np.uint8), backend="countours")
@@ -0,0 +1,55 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# ray tables for frames that show another part of the sensor than the calibration frames did
+
+import json
+
+import numpy as np
+import pytest
+
+from calibration import RayTable, load_ray_tables
+from capture_config import FULL_SENSOR_WINDOW, sensor_window
+from mock_picamera2 import SENSOR_MODES
+
+# a lens without distortion, calibrated on full view 640x480 frames
+CALIBRATION = {
+    "image_size": [640, 480],
+    "sensor_window": list(FULL_SENSOR_WINDOW),
+    "camera_matrix": [[560.0, 0.0, 330.0], [0.0, 560.0, 235.0], [0.0, 0.0, 1.0]],
+    "dist_coeffs": [0.0, 0.0, 0.0, 0.0, 0.0],
+    "rms": 0.1,
+}
+CROP = sensor_window(next(mode for mode in SENSOR_MODES if mode["size"] == (640, 480)), SENSOR_MODES, (640, 480))
+
+
+def test_same_window_scales_with_the_resolution():
+    full = RayTable(CALIBRATION, 640, 480)
+    half = RayTable(CALIBRATION, 320, 240)
+    assert half.lookup(np.array([[50.0, 60.0]]))[0][0] == pytest.approx(full.lookup(np.array([[100.0, 120.0]]))[0][0], abs=1e-3)
+
+def test_cropped_window_keeps_the_directions():
+    full = RayTable(CALIBRATION, 640, 480)
+    cropped = RayTable(CALIBRATION, 640, 480, CROP)
+    pixels = np.array([[0.0, 0.0], [100.0, 240.0], [639.0, 479.0]])
+    # the same spot of the sensor, in full view pixels (both windows are centered, the flip doesnt move them)
+    full_pixels = np.column_stack(((CROP[0] + CROP[2] * pixels[:, 0] / 640) * 640, (CROP[1] + CROP[3] * pixels[:, 1] / 480) * 480))
+    for got, expected in zip(cropped.lookup(pixels), full.lookup(full_pixels)):
+        assert got == pytest.approx(expected, abs=1e-3)
+    # the crop covers 39% of the width, so it spans much less than the full view
+    assert cropped.lookup(pixels)[0][2] - cropped.lookup(pixels)[0][0] < 0.5 * (full.lookup(pixels)[0][2] - full.lookup(pixels)[0][0])
+
+def test_window_outside_the_calibration_is_refused(tmp_path):
+    cropped_calibration = dict(CALIBRATION, sensor_window=list(CROP))
+    with pytest.raises(ValueError):
+        RayTable(cropped_calibration, 640, 480, FULL_SENSOR_WINDOW)
+
+    filepath = tmp_path / "camera_calibration.json"
+    filepath.write_text(json.dumps({"camera_0": cropped_calibration, "camera_1": cropped_calibration}))
+    assert load_ray_tables(640, 480, (CROP, CROP), str(filepath)) is not None
+    assert load_ray_tables(640, 480, (FULL_SENSOR_WINDOW, CROP), str(filepath)) is None
+
+def test_old_files_are_the_full_view():
+    old = {key: value for key, value in CALIBRATION.items() if key != "sensor_window"}
+    pixels = np.array([[10.0, 20.0], [600.0, 400.0]])
+    for got, expected in zip(RayTable(old, 640, 480, CROP).lookup(pixels), RayTable(CALIBRATION, 640, 480, CROP).lookup(pixels)):
+        assert got == pytest.approx(expected)
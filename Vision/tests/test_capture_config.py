@@ -0,0 +1,67 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# sensor mode choice and the part of the sensor a mode shows, on the imx219 modes mock_picamera2 reports
+
+import types
+
+import pytest
+
+from capture_config import FULL_SENSOR_WINDOW, choose_sensor_mode, sensor_window, upright_window
+from hello import BallDetector
+from mock_picamera2 import SENSOR_MODES
+
+
+def mode_of_size(width, height):
+    return next(mode for mode in SENSOR_MODES if mode["size"] == (width, height))
+
+
+def test_never_smaller_than_the_output():
+    for size, fps in [((640, 480), 60), ((1280, 960), 60), ((960, 720), 30), ((1920, 1080), 60)]:
+        mode = choose_sensor_mode(SENSOR_MODES, size, fps)
+        assert mode["size"][0] >= size[0] and mode["size"][1] >= size[1]
+    with pytest.raises(ValueError):
+        choose_sensor_mode(SENSOR_MODES, (4000, 3000), 30)
+
+def test_allow_crop_false_keeps_the_full_view():
+    mode = choose_sensor_mode(SENSOR_MODES, (640, 480), 60, allow_crop=False)
+    assert sensor_window(mode, SENSOR_MODES, (640, 480)) == pytest.approx((0, 0, 1, 1), abs=2e-3)
+
+def test_cropped_mode_window():
+    # 640x480 is binned from a centered 1280x960 crop of the 3280x2464 sensor
+    window = sensor_window(mode_of_size(640, 480), SENSOR_MODES, (640, 480))
+    assert window == pytest.approx((1000 / 3280, 752 / 2464, 1280 / 3280, 960 / 2464))
+    assert upright_window(window) == pytest.approx(window) # centered, the flip doesnt move it
+
+def test_output_aspect_ratio_crops_the_mode():
+    # a 4:3 output from the 16:9 1920x1080 mode only uses the middle 1440 columns
+    x, y, w, h = sensor_window(mode_of_size(1920, 1080), SENSOR_MODES, (640, 480))
+    assert w * 3280 == pytest.approx(1440) and x * 3280 == pytest.approx(680 + 240)
+    assert h * 2464 == pytest.approx(1080)
+
+def test_no_mode_is_the_whole_sensor():
+    assert sensor_window(None, [], (640, 480)) == FULL_SENSOR_WINDOW
+
+
+def linear_detector(window):
+    camera = types.SimpleNamespace(sensor_window=lambda: window)
+    detector = object.__new__(BallDetector)
+    detector.left_camera = detector.right_camera = camera
+    detector.HORIZONTAL_RESOLUTION, detector.VERTICAL_RESOLUTION = 640, 480
+    detector.frames_rotated = False
+    detector.use_calibration = False
+    detector.ray_tables = None
+    return detector
+
+def test_linear_model_follows_the_sensor_window():
+    full = linear_detector(FULL_SENSOR_WINDOW)
+    assert full.getAngle(0, 0, 0) == pytest.approx((-BallDetector.HORIZONTAL_FOV / 2, -BallDetector.VERTICAL_FOV / 2))
+    assert full.getAngle(640, 480, 0) == pytest.approx((BallDetector.HORIZONTAL_FOV / 2, BallDetector.VERTICAL_FOV / 2))
+
+    # the cropped mode spans 39% of the width, a pixel there is the same direction as in the full view
+    window = sensor_window(mode_of_size(640, 480), SENSOR_MODES, (640, 480))
+    cropped = linear_detector(window)
+    yaw_left, _ = cropped.getAngle(0, 240, 0)
+    yaw_right, _ = cropped.getAngle(640, 240, 0)
+    assert yaw_right - yaw_left == pytest.approx(BallDetector.HORIZONTAL_FOV * 1280 / 3280)
+    full_pixel_x = (window[0] + window[2] * 100 / 640) * 640
+    assert cropped.getAngle(100, 240, 0)[0] == pytest.approx(full.getAngle(full_pixel_x, 240, 0)[0])
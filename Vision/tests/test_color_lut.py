@@ -0,0 +1,95 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# the lookup tables in color_lut.py have to give the same mask, bit for bit, as the split/inRange 2-of-3 vote in analyze_frame
+
+import cv2
+import numpy as np
+import pytest
+
+import analyze_frame
+from analyze_frame import get_raw_target_mask, get_target_mask
+from color_lut import ColorClassifier
+from synthetic import SyntheticCamera
+
+THRESHOLDS = [
+    ((98, 195, 59), (114, 255, 113)), # like hsv_config.json
+    ((107, 185, 62), (111, 255, 126)),
+    ((170, 50, 50), (10, 255, 255)), # hue wraps around 179 -> 0
+    ((179, 0, 0), (0, 255, 255)), # wrap with only the two edge hues
+    ((0, 0, 0), (179, 255, 255)), # everything
+    ((90, 200, 120), (80, 100, 255)), # empty hue and saturation ranges
+    ((60, 0, 255), (60, 0, 255)), # single values at the channel edges
+]
+
+
+def thresholds(low, upper):
+    return np.array(low, dtype=np.uint8), np.array(upper, dtype=np.uint8)
+
+def reference_mask(frame_hsv, low_hsv, upper_hsv, monkeypatch):
+    monkeypatch.setattr(analyze_frame, "USE_COLOR_LUT", False)
+    return get_target_mask(frame_hsv, low_hsv, upper_hsv)
+
+def random_hsv_frame(rng, height=120, width=160):
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame[..., 0] = rng.integers(0, 180, (height, width)) # opencv hue stops at 179
+    return frame
+
+def edge_hsv_frame(low_hsv, upper_hsv):
+    # every combination of the values around each threshold and the ends of each channel
+    def around(channel, top):
+        values = {0, top}
+        for value in (int(low_hsv[channel]), int(upper_hsv[channel])):
+            values.update(v for v in (value - 1, value, value + 1) if 0 <= v <= top)
+        return sorted(values)
+    hues, saturations, values = around(0, 179), around(1, 255), around(2, 255)
+    grid = np.array(np.meshgrid(hues, saturations, values, indexing="ij"), dtype=np.uint8).reshape(3, -1).T
+    return np.ascontiguousarray(grid.reshape(1, -1, 3))
+
+
+@pytest.mark.parametrize("low, upper", THRESHOLDS)
+def test_hsv_lut_matches_in_range_vote_on_random_values(low, upper, monkeypatch):
+    low_hsv, upper_hsv = thresholds(low, upper)
+    frame_hsv = random_hsv_frame(np.random.default_rng(0))
+    expected = reference_mask(frame_hsv, low_hsv, upper_hsv, monkeypatch)
+    assert np.array_equal(ColorClassifier(low_hsv, upper_hsv).classify_hsv(frame_hsv), expected)
+
+@pytest.mark.parametrize("low, upper", THRESHOLDS)
+def test_hsv_lut_matches_in_range_vote_on_edge_values(low, upper, monkeypatch):
+    low_hsv, upper_hsv = thresholds(low, upper)
+    frame_hsv = edge_hsv_frame(low_hsv, upper_hsv)
+    expected = reference_mask(frame_hsv, low_hsv, upper_hsv, monkeypatch)
+    assert np.array_equal(ColorClassifier(low_hsv, upper_hsv).classify_hsv(frame_hsv), expected)
+
+def test_hue_wrap_takes_both_ends(monkeypatch):
+    # saturation passes and value fails everywhere, so the vote comes down to hue alone
+    low_hsv, upper_hsv = thresholds((170, 0, 1), (10, 255, 255))
+    hues = np.arange(180, dtype=np.uint8)
+    frame_hsv = np.stack([hues, np.full_like(hues, 255), np.zeros_like(hues)], axis=-1).reshape(1, -1, 3)
+    mask = ColorClassifier(low_hsv, upper_hsv).classify_hsv(frame_hsv)
+    assert np.array_equal(mask, reference_mask(frame_hsv, low_hsv, upper_hsv, monkeypatch))
+    assert np.array_equal(np.flatnonzero(mask[0]), np.r_[0:11, 170:180])
+
+@pytest.mark.parametrize("low, upper", THRESHOLDS[:3])
+@pytest.mark.parametrize("channels", [3, 4])
+def test_rgb_table_matches_converted_frame(low, upper, channels, monkeypatch):
+    low_hsv, upper_hsv = thresholds(low, upper)
+    frame_rgb = np.random.default_rng(1).integers(0, 256, (120, 160, channels), dtype=np.uint8)
+    expected = reference_mask(cv2.cvtColor(np.ascontiguousarray(frame_rgb[..., :3]), cv2.COLOR_RGB2HSV), low_hsv, upper_hsv, monkeypatch)
+    assert np.array_equal(ColorClassifier(low_hsv, upper_hsv).classify_rgb(frame_rgb), expected)
+
+@pytest.mark.parametrize("window", [None, (10, 20, 90, 100)])
+def test_raw_target_mask_is_the_same_with_and_without_the_lut(window, monkeypatch):
+    camera = SyntheticCamera(160, 120)
+    low_hsv, upper_hsv = thresholds(*THRESHOLDS[2])
+    frame_rgbx = np.random.default_rng(2).integers(0, 256, (120, 160, 4), dtype=np.uint8)
+    monkeypatch.setattr(analyze_frame, "USE_COLOR_LUT", False)
+    expected = get_raw_target_mask(camera, frame_rgbx, low_hsv, upper_hsv, window)
+    monkeypatch.setattr(analyze_frame, "USE_COLOR_LUT", True)
+    assert np.array_equal(get_raw_target_mask(camera, frame_rgbx, low_hsv, upper_hsv, window), expected)
+
+def test_rgb_table_covers_every_color(monkeypatch):
+    low_hsv, upper_hsv = thresholds(*THRESHOLDS[0])
+    codes = np.arange(1 << 24, dtype=np.uint32)
+    all_colors = np.stack([codes & 0xFF, (codes >> 8) & 0xFF, codes >> 16], axis=-1).astype(np.uint8).reshape(4096, 4096, 3)
+    expected = reference_mask(cv2.cvtColor(all_colors, cv2.COLOR_RGB2HSV), low_hsv, upper_hsv, monkeypatch)
+    assert np.array_equal(ColorClassifier(low_hsv, upper_hsv).rgb_table.reshape(4096, 4096), expected)
@@ -0,0 +1,33 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# the quality governor only moves between levels that keep the camera's field of view
+
+import dataclasses
+import types
+
+from camera import Camera
+from capture_config import choose_sensor_mode, sensor_window
+from governor import QUALITY_LEVELS, QualityGovernor
+from mock_picamera2 import SENSOR_MODES
+
+
+def fake_detector(width, height, allow_crop=True):
+    settings = dataclasses.replace(Camera.CAPTURE_SETTINGS, allow_crop=allow_crop)
+    mode = choose_sensor_mode(SENSOR_MODES, (width, height), settings.fps, allow_crop)
+    camera = types.SimpleNamespace(sensor_modes=SENSOR_MODES, CAPTURE_SETTINGS=settings,
+                                   sensor_window=lambda: sensor_window(mode, SENSOR_MODES, (width, height)))
+    detector = types.SimpleNamespace(left_camera=camera, right_camera=camera, HORIZONTAL_RESOLUTION=width, VERTICAL_RESOLUTION=height,
+                                     detection_scale=1, can_apply_quality=lambda: True, applied=[])
+    detector.apply_quality = lambda *quality: detector.applied.append(quality)
+    return detector
+
+def test_cropped_mode_keeps_to_its_crop():
+    # 640x480 at 60 fps comes from the cropped mode, the bigger levels would need the full view 1640x1232 mode
+    governor = QualityGovernor(fake_detector(640, 480), target_fps=40)
+    assert [(level.width, level.height) for level in governor.levels] == [(640, 480), (640, 480), (480, 360), (320, 240)]
+    assert governor.levels[governor.level] == QUALITY_LEVELS[3]
+
+def test_full_view_keeps_every_level():
+    # without cropping every level comes from the 41.85 fps 1640x1232 mode, all of them see the whole sensor
+    governor = QualityGovernor(fake_detector(640, 480, allow_crop=False), target_fps=40)
+    assert governor.levels == QUALITY_LEVELS
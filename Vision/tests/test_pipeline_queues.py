@@ -0,0 +1,32 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# the queues between pipeline stages: live cameras drop the oldest item, fast replays wait for room
+
+import threading
+
+from pipeline import BlockingQueue, DropOldestQueue
+
+
+def test_drop_oldest_keeps_the_newest():
+    stage_queue = DropOldestQueue(2)
+    for item in range(5):
+        stage_queue.put(item)
+    assert [stage_queue.get(), stage_queue.get()] == [3, 4]
+    assert stage_queue.dropped == 3
+
+def test_blocking_queue_waits_for_room():
+    stage_queue = BlockingQueue(2)
+    putter = threading.Thread(target=lambda: [stage_queue.put(item) for item in range(5)])
+    putter.start()
+    assert [stage_queue.get(timeout=2.0) for _ in range(5)] == [0, 1, 2, 3, 4]
+    putter.join(timeout=2.0)
+    assert stage_queue.dropped == 0
+
+def test_close_lets_a_waiting_put_give_up():
+    stage_queue = BlockingQueue(1)
+    stage_queue.put(0)
+    putter = threading.Thread(target=stage_queue.put, args=(1,))
+    putter.start()
+    stage_queue.close()
+    putter.join(timeout=1.0)
+    assert not putter.is_alive()
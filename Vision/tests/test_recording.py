@@ -0,0 +1,50 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# recordings keep RGB out of the RGBX captures, and a replay that runs out ends quietly
+
+import time
+
+import numpy as np
+
+from recording import StereoRecorder, StereoRecording, ReplayCamera
+
+WIDTH, HEIGHT = 16, 12
+
+
+def write_recording(filepath, frames=5):
+    rng = np.random.default_rng(0)
+    recorder = StereoRecorder(str(filepath), WIDTH, HEIGHT, capacity=frames)
+    written = []
+    for idx in range(frames):
+        left, right = rng.integers(0, 256, (2, HEIGHT, WIDTH, 4), dtype=np.uint8) # RGBX like capture_raw
+        recorder.write(left, (idx + 1) * 1000, right, (idx + 1) * 1000)
+        written.append((left, right))
+    recorder.close()
+    return written
+
+
+def test_x_byte_is_not_stored(tmp_path):
+    written = write_recording(tmp_path / "pairs.rec")
+    recording = StereoRecording(str(tmp_path / "pairs.rec"))
+    assert recording.channels == 3
+    assert (tmp_path / "pairs.rec").stat().st_size < 64 + 5 * (24 + 2 * WIDTH * HEIGHT * 3 + 64)
+    for idx, (left, right) in enumerate(written):
+        np.testing.assert_array_equal(recording.frame(idx, 0)[0], left[..., :3])
+        np.testing.assert_array_equal(recording.frame(idx, 1)[0], right[..., :3])
+
+def test_end_of_recording_is_quiet(tmp_path, capsys):
+    write_recording(tmp_path / "pairs.rec")
+    camera = ReplayCamera(StereoRecording(str(tmp_path / "pairs.rec")), 0, realtime=False)
+    camera.start_capture()
+    last_count, seen = 0, 0
+    deadline = time.monotonic() + 5.0
+    while not (camera.finished and camera.frame_count <= last_count) and time.monotonic() < deadline:
+        frames = camera.get_latest_frames(last_count, timeout=0.1)
+        if frames:
+            seen += len([frame for frame in frames if frame[1] > last_count])
+            last_count = frames[-1][1]
+    camera.capture_thread.join(timeout=1.0)
+    assert seen == 5 and camera.finished
+    assert not camera.capture_thread.is_alive()
+    assert "error" not in capsys.readouterr().out.lower()
+    assert camera.get_frame() is None
@@ -0,0 +1,50 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# TelemetryReceiver over localhost TCP: stop() has to return right away with a client still connected,
+# and a line that isnt utf-8 is dropped without taking the connection down
+
+import socket
+import time
+
+import pytest
+
+from telemetry_receiver import TelemetryReceiver
+
+
+@pytest.fixture
+def receiver():
+    records = []
+    receiver = TelemetryReceiver(host="127.0.0.1", port=0, on_record=records.append)
+    receiver.records = records
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def read_line(client):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = client.recv(1024)
+        if not chunk:
+            raise AssertionError(f"the receiver closed the connection, got {data!r} before that")
+        data += chunk
+    return data
+
+
+def test_stop_wakes_blocked_threads(receiver):
+    with socket.create_connection(("127.0.0.1", receiver.port), timeout=5.0) as client:
+        client.sendall(b"1.00,2.00,3.00\n")
+        read_line(client) # the client thread is now blocked in recv, the accept thread in accept
+        start = time.monotonic()
+        receiver.stop()
+        assert time.monotonic() - start < 0.5
+        assert all(not thread.is_alive() for thread in receiver.threads)
+
+def test_line_that_is_not_utf8_is_dropped(receiver):
+    with socket.create_connection(("127.0.0.1", receiver.port), timeout=5.0) as client:
+        client.sendall(b"\xff\xfe\n1.00,2.00,3.00\n")
+        assert read_line(client) == b"Server received: 1.00,2.00,3.00\n"
+    deadline = time.monotonic() + 2.0
+    while not receiver.records and time.monotonic() < deadline: # the echo goes out before the record is handed on
+        time.sleep(0.001)
+    assert [record.points for record in receiver.records] == [[(1.0, 2.0, 3.0)]]
@@ -0,0 +1,50 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# TargetTracker: the search window and the confidence follow the same margin, and the state survives two threads
+
+import threading
+
+from tracker import TargetTracker
+
+
+def follow(tracker, points, radius=5.0):
+    for x, y in points:
+        window = tracker.search_window()
+        offset = (window[0], window[1]) if window is not None else (0, 0)
+        tracker.update([((x - offset[0], y - offset[1]), radius)], window)
+
+
+def test_confidence_uses_the_instance_margin():
+    # the ball ends up 30 px off the prediction: inside a 100 px margin that is a good match, at 20 px it isnt
+    path = [(100, 100), (110, 100), (120, 100)]
+    wide, narrow = TargetTracker(640, 480, search_margin=100), TargetTracker(640, 480, search_margin=20)
+    for tracker in (wide, narrow):
+        follow(tracker, path)
+        tracker.update([((160, 100), 5.0)], None)
+    assert wide.confidence > 0.7
+    assert narrow.confidence < 0.1
+    assert wide.search_window() is not None and narrow.search_window() is None
+
+def test_search_window_and_update_from_two_threads():
+    # like the pipeline: one stage asks for windows while another updates
+    tracker = TargetTracker(640, 480)
+    stop = threading.Event()
+    errors = []
+
+    def ask():
+        while not stop.is_set():
+            try:
+                window = tracker.search_window()
+                assert window is None or (0 <= window[0] < window[2] <= 640 and 0 <= window[1] < window[3] <= 480)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    asker = threading.Thread(target=ask)
+    asker.start()
+    for step in range(2000):
+        tracker.update([((100 + step % 400, 240), 5.0)] if step % 7 else [], None)
+    stop.set()
+    asker.join()
+    assert not errors
+    assert tracker.stats()["full_frames"] == 2000
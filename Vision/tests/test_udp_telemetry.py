@@ -0,0 +1,156 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# positions over UDP on localhost: the receiver's sequence, loss, reorder and jitter bookkeeping in udp_receiver.py,
+# fed by a plain socket where the test needs exact control of the order, and by TCPClient's UDP path end to end
+
+import socket
+import threading
+import time
+
+import pytest
+
+from tcp_client import TCPClient
+from telemetry_protocol import ImpactRecord, TelemetryRecord, encode_impact_record, encode_record
+from telemetry_receiver import TelemetryReceiver
+from trajectory import ImpactPrediction
+from udp_receiver import UdpTelemetryReceiver
+
+POINTS = [(1.0, 2.0, 3.0), (4.0, 5.0, 6.0)]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the receiver")
+        time.sleep(0.001)
+
+
+def handled(receiver):
+    stats = receiver.stats()
+    return stats["received"] + stats["reordered"] + stats["malformed"]
+
+
+@pytest.fixture
+def receiver():
+    records = []
+    receiver = UdpTelemetryReceiver(host="127.0.0.1", port=0, on_record=records.append)
+    receiver.records = records
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+@pytest.fixture
+def sender(receiver):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(("127.0.0.1", receiver.port))
+    sent = 0
+
+    def send(datagram):
+        # one at a time, so loopback delivers them in exactly the order the test wants
+        nonlocal sent
+        sock.send(datagram)
+        sent += 1
+        wait_for(lambda: handled(receiver) == sent)
+
+    yield send
+    sock.close()
+
+
+def send_sequences(send, sequences, interval_ns=1_000_000):
+    start = time.monotonic_ns()
+    for sequence in sequences:
+        send(encode_record(sequence, start + sequence * interval_ns, POINTS))
+
+
+def test_in_order(receiver, sender):
+    send_sequences(sender, range(1, 51))
+    stats = receiver.stats()
+    assert stats["received"] == 50
+    assert stats["lost"] == 0 and stats["reordered"] == 0 and stats["loss_rate"] == 0.0
+    assert [record.sequence for record in receiver.records] == list(range(1, 51))
+    assert receiver.records[0].points == POINTS
+
+def test_gaps_count_as_lost(receiver, sender):
+    send_sequences(sender, [1, 2, 3, 6, 7, 10])
+    stats = receiver.stats()
+    assert stats["received"] == 6
+    assert stats["lost"] == 4 # 4, 5, 8, 9
+    assert stats["loss_rate"] == 0.4
+
+def test_late_and_duplicate_records_are_dropped(receiver, sender):
+    # 4 arrives after 5 and is dropped, so it stays counted as lost
+    send_sequences(sender, [1, 2, 3, 5, 4, 6, 6, 2])
+    stats = receiver.stats()
+    assert stats["received"] == 5
+    assert stats["reordered"] == 3
+    assert stats["lost"] == 1
+    assert [record.sequence for record in receiver.records] == [1, 2, 3, 5, 6]
+
+def test_sequence_wraps_around(receiver, sender):
+    send_sequences(sender, [2 ** 32 - 2, 2 ** 32 - 1, 0, 1, 3])
+    stats = receiver.stats()
+    assert stats["received"] == 5
+    assert stats["lost"] == 1
+    assert stats["reordered"] == 0
+
+def test_malformed_datagrams(receiver, sender):
+    sender(b"not a record")
+    sender(b"\x02" + encode_record(1, 0, POINTS)[1:]) # unknown version
+    send_sequences(sender, [1, 2])
+    stats = receiver.stats()
+    assert stats["malformed"] == 2
+    assert stats["received"] == 2
+
+def test_impact_record_rides_with_its_positions(receiver, sender):
+    prediction = ImpactPrediction((0.5, 1.0, 0.0), 0.25, 1000, 0.9, 1.0, True)
+    sender(encode_record(7, 1000, POINTS) + encode_impact_record(7, 1000, prediction))
+    assert receiver.stats()["received"] == 1
+    positions, impact = receiver.records
+    assert isinstance(positions, TelemetryRecord) and isinstance(impact, ImpactRecord)
+    assert impact.sequence == 7 and impact.point == (0.5, 1.0, 0.0)
+
+def test_jitter(receiver, sender):
+    # sent back to back: the arrival spacing matches the capture spacing, nothing to smooth
+    now = time.monotonic_ns
+    for sequence in range(1, 21):
+        sender(encode_record(sequence, now(), POINTS))
+    assert receiver.stats()["jitter_ms"] < 5.0
+
+    # captured 20 ms apart but arriving within about a millisecond: every transit changes by ~20 ms,
+    # and the 1/16 smoothing gets most of the way there in 40 records
+    send_sequences(sender, range(21, 61), interval_ns=20_000_000)
+    assert 10.0 < receiver.stats()["jitter_ms"] < 21.0
+
+
+def test_tcp_client_udp_path(receiver):
+    # TCPClient with transport="udp": connects to the control server over TCP, sends positions as datagrams
+    # from its sender thread, one sequence per sample
+    control = TelemetryReceiver(host="127.0.0.1", port=0)
+    control.start()
+    client = TCPClient(None, host="127.0.0.1", port=control.port, transport="udp", udp_port=receiver.port)
+    assert client.connect()
+    client.running = True
+    send_thread = threading.Thread(target=client.send_messages, daemon=True)
+    send_thread.start()
+    try:
+        for sample in range(30):
+            if sample in (10, 20):
+                client.sequence += 2 # two samples the network "lost"
+            client.send_queue.put_data(client.encode_points(POINTS, time.monotonic_ns()))
+            wait_for(lambda: client.send_queue.empty() and handled(receiver) == sample + 1)
+    finally:
+        client.running = False
+        client.send_queue.put_control("QUIT")
+        send_thread.join(timeout=2.0)
+        client.udp_socket.close()
+        client.socket.close()
+        control.stop()
+
+    stats = receiver.stats()
+    assert stats["received"] == 30
+    assert stats["lost"] == 4
+    assert stats["reordered"] == 0 and stats["malformed"] == 0
+    assert receiver.records[-1].sequence == 34
+    assert receiver.records[-1].points == POINTS
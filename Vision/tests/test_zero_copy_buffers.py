@@ -0,0 +1,45 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+# zero copy HSV buffers are only converted into again once nothing holds the frame in them
+
+import threading
+
+import numpy as np
+
+from camera import Camera
+
+
+def zero_copy_camera(width=8, height=6):
+    camera = object.__new__(Camera)
+    camera.camera_id = 0
+    camera.zero_copy = True
+    camera.HORZONTAL_RES, camera.VERTICAL_RES = width, height
+    camera.frames_held = 1
+    camera._frames_condition = threading.Condition() # no sensor or capture thread, just the buffers
+    camera._frames, camera._timestamps = [], []
+    camera._reset_buffers()
+    return camera
+
+def rgb(value, width=8, height=6):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def test_held_frames_are_not_overwritten():
+    camera = zero_copy_camera()
+    held = camera._convert_into_buffer(rgb(200))
+    crop = camera._convert_into_buffer(rgb(100))[1:3, 2:5] # only a view of the second frame is kept
+    expected_held, expected_crop = held.copy(), crop.copy()
+    for value in range(50):
+        camera._convert_into_buffer(rgb(value)) # converted and dropped right away, like a frame nobody looked at
+    np.testing.assert_array_equal(held, expected_held)
+    np.testing.assert_array_equal(crop, expected_crop)
+    assert len(camera._hsv_buffers) == Camera.FRAME_HISTORY + 2 # nothing was added, the free ones were reused
+
+def test_buffers_are_added_when_all_are_held():
+    camera = zero_copy_camera()
+    frames = [camera._convert_into_buffer(rgb(value)) for value in range(10)]
+    assert len({id(frame) for frame in frames}) == 10
+    assert len(camera._hsv_buffers) == 10
+    frames.clear()
+    camera._convert_into_buffer(rgb(0))
+    assert len(camera._hsv_buffers) == 10
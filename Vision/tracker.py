@@ -0,0 +1,104 @@
+# Artificial Intelligence was used in this file to : debug errors
+
+import math
+import threading
+
+
+class TargetTracker:
+    # keeps one camera's ball position and velocity so detection only has to look
+    # around where the ball should be next, instead of the whole frame.
+    # pipelined, search_window() runs in the mask stage and update() in the contour stage, so the state is behind a lock
+    MAX_MISSES = 5 # misses in a row before going back to full frame search
+    MIN_CONFIDENCE = 0.3 # below this the prediction isnt trusted and the full frame is searched
+    SEARCH_MARGIN = 40 # pixels added around the predicted ball, grows with every miss
+
+    def __init__(self, frame_width: int, frame_height: int, search_margin: int | None = None):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.search_margin = search_margin if search_margin is not None else self.SEARCH_MARGIN # smaller = cheaper ROI, but lost sooner
+
+        self.position = None # (x, y) of the last matched target
+        self.velocity = (0.0, 0.0) # pixels per frame
+        self.radius = 0
+        self.misses = 0
+        self.confidence = 0.0
+
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.lock = threading.Lock()
+
+    def predict(self) -> tuple[float, float] | None:
+        with self.lock:
+            return self._predict()
+
+    def _predict(self) -> tuple[float, float] | None:
+        if self.position is None:
+            return None
+        frames_ahead = self.misses + 1
+        return self.position[0] + self.velocity[0] * frames_ahead, self.position[1] + self.velocity[1] * frames_ahead
+
+    def search_window(self) -> tuple[int, int, int, int] | None:
+        # (x0, y0, x1, y1) to search in the next frame, None means search the full frame
+        with self.lock:
+            return self._search_window()
+
+    def _search_window(self) -> tuple[int, int, int, int] | None:
+        prediction = self._predict()
+        if prediction is None or self.misses >= self.MAX_MISSES or self.confidence < self.MIN_CONFIDENCE:
+            return None
+
+        half_size = self.radius + self.search_margin * (self.misses + 1)
+        x0 = max(0, int(prediction[0] - half_size))
+        y0 = max(0, int(prediction[1] - half_size))
+        x1 = min(self.frame_width, int(prediction[0] + half_size) + 1)
+        y1 = min(self.frame_height, int(prediction[1] + half_size) + 1)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None # prediction left the frame
+        return x0, y0, x1, y1
+
+    def update(self, targets: list, window: tuple[int, int, int, int] | None) -> list:
+        # targets were found inside window, returns them in frame coordinates, best match first
+        with self.lock:
+            return self._update(targets, window)
+
+    def _update(self, targets: list, window: tuple[int, int, int, int] | None) -> list:
+        if window is None:
+            self.full_frames += 1
+        else:
+            self.roi_frames += 1
+            x0, y0 = window[0], window[1]
+            targets = [((center[0] + x0, center[1] + y0), radius) for center, radius in targets]
+
+        if not targets:
+            self.misses += 1
+            self.confidence *= 0.5
+            if self.misses >= self.MAX_MISSES:
+                self.position = None
+                self.velocity = (0.0, 0.0)
+            return targets
+
+        prediction = self._predict()
+        if prediction is not None:
+            targets = sorted(targets, key=lambda target: math.dist(target[0], prediction))
+        else:
+            targets = sorted(targets, key=lambda target: -target[1]) # nothing to go on, biggest blob first
+
+        center, radius = targets[0]
+        if prediction is None:
+            self.velocity = (0.0, 0.0)
+            self.confidence = 0.5
+        else:
+            frames_elapsed = self.misses + 1
+            self.velocity = ((center[0] - self.position[0]) / frames_elapsed, (center[1] - self.position[1]) / frames_elapsed)
+            error = math.dist(center, prediction)
+            self.confidence = max(0.0, 1.0 - error / (self.search_margin + radius))
+            if len(targets) > 1:
+                self.confidence *= 0.5 # something else looks like the ball too
+        self.position = center
+        self.radius = radius
+        self.misses = 0
+        return targets
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {"roi_frames": self.roi_frames, "full_frames": self.full_frames}
@@ -0,0 +1,230 @@
+# Artificial Intelligence was used in this file to : debug errors, research kalman filters
+
+# where and when the ball is going to hit the screen, from the 3D positions BallDetector gives us
+# a constant acceleration kalman filter per axis (position, velocity, acceleration), so gravity and drag are
+# picked up without knowing which way is down in camera coordinates. every sample is one predict + update,
+# nothing is refit over the history, so a frame costs the same no matter how long the ball has been flying
+# usage: python trajectory.py   runs simulated throws and prints how good the prediction is how long before impact
+
+import json
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+SCREEN_FILE_PATH = "screen_config.json" # lives next to hsv_config.json
+SCREEN_Z = 265 # cm, the z > 265 check in hello.py
+
+# x, y = bottom left corner of the screen, like calibrateCamera() in hello.py returns it. width/height None = no bounds
+ScreenPlane = namedtuple("ScreenPlane", ["x", "y", "z", "width", "height"])
+DEFAULT_SCREEN = ScreenPlane(None, None, SCREEN_Z, None, None)
+
+# point = (x, y, z) on the screen plane, time_s = seconds after the sample it was predicted from,
+# timestamp_ns = impact on the capture clock (None without capture timestamps), sigma_cm = 1 sigma miss distance
+ImpactPrediction = namedtuple("ImpactPrediction", ["point", "time_s", "timestamp_ns", "confidence", "sigma_cm", "on_screen"])
+
+
+def screen_from_corners(bottomleft, bottomright, topleft, topright) -> ScreenPlane:
+    # calibrateCamera() from hello.py, with the four corners measured by pointing the ball at them
+    x = (bottomleft[0] + topleft[0]) / 2
+    y = (bottomleft[1] + bottomright[1]) / 2
+    z = (bottomleft[2] + bottomright[2] + topleft[2] + topright[2]) / 4
+    width = ((bottomright[0] - bottomleft[0]) + (topright[0] - topleft[0])) / 2
+    height = ((topleft[1] - bottomleft[1]) + (topright[1] - bottomright[1])) / 2
+    return ScreenPlane(x, y, z, width, height)
+
+def load_screen(filepath: str = SCREEN_FILE_PATH) -> ScreenPlane:
+    if not os.path.exists(filepath):
+        return DEFAULT_SCREEN
+    with open(filepath, 'r') as f:
+        config = json.load(f)
+    return ScreenPlane(config.get("x"), config.get("y"), config.get("z", SCREEN_Z), config.get("width"), config.get("height"))
+
+def save_screen(screen: ScreenPlane, filepath: str = SCREEN_FILE_PATH):
+    try:
+        with open(filepath, 'w') as f:
+            json.dump(screen._asdict(), f, indent=4)
+        print(f"Screen plane saved to {filepath}")
+    except Exception as e:
+        print(f"Error saving screen plane to {filepath}: {e}")
+
+def on_screen(screen: ScreenPlane, x: float, y: float) -> bool:
+    if screen.width is None or screen.height is None:
+        return True
+    # width/height can come out negative depending on which way the axes point, compare against the span either way
+    x_low, x_high = sorted((screen.x, screen.x + screen.width))
+    y_low, y_high = sorted((screen.y, screen.y + screen.height))
+    return x_low <= x <= x_high and y_low <= y <= y_high
+
+
+class TrajectoryPredictor:
+    MEASUREMENT_NOISE_CM = (0.5, 0.5, 2.0) # 1 sigma per axis, stereo depth (z) is the noisy one
+    JERK_NOISE = 500.0 # cm/s^3, how much the acceleration may wander (drag changes with speed), tuned on the throws in __main__
+    INITIAL_VELOCITY_SIGMA = 1000.0 # cm/s, before the second sample nothing is known about the speed
+    INITIAL_ACCELERATION_SIGMA = 1500.0 # cm/s^2, a bit more than gravity in any direction
+    MAX_GAP_S = 0.2 # no sample for this long = the old throw is gone, start over
+    GATE = 25.0 # normalized innovation (summed over the axes) above this is not the ball we were following
+    MAX_OUTLIERS = 2 # outliers in a row before we believe it is a new throw
+    MIN_SAMPLES = 4 # samples before a prediction is given out, the acceleration needs a few to settle
+    MAX_HORIZON_S = 1.0 # dont predict further ahead than this
+    CONFIDENCE_SCALE_CM = 5.0 # miss distance (1 sigma) at which the confidence is 0.5
+
+    def __init__(self, screen: ScreenPlane | None = None):
+        self.screen = screen if screen is not None else load_screen()
+        self.noise_variance = np.square(np.array(self.MEASUREMENT_NOISE_CM, dtype=np.float64))
+        self.reset()
+
+    def reset(self):
+        self.state = None # (axis, [position, velocity, acceleration]) for x, y, z
+        self.covariance = None # (axis, 3, 3), one covariance per axis
+        self.last_timestamp_ns = None
+        self.samples = 0
+        self.outliers = 0
+
+    def _start(self, position: np.ndarray, timestamp_ns: int):
+        self.state = np.zeros((3, 3))
+        self.state[:, 0] = position
+        self.covariance = np.zeros((3, 3, 3))
+        self.covariance[:, 0, 0] = self.noise_variance
+        self.covariance[:, 1, 1] = self.INITIAL_VELOCITY_SIGMA ** 2
+        self.covariance[:, 2, 2] = self.INITIAL_ACCELERATION_SIGMA ** 2
+        self.last_timestamp_ns = timestamp_ns
+        self.samples = 1
+        self.outliers = 0
+
+    def _propagate(self, dt: float) -> tuple[np.ndarray, np.ndarray]:
+        # state and covariance dt seconds after the last sample, same transition for every axis
+        transition = np.array([[1.0, dt, dt * dt / 2], [0.0, 1.0, dt], [0.0, 0.0, 1.0]])
+        # white jerk process noise
+        process_noise = self.JERK_NOISE ** 2 * np.array([
+            [dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6],
+            [dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2],
+            [dt ** 3 / 6, dt ** 2 / 2, dt],
+        ])
+        return self.state @ transition.T, transition @ self.covariance @ transition.T + process_noise
+
+    def position_at(self, timestamp_ns: int) -> tuple[float, float, float] | None:
+        if self.state is None:
+            return None
+        state, _ = self._propagate((timestamp_ns - self.last_timestamp_ns) / 1e9)
+        return tuple(float(value) for value in state[:, 0])
+
+    def update(self, position, timestamp_ns: int) -> bool:
+        # one 3D sample in cm at its capture timestamp, False if it was thrown away as an outlier
+        position = np.asarray(position, dtype=np.float64)
+        if self.state is None or (timestamp_ns - self.last_timestamp_ns) / 1e9 > self.MAX_GAP_S:
+            self._start(position, timestamp_ns)
+            return True
+        dt = (timestamp_ns - self.last_timestamp_ns) / 1e9
+        if dt <= 0:
+            return False # same frame twice, or out of order
+
+        state, covariance = self._propagate(dt)
+        innovation = position - state[:, 0]
+        innovation_variance = covariance[:, 0, 0] + self.noise_variance
+        if self.samples >= self.MIN_SAMPLES and np.sum(innovation ** 2 / innovation_variance) > self.GATE:
+            self.outliers += 1
+            if self.outliers >= self.MAX_OUTLIERS:
+                self._start(position, timestamp_ns) # consistently somewhere else, a new throw
+                return True
+            return False
+
+        # the measurement only sees the position, so the gain is the first column of the covariance
+        gain = covariance[:, :, 0] / innovation_variance[:, None]
+        self.state = state + gain * innovation[:, None]
+        self.covariance = covariance - gain[:, :, None] * covariance[:, 0, None, :]
+        self.last_timestamp_ns = timestamp_ns
+        self.samples += 1
+        self.outliers = 0
+        return True
+
+    def update_points(self, points: list, timestamp_ns: int) -> bool:
+        # getTargets() output, the point closest to where the ball should be is the ball
+        if not points:
+            return False
+        if self.state is not None and len(points) > 1:
+            expected = self.position_at(timestamp_ns)
+            points = sorted(points, key=lambda point: math.dist(point, expected))
+        return self.update(points[0], timestamp_ns)
+
+    def predict_impact(self) -> ImpactPrediction | None:
+        # None until there are enough samples, or if the ball isnt heading for the screen within MAX_HORIZON_S
+        if self.state is None or self.samples < self.MIN_SAMPLES:
+            return None
+        position, velocity, acceleration = self.state[2]
+        distance = self.screen.z - position
+        time_s = self._time_to_reach(distance, velocity, acceleration)
+        if time_s is None:
+            return None
+
+        weights = np.array([1.0, time_s, time_s * time_s / 2]) # position after time_s from [position, velocity, acceleration]
+        point = self.state @ weights
+        variances = np.einsum('i,aij,j->a', weights, self.covariance, weights)
+        # the uncertain arrival time moves the impact sideways by the sideways speed
+        velocity_at_impact = self.state[:, 1] + self.state[:, 2] * time_s
+        time_variance = variances[2] / max(velocity_at_impact[2] ** 2, 1e-6)
+        sigma_cm = math.sqrt(variances[0] + variances[1] + (velocity_at_impact[0] ** 2 + velocity_at_impact[1] ** 2) * time_variance)
+
+        x, y = float(point[0]), float(point[1])
+        timestamp_ns = self.last_timestamp_ns + int(time_s * 1e9) if self.last_timestamp_ns is not None else None
+        return ImpactPrediction(
+            (x, y, float(self.screen.z)), time_s, timestamp_ns,
+            1.0 / (1.0 + sigma_cm / self.CONFIDENCE_SCALE_CM), sigma_cm, on_screen(self.screen, x, y))
+
+    def _time_to_reach(self, distance: float, velocity: float, acceleration: float) -> float | None:
+        # first positive t with velocity * t + acceleration * t^2 / 2 = distance
+        if abs(acceleration) < 1e-9:
+            time_s = distance / velocity if velocity != 0 else -1.0
+        else:
+            discriminant = velocity * velocity + 2 * acceleration * distance
+            if discriminant < 0:
+                return None # turns around before it gets there
+            root = math.sqrt(discriminant)
+            times = [t for t in ((-velocity - root) / acceleration, (-velocity + root) / acceleration) if t >= 0]
+            time_s = min(times) if times else -1.0
+        if not 0 <= time_s <= self.MAX_HORIZON_S:
+            return None
+        return time_s
+
+
+if __name__ == "__main__":
+    import time
+
+    # simulated throws: gravity along +y (down in the image), a little drag, noise like MEASUREMENT_NOISE_CM, 60 fps
+    rng = np.random.default_rng(0)
+    frame_interval_ns = 16_666_667
+    gravity = np.array([0.0, 981.0, 0.0])
+    predictor = TrajectoryPredictor(DEFAULT_SCREEN)
+    errors_by_lead = {} # frames before impact -> miss distances
+    update_times = []
+    for throw in range(200):
+        position = np.array([rng.uniform(-40, 40), rng.uniform(-30, 10), 100.0])
+        velocity = np.array([rng.uniform(-60, 60), rng.uniform(-250, -50), rng.uniform(400, 800)])
+        samples = []
+        while position[2] < SCREEN_Z:
+            samples.append(position.copy())
+            acceleration = gravity - 0.002 * np.linalg.norm(velocity) * velocity
+            velocity = velocity + acceleration * frame_interval_ns / 1e9
+            position = position + velocity * frame_interval_ns / 1e9
+        # impact by interpolating the last step
+        previous = samples[-1]
+        impact = previous + (position - previous) * (SCREEN_Z - previous[2]) / (position[2] - previous[2])
+
+        predictor.reset()
+        for frame_idx, sample in enumerate(samples):
+            measured = sample + rng.normal(0, predictor.MEASUREMENT_NOISE_CM)
+            start_ns = time.perf_counter_ns()
+            predictor.update(measured, (throw * 100 + frame_idx) * frame_interval_ns)
+            prediction = predictor.predict_impact()
+            update_times.append(time.perf_counter_ns() - start_ns)
+            if prediction is not None:
+                lead = len(samples) - frame_idx
+                errors_by_lead.setdefault(lead, []).append((math.dist(prediction.point[:2], impact[:2]), prediction.sigma_cm))
+
+    print(f"update + predict: {np.median(update_times) / 1e3:.1f} us median")
+    print(f"{'frames before impact':>20} {'mean miss cm':>12} {'p95 miss cm':>11} {'mean sigma cm':>13}")
+    for lead in sorted(errors_by_lead):
+        if lead % 2 == 0 or lead <= 3:
+            misses, sigmas = np.array(errors_by_lead[lead]).T
+            print(f"{lead:>20} {misses.mean():>12.2f} {np.percentile(misses, 95):>11.2f} {sigmas.mean():>13.2f}")
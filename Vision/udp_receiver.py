@@ -0,0 +1,132 @@
+# Artificial Intelligence was used in this file to : debug errors, research UDP
+
+# reference receiver for TCPClient(transport="udp"): position records arrive as datagrams
+# (one telemetry_protocol record each, or positions followed by their impact prediction), control messages stay on the TCP connection
+# usage: python udp_receiver.py [port]   then point TCPClient at 127.0.0.1 with transport="udp"
+
+import socket
+import sys
+import threading
+import time
+
+from telemetry_protocol import RECORD_SIZE, decode_record
+
+SEQUENCE_MODULO = 1 << 32
+JITTER_GAIN = 1 / 16 # same smoothing as the RTP interarrival jitter
+
+
+def sequence_newer(sequence: int, last_sequence: int) -> bool:
+    # serial number comparison so the 32 bit sequence can wrap around
+    return 0 < (sequence - last_sequence) % SEQUENCE_MODULO < SEQUENCE_MODULO // 2
+
+
+class UdpTelemetryReceiver:
+    # on_record is only called for records newer than everything before them, older ones are rejected
+    def __init__(self, host='0.0.0.0', port=55000, on_record=None):
+        self.host = host
+        self.port = port
+        self.on_record = on_record
+        self.socket = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.last_sequence = None
+        self.last_arrival_ns = None
+        self.last_timestamp_ns = None
+        self.received = 0
+        self.lost = 0 # gaps in the sequence
+        self.reordered = 0 # arrived after a newer record, dropped
+        self.malformed = 0
+        self.jitter_ms = 0.0
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((self.host, self.port))
+        self.socket.settimeout(0.5)
+        self.port = self.socket.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._receive_loop, name="UdpTelemetryThread")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data, _ = self.socket.recvfrom(RECORD_SIZE * 2)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            arrival_ns = time.monotonic_ns()
+            try:
+                records = [decode_record(data[offset:offset + RECORD_SIZE]) for offset in range(0, len(data), RECORD_SIZE)]
+                if not records:
+                    raise ValueError("empty datagram")
+            except Exception:
+                with self.lock:
+                    self.malformed += 1
+                continue
+            # the sequence is checked on the first record, the rest of the datagram belongs to the same sample
+            if self._accept(records[0], arrival_ns) and self.on_record is not None:
+                for record in records:
+                    self.on_record(record)
+
+    def _accept(self, record, arrival_ns) -> bool:
+        with self.lock:
+            if self.last_sequence is not None and not sequence_newer(record.sequence, self.last_sequence):
+                self.reordered += 1
+                return False
+
+            if self.last_sequence is not None:
+                self.lost += (record.sequence - self.last_sequence) % SEQUENCE_MODULO - 1
+                # difference between how far apart the samples were taken and how far apart they arrived
+                transit_change_ms = ((arrival_ns - self.last_arrival_ns) - (record.timestamp_ns - self.last_timestamp_ns)) / 1e6
+                self.jitter_ms += (abs(transit_change_ms) - self.jitter_ms) * JITTER_GAIN
+
+            self.received += 1
+            self.last_sequence = record.sequence
+            self.last_arrival_ns = arrival_ns
+            self.last_timestamp_ns = record.timestamp_ns
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            expected = self.received + self.lost
+            return {
+                "received": self.received,
+                "lost": self.lost,
+                "loss_rate": round(self.lost / expected, 4) if expected else 0.0,
+                "reordered": self.reordered,
+                "malformed": self.malformed,
+                "jitter_ms": round(self.jitter_ms, 3),
+            }
+
+
+def main():
+    from telemetry_receiver import TelemetryReceiver
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 55000
+    control_receiver = TelemetryReceiver(port=port) # keep alive and control messages
+    udp_receiver = UdpTelemetryReceiver(port=port)
+    control_receiver.start()
+    udp_receiver.start()
+    print(f"Listening for control on TCP {port} and positions on UDP {port}")
+    try:
+        while True:
+            time.sleep(1)
+            print(udp_receiver.stats())
+    except KeyboardInterrupt:
+        udp_receiver.stop()
+        control_receiver.stop()
+
+if __name__ == "__main__":
+    main()